@@ -1,10 +1,22 @@
 import os
-from flask import Flask
+import threading
+from flask import Flask, flash, jsonify, redirect, request
 from flask_bcrypt import Bcrypt
 from flask_wtf.csrf import CSRFProtect
-from flask_login import LoginManager
-from pymongo import MongoClient
+from flask_login import LoginManager, login_url
 from dotenv import load_dotenv
+from app.flight_search import ensure_indexes as ensure_search_indexes
+from app.search_cache import search_cache
+from app.user_cache import user_cache
+from app.metrics import metrics
+from app.slow_queries import slow_query_log
+from app.db import get_db, mongo
+from app.decorators import wants_json
+from app import seat_holds, outbox, mail_merge, sales_rollups
+from app.integrations import integrations
+from app.payments import CircuitBreaker
+from app.seat_stream import DEFAULT_HEARTBEAT, DEFAULT_POLL_INTERVAL, seat_map_hub
+from app import itineraries, idempotency, payment_processing
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +25,7 @@ load_dotenv()
 bcrypt = Bcrypt()
 csrf = CSRFProtect()
 login_manager = LoginManager()
+_background_lock = threading.Lock()
 
 def create_app():
     app = Flask(__name__, template_folder="templates")
@@ -22,6 +35,37 @@ def create_app():
     app.config["WTF_CSRF_SECRET_KEY"] = os.getenv("WTF_CSRF_SECRET_KEY")
     app.config["SESSION_TYPE"] = "filesystem"
     app.config["SESSION_PERMANENT"] = False
+    app.config["SEARCH_CACHE_SIZE"] = int(os.getenv("SEARCH_CACHE_SIZE", 1024))
+    app.config["SEARCH_CACHE_TTL"] = float(os.getenv("SEARCH_CACHE_TTL", 30))
+    app.config["USER_CACHE_TTL"] = float(os.getenv("USER_CACHE_TTL", 60))
+    app.config["SEAT_HOLD_TTL"] = int(os.getenv("SEAT_HOLD_TTL", seat_holds.DEFAULT_HOLD_TTL))
+    app.config["SEAT_HOLD_SWEEP_INTERVAL"] = float(os.getenv("SEAT_HOLD_SWEEP_INTERVAL", 30))
+    # Off by default: run `python -m app.outbox` once per deployment so the per-channel limit is global
+    app.config["OUTBOX_WORKERS_ENABLED"] = os.getenv("OUTBOX_WORKERS_ENABLED", "False").lower() in ("1", "true", "yes")
+    app.config["PAYMENT_GATEWAY"] = os.getenv("PAYMENT_GATEWAY", "mock")
+    app.config["PAYMENT_WORKERS"] = int(os.getenv("PAYMENT_WORKERS", payment_processing.DEFAULT_WORKERS))
+    app.config["PAYMENT_QUEUE_SIZE"] = int(os.getenv("PAYMENT_QUEUE_SIZE", payment_processing.DEFAULT_QUEUE_SIZE))
+    # One reaper per deployment is enough; set False on all but one process
+    app.config["PAYMENT_REAPER_ENABLED"] = os.getenv("PAYMENT_REAPER_ENABLED", "True").lower() in ("1", "true", "yes")
+    app.config["PAYMENT_PENDING_TIMEOUT"] = float(os.getenv("PAYMENT_PENDING_TIMEOUT", payment_processing.DEFAULT_PENDING_TIMEOUT))
+    app.config["PAYMENT_BREAKER_THRESHOLD"] = int(os.getenv("PAYMENT_BREAKER_THRESHOLD", 5))
+    app.config["PAYMENT_BREAKER_RESET"] = float(os.getenv("PAYMENT_BREAKER_RESET", 30))
+    app.config["PAYMENT_MOCK_LATENCY_MIN"] = float(os.getenv("PAYMENT_MOCK_LATENCY_MIN", 0))
+    app.config["PAYMENT_MOCK_LATENCY_MAX"] = float(os.getenv("PAYMENT_MOCK_LATENCY_MAX", 0))
+    app.config["PAYMENT_MOCK_FAILURE_RATE"] = float(os.getenv("PAYMENT_MOCK_FAILURE_RATE", 0))
+    app.config["PAYMENT_MOCK_DECLINE_RATE"] = float(os.getenv("PAYMENT_MOCK_DECLINE_RATE", 0.5))
+    app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "True").lower() in ("1", "true", "yes")
+    app.config["SLOW_QUERY_LOG_ENABLED"] = os.getenv("SLOW_QUERY_LOG_ENABLED", "True").lower() in ("1", "true", "yes")
+    app.config["SLOW_QUERY_MS"] = float(os.getenv("SLOW_QUERY_MS", 100))
+    app.config["SLOW_QUERY_SAMPLE_RATE"] = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", 1.0))
+    app.config["SEAT_STREAM_POLL_INTERVAL"] = float(os.getenv("SEAT_STREAM_POLL_INTERVAL", DEFAULT_POLL_INTERVAL))
+    app.config["SEAT_STREAM_HEARTBEAT"] = float(os.getenv("SEAT_STREAM_HEARTBEAT", DEFAULT_HEARTBEAT))
+    app.config["ITINERARY_MIN_CONNECTION"] = int(os.getenv("ITINERARY_MIN_CONNECTION", itineraries.DEFAULT_MIN_CONNECTION))
+    app.config["ITINERARY_MAX_CONNECTION"] = int(os.getenv("ITINERARY_MAX_CONNECTION", itineraries.DEFAULT_MAX_CONNECTION))
+    app.config["IDEMPOTENCY_TTL"] = int(os.getenv("IDEMPOTENCY_TTL", idempotency.DEFAULT_TTL))
+    app.config["IDEMPOTENCY_LOCK_TIMEOUT"] = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", idempotency.DEFAULT_LOCK_TIMEOUT))
+    app.config["IDEMPOTENCY_WAIT"] = float(os.getenv("IDEMPOTENCY_WAIT", idempotency.DEFAULT_WAIT))
+    app.config["ITINERARY_REFRESH_INTERVAL"] = float(os.getenv("ITINERARY_REFRESH_INTERVAL", itineraries.DEFAULT_REFRESH_INTERVAL))
 
     # Validate Required Environment Variables
     required_env_vars = ["SECRET_KEY", "WTF_CSRF_SECRET_KEY", "MONGO_URI"]
@@ -33,38 +77,131 @@ def create_app():
     bcrypt.init_app(app)
     csrf.init_app(app)
     login_manager.init_app(app)
+    search_cache.configure(maxsize=app.config["SEARCH_CACHE_SIZE"], ttl=app.config["SEARCH_CACHE_TTL"])
+    user_cache.configure(ttl=app.config["USER_CACHE_TTL"])
+    integrations.init_app(app)
+    metrics.init_app(app)
+    slow_query_log.init_app(app)
+    seat_map_hub.configure(poll_interval=app.config["SEAT_STREAM_POLL_INTERVAL"])
+    itineraries.route_graph.configure(refresh_interval=app.config["ITINERARY_REFRESH_INTERVAL"])
 
     # Flask-Login Configuration
     login_manager.login_view = "main.login"
     login_manager.login_message = "Please log in to access this page."
     login_manager.login_message_category = "info"
 
+    @login_manager.unauthorized_handler
+    def unauthorized():
+        # API callers get a status code; pages go to the login form as before
+        if wants_json():
+            return jsonify({"error": "Authentication required"}), 401
+        flash(login_manager.login_message, login_manager.login_message_category)
+        return redirect(login_url(login_manager.login_view, request.url))
+
     @login_manager.user_loader
     def load_user(user_id):
-        from app.routes import MongoUser
-        return MongoUser.get(user_id)
-
-    # MongoDB Configuration
-    mongo_uri = os.getenv("MONGO_URI")
-    try:
-        mongo_client = MongoClient(mongo_uri)
-        global mongo_db
-        mongo_db = mongo_client.get_database()
-        mongo_client.admin.command("ping")
-        print("Connected to MongoDB successfully.")
-    except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
-        raise RuntimeError("Failed to connect to MongoDB. Ensure your MONGO_URI is correct and accessible.")
+        from app.models import User
+        return user_cache.get(user_id, User.get_user_by_id)
+
+    # MongoDB: the client is created lazily in each process (see app.db); indexes are
+    # declared on each process's first request or up front with `flask ensure-indexes`
+    mongo.init_app(app, event_listeners=metrics.listeners() + slow_query_log.listeners())
+
+    @app.cli.command("ensure-indexes")
+    def ensure_indexes_command():
+        """Create the MongoDB indexes every module relies on."""
+        ensure_indexes(mongo.get_db(app))
+        print("MongoDB indexes are in place.")
 
     # Register Blueprints
     from app.routes import main
     from app.apis.seat_selection_api import seat_selection_blueprint  # Import the API blueprint
+    from app.apis.notification_api import notification_blueprint
+    from app.apis.booking_confirmation_email_text import booking_confirmation_blueprint
+    from app.apis.ticketing_api import ticketing_blueprint
+    from app.apis.sales_data_api import sales_data_blueprint
+    from app.apis.flight_search_api import flight_search_blueprint
+    from app.apis.booking_api import booking_blueprint
+    from app.apis.auth_api import auth_blueprint
 
     app.register_blueprint(main)
     app.register_blueprint(seat_selection_blueprint, url_prefix="/api")  # Register with /api prefix
+    app.register_blueprint(notification_blueprint, url_prefix="/api")
+    app.register_blueprint(booking_confirmation_blueprint, url_prefix="/api")
+    app.register_blueprint(ticketing_blueprint, url_prefix="/api")
+    app.register_blueprint(sales_data_blueprint, url_prefix="/api")
+    app.register_blueprint(flight_search_blueprint, url_prefix="/api")
+    app.register_blueprint(booking_blueprint, url_prefix="/api")
+    app.register_blueprint(auth_blueprint, url_prefix="/api/auth")
+
+    # Background threads do not survive fork(), so each worker process starts its own on its first request
+    @app.before_request
+    def ensure_background_workers():
+        if app.extensions.get("background_pid") != os.getpid():
+            start_background_workers(app)
 
     return app
 
-# Expose MongoDB client for other modules
+
+def ensure_indexes(mongo_db):
+    """
+    Declare every module's indexes; each call is a no-op for indexes that exist.
+    """
+    ensure_search_indexes(mongo_db)
+    seat_holds.ensure_indexes(mongo_db)
+    outbox.ensure_indexes(mongo_db)
+    mail_merge.ensure_indexes(mongo_db)
+    sales_rollups.ensure_indexes(mongo_db)
+    idempotency.ensure_indexes(mongo_db)
+    payment_processing.ensure_indexes(mongo_db)
+
+
+def start_background_workers(app):
+    """
+    Declare the indexes, then start the seat hold sweeper, the outbox
+    workers, the payment workers and the slow-query explainer for this process.
+    """
+    with _background_lock:
+        if app.extensions.get("background_pid") == os.getpid():
+            return
+        mongo_db = mongo.get_db(app)
+        try:
+            ensure_indexes(mongo_db)
+        except Exception as e:
+            print(f"Error creating MongoDB indexes: {e}")
+
+        # Release abandoned seat holds in the background
+        sweeper = seat_holds.HoldSweeper(
+            mongo_db.get_collection("flights"),
+            interval=app.config["SEAT_HOLD_SWEEP_INTERVAL"],
+            on_release=search_cache.invalidate_flight,
+        )
+        sweeper.start()
+        app.extensions["seat_hold_sweeper"] = sweeper
+
+        # Deliver queued email/SMS off the request path
+        if app.config["OUTBOX_WORKERS_ENABLED"]:
+            transports = {"email": integrations.lazy("email"), "sms": integrations.lazy("sms")}
+            outbox_workers = outbox.OutboxWorkerPool(mongo_db, transports)
+            outbox_workers.start()
+            app.extensions["outbox_workers"] = outbox_workers
+
+        # Card charges run here so request threads never wait on the gateway
+        payment_processor = payment_processing.PaymentProcessor(
+            mongo_db,
+            integrations.lazy("payments"),
+            workers=app.config["PAYMENT_WORKERS"],
+            queue_size=app.config["PAYMENT_QUEUE_SIZE"],
+            breaker=CircuitBreaker(app.config["PAYMENT_BREAKER_THRESHOLD"], app.config["PAYMENT_BREAKER_RESET"]),
+            pending_timeout=app.config["PAYMENT_PENDING_TIMEOUT"],
+            reap=app.config["PAYMENT_REAPER_ENABLED"],
+        )
+        payment_processor.start()
+        app.extensions["payment_processor"] = payment_processor
+
+        slow_query_log.start(mongo_db)
+        app.extensions["background_pid"] = os.getpid()
+
+# Expose MongoDB handle for other modules (prefer app.db.get_db)
 def get_mongo_db():
-    return mongo_db
+    return get_db()
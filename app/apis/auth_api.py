@@ -1,15 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from bson.objectid import ObjectId
-from app import mongo_db
+from app.db import get_db
+from app.user_cache import user_cache
 
 auth_blueprint = Blueprint('auth_api', __name__)
 
 def role_required(role_name):
     def decorator(func):
         def wrapper(*args, **kwargs):
-            user_roles = current_user.role if isinstance(current_user.role, list) else [current_user.role]
-            if role_name not in user_roles:
+            if not current_user.has_role(role_name):
                 return jsonify({"error": f"Access denied: {role_name} role required"}), 403
             return func(*args, **kwargs)
         wrapper.__name__ = f"{func.__name__}_{role_name}"
@@ -27,11 +27,12 @@ def create_role():
     if not role_name:
         return jsonify({'error': 'Role name is required'}), 400
 
-    roles_collection = mongo_db.get_collection('roles')
+    roles_collection = get_db().get_collection('roles')
     if roles_collection.find_one({"name": role_name}):
         return jsonify({'error': f'Role {role_name} already exists'}), 400
 
     roles_collection.insert_one({"name": role_name, "description": description})
+    user_cache.clear()
     return jsonify({'message': f'Role {role_name} created successfully!'}), 201
 
 @auth_blueprint.route('/assign-role', methods=['POST'])
@@ -45,8 +46,8 @@ def assign_role():
     if not user_id or not role_name:
         return jsonify({'error': 'User ID and role name are required'}), 400
 
-    users_collection = mongo_db.get_collection('users')
-    roles_collection = mongo_db.get_collection('roles')
+    users_collection = get_db().get_collection('users')
+    roles_collection = get_db().get_collection('roles')
 
     user = users_collection.find_one({"_id": ObjectId(user_id)})
     role = roles_collection.find_one({"name": role_name})
@@ -61,6 +62,7 @@ def assign_role():
         {"_id": ObjectId(user_id)},
         {"$addToSet": {"roles": role_name}}
     )
+    user_cache.invalidate(user_id)
     return jsonify({'message': f'Role {role_name} assigned to user {user["email"]}'}), 200
 
 @auth_blueprint.route('/check-role', methods=['GET'])
@@ -70,5 +72,5 @@ def check_role():
     if not role_name:
         return jsonify({'error': 'Role name is required'}), 400
 
-    has_role = role_name in current_user.role if isinstance(current_user.role, list) else current_user.role == role_name
+    has_role = current_user.has_role(role_name)
     return jsonify({'has_role': has_role}), 200
@@ -1,12 +1,24 @@
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
 from bson.objectid import ObjectId
-from app import mongo_db
+from app.db import get_db
+from app.booking_enrichment import enrich_bookings
+from app.search_cache import search_cache
+from app.seat_inventory import claim_seat, claim_seats, decode_seats, release_seat, release_seats, seat_mask
+from app.models import Flight
+from app.idempotency import idempotent
+from app.sales_rollups import SALES_PROJECTION, booking_day, record_booking, record_cancellation
+from datetime import datetime
+from pymongo.errors import PyMongoError
+
+# Largest party one group booking may seat
+MAX_GROUP_SIZE = 9
 
 booking_blueprint = Blueprint('booking', __name__)
 
 @booking_blueprint.route('/bookings', methods=['POST'])
 @login_required
+@idempotent
 def create_booking():
     data = request.get_json()
     flight_id = data.get('flight_id')
@@ -14,12 +26,12 @@ def create_booking():
     if not flight_id or not seat_number:
         return jsonify({"error": "Flight ID and seat number are required"}), 400
 
-    flights_collection = mongo_db.get_collection('flights')
-    flight = flights_collection.find_one({"_id": ObjectId(flight_id)})
+    flights_collection = get_db().get_collection('flights')
+    flight = Flight.get_flight_by_id(flight_id, projection="detail")
     if not flight:
         return jsonify({"error": "Flight not found"}), 404
 
-    bookings_collection = mongo_db.get_collection('bookings')
+    bookings_collection = get_db().get_collection('bookings')
     existing_booking = bookings_collection.find_one({
         "user_id": current_user.id,
         "flight_id": flight_id
@@ -27,20 +39,99 @@ def create_booking():
     if existing_booking:
         return jsonify({"error": "You have already booked this flight"}), 400
 
+    try:
+        seat_mask(seat_number)
+    except ValueError:
+        return jsonify({"error": "Invalid seat number"}), 400
+    if not claim_seat(flights_collection, flight.object_id, seat_number, projection={"_id": 1}):
+        return jsonify({"error": "Seat is not available"}), 400
+
     new_booking = {
         "user_id": current_user.id,
         "flight_id": flight_id,
         "seat_number": seat_number,
-        "booking_time": flight.get("departureTime")
+        "booking_time": flight.departure_time,
+        "timestamp": datetime.utcnow(),
+        "price": flight.price,
     }
     bookings_collection.insert_one(new_booking)
+    search_cache.invalidate_flight(flight.route())
+    record_booking(get_db(), flight.route(), flight.price, when=new_booking["timestamp"])
     return jsonify({"message": "Booking created successfully!"}), 201
 
+@booking_blueprint.route('/bookings/group', methods=['POST'])
+@login_required
+@idempotent
+def create_group_booking():
+    """
+    Book several seats on one flight all-or-nothing: the seats are claimed
+    in a single conditional update and the bookings written with one bulk
+    insert. If the insert fails the bookings and seats are rolled back.
+    """
+    data = request.get_json() or {}
+    flight_id = data.get('flight_id')
+    seat_numbers = [str(seat_number).strip() for seat_number in data.get('seat_numbers') or []]
+    if not flight_id or not seat_numbers:
+        return jsonify({"error": "Flight ID and seat numbers are required"}), 400
+    if len(seat_numbers) > MAX_GROUP_SIZE:
+        return jsonify({"error": f"A group booking can hold at most {MAX_GROUP_SIZE} seats"}), 400
+    if len(set(seat_numbers)) != len(seat_numbers):
+        return jsonify({"error": "Seat numbers must be unique"}), 400
+    try:
+        for seat_number in seat_numbers:
+            seat_mask(seat_number)
+    except ValueError:
+        return jsonify({"error": "Invalid seat number"}), 400
+
+    flights_collection = get_db().get_collection('flights')
+    flight = Flight.get_flight_by_id(flight_id, projection="detail")
+    if not flight:
+        return jsonify({"error": "Flight not found"}), 404
+
+    bookings_collection = get_db().get_collection('bookings')
+    if bookings_collection.find_one({"user_id": current_user.id, "flight_id": flight_id}, {"_id": 1}):
+        return jsonify({"error": "You have already booked this flight"}), 400
+
+    if not claim_seats(flights_collection, flight.object_id, seat_numbers, projection={"_id": 1}):
+        current = flights_collection.find_one({"_id": flight.object_id}, {"seatBits": 1, "seats": 1}) or {}
+        free = {seat["seat_number"] for seat in decode_seats(current) if seat["is_available"]}
+        return jsonify({
+            "error": "One or more seats are not available",
+            "unavailable": [seat_number for seat_number in seat_numbers if seat_number not in free],
+        }), 400
+
+    group_id = ObjectId()
+    timestamp = datetime.utcnow()
+    new_bookings = [{
+        "user_id": current_user.id,
+        "flight_id": flight_id,
+        "seat_number": seat_number,
+        "booking_time": flight.departure_time,
+        "timestamp": timestamp,
+        "price": flight.price,
+        "group_id": group_id,
+    } for seat_number in seat_numbers]
+    try:
+        bookings_collection.insert_many(new_bookings)
+    except PyMongoError as e:
+        print(f"Error writing group booking {group_id}, rolling back: {e}")
+        bookings_collection.delete_many({"group_id": group_id})
+        release_seats(flights_collection, flight.object_id, seat_numbers)
+        return jsonify({"error": "Could not complete the booking; no seats were booked"}), 500
+
+    search_cache.invalidate_flight(flight.route())
+    record_booking(get_db(), flight.route(), flight.price, when=timestamp, quantity=len(seat_numbers))
+    return jsonify({
+        "message": f"{len(seat_numbers)} seats booked successfully!",
+        "group_id": str(group_id),
+        "booking_ids": [str(booking["_id"]) for booking in new_bookings],
+    }), 201
+
 @booking_blueprint.route('/bookings', methods=['GET'])
 @login_required
 def get_bookings():
-    bookings_collection = mongo_db.get_collection('bookings')
-    flights_collection = mongo_db.get_collection('flights')
+    bookings_collection = get_db().get_collection('bookings')
+    flights_collection = get_db().get_collection('flights')
 
     bookings = list(bookings_collection.find({"user_id": current_user.id}))
 
@@ -48,14 +139,10 @@ def get_bookings():
         return jsonify({"message": "No bookings found"}), 404
 
     booking_list = []
-    for booking in bookings:
-        flight = flights_collection.find_one({"_id": ObjectId(booking["flight_id"])})
-        if not flight:
-            continue
-
+    for booking, flight in enrich_bookings(bookings, flights_collection):
         booking_list.append({
             "id": str(booking["_id"]),
-            "flight_id": booking["flight_id"],
+            "flight_id": str(booking["flight_id"]),
             "seat_number": booking["seat_number"],
             "flight": {
                 "origin": flight["origin"],
@@ -72,13 +159,24 @@ def get_bookings():
 @booking_blueprint.route('/bookings/<booking_id>', methods=['DELETE'])
 @login_required
 def delete_booking(booking_id):
-    bookings_collection = mongo_db.get_collection('bookings')
-    result = bookings_collection.delete_one({
+    bookings_collection = get_db().get_collection('bookings')
+    booking = bookings_collection.find_one_and_delete({
         "_id": ObjectId(booking_id),
         "user_id": current_user.id
     })
 
-    if result.deleted_count == 0:
+    if not booking:
         return jsonify({"error": "Booking not found or you are not authorized"}), 404
 
+    flights_collection = get_db().get_collection('flights')
+    flight = release_seat(flights_collection, ObjectId(booking["flight_id"]), booking["seat_number"], projection=SALES_PROJECTION)
+    if not flight:
+        flight = flights_collection.find_one({"_id": ObjectId(booking["flight_id"])}, SALES_PROJECTION)
+    if flight:
+        search_cache.invalidate_flight(flight)
+        record_cancellation(
+            get_db(), flight, booking.get("price") or flight.get("price", 0),
+            paid=booking.get("payment_status") == "Paid", when=booking_day(booking),
+        )
+
     return jsonify({"message": "Booking deleted successfully"}), 200
@@ -1,62 +1,64 @@
-from flask import Blueprint, jsonify, request
-from bson.objectid import ObjectId
-from app import mongo_db
+from flask import Blueprint, current_app, jsonify, request
+from app.db import get_db
+from app.itineraries import parse_itinerary_search, route_graph
+from app.fare_calendar import fare_calendar, parse_calendar_args
+from app.search_cache import search_cache
+from app.models import Flight
+from app import read_api
 
 flight_search_blueprint = Blueprint('flight_search', __name__)
 
 @flight_search_blueprint.route('/flights', methods=['GET'])
 def search_flights():
-    origin = request.args.get('origin', "").strip()
-    destination = request.args.get('destination', "").strip()
-    departure_date = request.args.get('date')
-
-    flights_collection = mongo_db.get_collection('flights')
-    query = {}
-    if origin:
-        query["origin"] = {"$regex": f"^{origin}$", "$options": "i"}
-    if destination:
-        query["destination"] = {"$regex": f"^{destination}$", "$options": "i"}
-    if departure_date:
-        query["departureDate"] = departure_date
-
-    flights = list(flights_collection.find(query))
-
-    if not flights:
-        return jsonify({"message": "No flights found matching the criteria"}), 404
-
-    flight_list = [
-        {
-            "id": str(flight["_id"]),
-            "origin": flight["origin"],
-            "destination": flight["destination"],
-            "departure_date": flight.get("departureDate"),
-            "departure_time": flight.get("departureTime"),
-            "arrival_time": flight.get("arrivalTime"),
-            "price": flight.get("price"),
-            "capacity": flight.get("availableSeats"),
-        }
-        for flight in flights
-    ]
-    return jsonify({"flights": flight_list}), 200
+    try:
+        query, cursor, page_size, cache_key = read_api.parse_search(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cached = search_cache.get(cache_key)
+    if cached is None:
+        try:
+            cached = read_api.search_result(*Flight.get_page(query, page_size, cursor, projection="list"))
+        except ValueError:
+            return jsonify({"error": "Invalid page cursor"}), 400
+        search_cache.put(cache_key, cached, query)
+
+    body, status = read_api.search_response(cached)
+    return jsonify(body), status
 
 @flight_search_blueprint.route('/flights/<flight_id>', methods=['GET'])
 def get_flight_details(flight_id):
-    flights_collection = mongo_db.get_collection('flights')
-
-    flight = flights_collection.find_one({"_id": ObjectId(flight_id)})
-    if not flight:
-        return jsonify({"message": "Flight not found"}), 404
-
-    flight_details = {
-        "id": str(flight["_id"]),
-        "origin": flight["origin"],
-        "destination": flight["destination"],
-        "departure_date": flight.get("departureDate"),
-        "departure_time": flight.get("departureTime"),
-        "arrival_time": flight.get("arrivalTime"),
-        "price": float(flight["price"]),
-        "capacity": int(flight["availableSeats"]),
-        "airline": flight.get("airline"),
-        "class": flight.get("class"),
-    }
-    return jsonify(flight_details), 200
+    flight = Flight.get_flight_by_id(flight_id, projection="detail")
+    body, status = read_api.flight_detail_response(flight)
+    return jsonify(body), status
+
+@flight_search_blueprint.route('/itineraries', methods=['GET'])
+def search_itineraries():
+    """
+    Direct and connecting itineraries (up to two stops) for a route and day,
+    ranked by total price or duration; served from the in-memory route graph.
+    """
+    try:
+        search = parse_itinerary_search(request.args, current_app.config)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    route_graph.ensure_loaded(get_db().flights)
+    itineraries = route_graph.search(**search)
+    if not itineraries:
+        return jsonify({"message": "No itineraries found matching the criteria"}), 404
+    return jsonify({"itineraries": itineraries}), 200
+
+@flight_search_blueprint.route('/fare-calendar', methods=['GET'])
+def get_fare_calendar():
+    """
+    Cheapest bookable fare and seats left per day for a route, over
+    `days` either side of `date`, in a single aggregation.
+    """
+    try:
+        origin_code, destination_code, center_day, window = parse_calendar_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    calendar = fare_calendar(get_db().flights, origin_code, destination_code, center_day, window)
+    return jsonify({"origin": origin_code, "destination": destination_code, "days": calendar}), 200
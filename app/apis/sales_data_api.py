@@ -1,41 +1,36 @@
-from flask import Flask, jsonify
-from app import mongo_db
+from flask import Blueprint, jsonify, request
+from flask_login import login_required
+from app.db import get_db
+from app.decorators import role_required
+from app.sales_rollups import query_sales
 
-app = Flask(__name__)
+sales_data_blueprint = Blueprint('sales_data_api', __name__)
 
-@app.route('/api/sales', methods=['GET'])
+@sales_data_blueprint.route('/sales', methods=['GET'])
+@login_required
+@role_required('admin')
 def get_sales_data():
-    try:
-        bookings_collection = mongo_db.get_collection('bookings')
-        flights_collection = mongo_db.get_collection('flights')
-
-        pipeline = [
-            {"$lookup": {
-                "from": "flights",
-                "localField": "flight_id",
-                "foreignField": "_id",
-                "as": "flight_details"
-            }},
-            {"$unwind": "$flight_details"},
-            {"$group": {
-                "_id": "$flight_id",
-                "total_bookings": {"$sum": 1},
-                "total_revenue": {"$sum": "$flight_details.price"}
-            }},
-            {"$sort": {"total_revenue": -1}}
-        ]
-
-        sales_data = list(bookings_collection.aggregate(pipeline))
+    """
+    Sales totals read from the incrementally maintained rollups.
+    Optional filters: start/end (YYYY-MM-DD booking days), origin, destination,
+    and group_by=flight|day.
+    """
+    group_by = request.args.get('group_by', 'flight')
+    if group_by not in ('flight', 'day'):
+        return jsonify({"error": "group_by must be 'flight' or 'day'"}), 400
 
-        response = [
-            {
-                "flight_id": str(data["_id"]),
-                "total_bookings": data["total_bookings"],
-                "total_revenue": float(data["total_revenue"]),
-            }
-            for data in sales_data
-        ]
-
-        return jsonify(response), 200
+    try:
+        response = query_sales(
+            get_db(),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            origin=request.args.get('origin'),
+            destination=request.args.get('destination'),
+            group_by=group_by,
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD."}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+    return jsonify(response), 200
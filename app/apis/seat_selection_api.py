@@ -1,8 +1,13 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_login import login_required, current_user
 from bson.objectid import ObjectId
-from datetime import datetime
-from app import mongo_db
+from app.db import get_db
+from app.search_cache import search_cache, ROUTE_PROJECTION
+from app.seat_inventory import seat_mask
+from app.models import Flight
+from app import read_api
+from app.seat_holds import place_hold
+from app.idempotency import idempotent
 
 seat_selection_blueprint = Blueprint('seat_selection', __name__)
 
@@ -13,26 +18,13 @@ def get_available_seats(flight_id):
     """
     Fetch available seats for a specific flight.
     """
-    flights_collection = mongo_db.get_collection('flights')
-    bookings_collection = mongo_db.get_collection('bookings')
-
-    try:
-        flight_id_obj = ObjectId(flight_id)
-    except Exception:
+    if not ObjectId.is_valid(flight_id):
         return jsonify({"error": "Invalid flight ID format"}), 400
 
     try:
-        flight = flights_collection.find_one({"_id": flight_id_obj})
-        if not flight:
-            return jsonify({"error": "Flight not found"}), 404
-
-        booked_seats = bookings_collection.find({"flight_id": flight_id_obj}).distinct("seat_number")
-        seats = flight.get("seats", [])
-
-        for seat in seats:
-            seat["is_available"] = str(seat["seat_number"]) not in booked_seats
-
-        return jsonify({"seats": seats}), 200
+        flight = Flight.get_flight_by_id(flight_id, projection="seatmap")
+        body, status = read_api.available_seats_response(flight)
+        return jsonify(body), status
 
     except Exception as e:
         print(f"Error fetching seats for flight {flight_id}: {e}")
@@ -41,9 +33,10 @@ def get_available_seats(flight_id):
 # POST: Select seat
 @seat_selection_blueprint.route('/<flight_id>/seats/select', methods=['POST'])
 @login_required
+@idempotent
 def select_seat(flight_id):
     """
-    Allow a user to reserve a specific seat for a flight.
+    Place a time-limited hold on a specific seat; payment turns it into a booking.
     """
     data = request.get_json()
     seat_number = str(data.get("seat_number", "").strip())
@@ -52,8 +45,7 @@ def select_seat(flight_id):
     if not seat_number:
         return jsonify({"error": "Seat number is required"}), 400
 
-    flights_collection = mongo_db.get_collection('flights')
-    bookings_collection = mongo_db.get_collection('bookings')
+    flights_collection = get_db().get_collection('flights')
 
     try:
         flight_id_obj = ObjectId(flight_id)
@@ -61,24 +53,21 @@ def select_seat(flight_id):
         return jsonify({"error": "Invalid flight ID format"}), 400
 
     try:
-        seat_query = {"_id": flight_id_obj, "seats": {"$elemMatch": {"seat_number": seat_number, "is_available": True}}}
-        update_query = {"$set": {"seats.$.is_available": False}}
-        result = flights_collection.update_one(seat_query, update_query)
+        seat_mask(seat_number)
+    except ValueError:
+        return jsonify({"error": "Invalid seat number"}), 400
 
-        if result.modified_count == 0:
+    try:
+        hold_ttl = current_app.config["SEAT_HOLD_TTL"]
+        flight = place_hold(flights_collection, flight_id_obj, seat_number, user_id, ttl=hold_ttl, projection=ROUTE_PROJECTION)
+        if not flight:
             return jsonify({"error": "Seat is not available or already reserved"}), 400
+        search_cache.invalidate_flight(flight)
 
-        booking = {
-            "user_id": ObjectId(user_id),
-            "flight_id": flight_id_obj,
-            "seat_number": seat_number,
-            "status": "active",
-            "timestamp": datetime.utcnow(),
-            "price": 0  # Placeholder price
-        }
-        bookings_collection.insert_one(booking)
-
-        return jsonify({"message": f"Seat {seat_number} booked successfully!"}), 200
+        return jsonify({
+            "message": f"Seat {seat_number} is held for you for {hold_ttl // 60} minutes.",
+            "hold_expires_in": hold_ttl,
+        }), 200
 
     except Exception as e:
         print(f"Error during seat selection: {e}")
@@ -1,25 +1,19 @@
-from flask import Flask, request, jsonify
-from flask_mail import Mail, Message
-from app import mongo_db
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from app.db import get_db
+from app.outbox import enqueue
 from datetime import datetime
 
-app = Flask(__name__)
+ticketing_blueprint = Blueprint('ticketing_api', __name__)
 
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = 'your_email@gmail.com'
-app.config['MAIL_PASSWORD'] = 'your_password'
-
-mail = Mail(app)
-
-@app.route('/api/tickets', methods=['POST'])
+@ticketing_blueprint.route('/tickets', methods=['POST'])
+@login_required
 def create_ticket():
     data = request.get_json()
     if not data.get('user_id') or not data.get('subject') or not data.get('message'):
         return jsonify({"error": "User ID, subject, and message are required"}), 400
 
-    tickets_collection = mongo_db.get_collection('tickets')
+    tickets_collection = get_db().get_collection('tickets')
     ticket = {
         "user_id": data['user_id'],
         "subject": data['subject'],
@@ -32,13 +26,11 @@ def create_ticket():
         tickets_collection.insert_one(ticket)
         user_email = data.get('email')
         if user_email:
-            msg = Message(
+            enqueue(
+                get_db(), "email", user_email,
+                f"Your ticket '{data['subject']}' has been submitted successfully.",
                 subject="Ticket Submitted",
-                sender=app.config['MAIL_USERNAME'],
-                recipients=[user_email],
-                body=f"Your ticket '{data['subject']}' has been submitted successfully."
             )
-            mail.send(msg)
-        return jsonify({"message": "Ticket created and email notification sent successfully"}), 201
+        return jsonify({"message": "Ticket created and email notification queued"}), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
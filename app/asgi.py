@@ -0,0 +1,251 @@
+"""
+Async (ASGI) serving mode for the read-heavy endpoints:
+
+    GET /api/flights                    flight_search_api.search_flights
+    GET /api/flights/<id>               flight_search_api.get_flight_details
+    GET /api/flights/<id>/seats         routes.seat_selection_api (GET)
+    GET /api/<id>/seats                 seat_selection_api.get_available_seats
+    GET /api/flights/<id>/seats/stream  routes.seat_map_stream (server-sent events)
+
+Requests are served on one event loop with the Motor driver, so a slow
+Mongo round trip parks a coroutine instead of a WSGI thread. Query
+building, caching and response shapes come from app.read_api and are
+identical to the Flask versions; writes stay on the Flask app. Seat-map
+streams are fanned out from the process's SeatMapHub, so one process can
+hold thousands of open streams for the cost of one feed.
+
+    pip install motor uvicorn
+    uvicorn app.asgi:application --port 8001
+
+Route the paths above to this server and everything else to the WSGI app.
+Each process keeps its own search cache, so results may lag writes made
+through the WSGI app by up to SEARCH_CACHE_TTL.
+"""
+import asyncio
+import json
+import os
+import re
+import types
+from urllib.parse import parse_qsl
+from dotenv import load_dotenv
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadSignature
+from pymongo import MongoClient
+from app import read_api
+from app.models import FLIGHT_PROJECTIONS, Flight
+from app.pagination import KEYSET_SORT, keyset_query, split_page
+from app.search_cache import search_cache
+from app.seat_stream import DEFAULT_HEARTBEAT, DEFAULT_POLL_INTERVAL, HEARTBEAT_EVENT, AsyncSubscriber, format_event, seat_map_hub
+
+load_dotenv()
+
+# Flask's default PERMANENT_SESSION_LIFETIME, the max age of a session cookie
+SESSION_MAX_AGE = 31 * 24 * 3600
+
+SEAT_STREAM_PATH = re.compile(r"^/api/flights/(?P<flight_id>[^/]+)/seats/stream$")
+
+
+class ReadTier:
+    """
+    Minimal ASGI application; the Motor client is created on first use
+    inside the serving process's event loop.
+    """
+
+    def __init__(self, mongo_uri=None, secret_key=None, max_pool_size=None):
+        self.mongo_uri = mongo_uri or os.getenv("MONGO_URI")
+        self.max_pool_size = int(max_pool_size or os.getenv("MONGO_MAX_POOL_SIZE", 100))
+        self._session_serializer = SecureCookieSessionInterface().get_signing_serializer(
+            types.SimpleNamespace(secret_key=secret_key or os.getenv("SECRET_KEY"))
+        )
+        self.heartbeat = float(os.getenv("SEAT_STREAM_HEARTBEAT", DEFAULT_HEARTBEAT))
+        seat_map_hub.configure(poll_interval=float(os.getenv("SEAT_STREAM_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)))
+        self._db = None
+        self._hub_flights = None
+        self.routes = [
+            (re.compile(r"^/api/flights$"), self.search_flights, False),
+            (re.compile(r"^/api/flights/(?P<flight_id>[^/]+)$"), self.get_flight_details, False),
+            (re.compile(r"^/api/flights/(?P<flight_id>[^/]+)/seats$"), self.get_seat_map, True),
+            (re.compile(r"^/api/(?P<flight_id>[^/]+)/seats$"), self.get_available_seats, True),
+        ]
+
+    @property
+    def db(self):
+        if self._db is None:
+            try:
+                from motor.motor_asyncio import AsyncIOMotorClient
+            except ImportError:
+                raise RuntimeError("The async read tier needs the motor package: pip install motor")
+            client = AsyncIOMotorClient(self.mongo_uri, maxPoolSize=self.max_pool_size)
+            self._db = client.get_default_database()
+        return self._db
+
+    @property
+    def hub_flights(self):
+        """
+        The seat-map hub's feed thread uses the sync driver; one small client per process.
+        """
+        if self._hub_flights is None:
+            self._hub_flights = MongoClient(self.mongo_uri, maxPoolSize=4, connect=False).get_default_database().flights
+        return self._hub_flights
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        if scope["method"] != "GET":
+            await self._respond(send, {"error": "Method not allowed"}, 405)
+            return
+        match = SEAT_STREAM_PATH.match(scope["path"])
+        if match:
+            if not self._session_user_id(scope):
+                await self._respond(send, {"error": "Authentication required"}, 401)
+                return
+            await self.stream_seat_map(receive, send, match.group("flight_id"))
+            return
+        for pattern, handler, login_required in self.routes:
+            match = pattern.match(scope["path"])
+            if match:
+                if login_required and not self._session_user_id(scope):
+                    await self._respond(send, {"error": "Authentication required"}, 401)
+                    return
+                args = dict(parse_qsl(scope.get("query_string", b"").decode()))
+                body, status = await handler(args, **match.groupdict())
+                await self._respond(send, body, status)
+                return
+        await self._respond(send, {"error": "Not found"}, 404)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                seat_map_hub.stop()
+                if self._db is not None:
+                    self._db.client.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _respond(send, body, status):
+        payload = json.dumps(body, default=read_api.json_default, sort_keys=True).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    def _session_user_id(self, scope):
+        """
+        The Flask-Login user id from the signed Flask session cookie, if any.
+        """
+        for name, value in scope.get("headers", []):
+            if name != b"cookie":
+                continue
+            for part in value.decode().split(";"):
+                key, _, token = part.strip().partition("=")
+                if key == "session" and token:
+                    try:
+                        return self._session_serializer.loads(token, max_age=SESSION_MAX_AGE).get("_user_id")
+                    except BadSignature:
+                        return None
+        return None
+
+    async def _find_flight(self, flight_id, projection):
+        return await self._read_flight(read_api.flight_lookup(flight_id, projection))
+
+    async def _read_flight(self, lookup):
+        if lookup is None:
+            return None
+        document = await self.db.flights.find_one(*lookup)
+        return Flight(document) if document else None
+
+    async def search_flights(self, args):
+        try:
+            query, cursor, page_size, cache_key = read_api.parse_search(args)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        cached = search_cache.get(cache_key)
+        if cached is None:
+            try:
+                page_query = keyset_query(query, cursor)
+            except ValueError:
+                return {"error": "Invalid page cursor"}, 400
+            documents = await (
+                self.db.flights.find(page_query, FLIGHT_PROJECTIONS["list"])
+                .sort(KEYSET_SORT)
+                .limit(page_size + 1)
+                .to_list(page_size + 1)
+            )
+            documents, next_cursor = split_page(documents, page_size)
+            cached = read_api.search_result([Flight(document) for document in documents], next_cursor)
+            search_cache.put(cache_key, cached, query)
+        return read_api.search_response(cached)
+
+    async def get_flight_details(self, args, flight_id):
+        return read_api.flight_detail_response(await self._find_flight(flight_id, "detail"))
+
+    async def get_seat_map(self, args, flight_id):
+        return read_api.seat_map_response(await self._find_flight(flight_id, "seatmap"))
+
+    async def get_available_seats(self, args, flight_id):
+        lookup = read_api.flight_lookup(flight_id, "seatmap")
+        if lookup is None:
+            return {"error": "Invalid flight ID format"}, 400
+        return read_api.available_seats_response(await self._read_flight(lookup))
+
+    async def stream_seat_map(self, receive, send, flight_id):
+        """
+        Server-sent seat-map events, identical to the Flask endpoint.
+        """
+        lookup = read_api.flight_lookup(flight_id, "seatmap")
+        if lookup is None:
+            await self._respond(send, {"error": "Invalid flight ID format"}, 400)
+            return
+
+        loop = asyncio.get_running_loop()
+        seat_map_hub.start(self.hub_flights)
+        flight_key = lookup[0]["_id"]
+        subscriber = AsyncSubscriber(loop)
+        seats = await loop.run_in_executor(None, seat_map_hub.subscribe, flight_key, subscriber)
+        if seats is None:
+            await self._respond(send, {"error": "Flight not found"}, 404)
+            return
+
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            event = "retry: 2000\n" + format_event("snapshot", {"seats": seats})
+            while not disconnected.done():
+                await send({"type": "http.response.body", "body": event.encode(), "more_body": True})
+                if subscriber.stale:
+                    break
+                event = await subscriber.get(self.heartbeat) or HEARTBEAT_EVENT
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": b""})
+        except OSError:
+            pass
+        finally:
+            disconnected.cancel()
+            seat_map_hub.unsubscribe(flight_key, subscriber)
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+
+application = ReadTier()
@@ -0,0 +1,61 @@
+from bson.objectid import ObjectId
+
+# Only the flight fields the booking views actually render
+FLIGHT_SUMMARY_PROJECTION = {
+    "origin": 1,
+    "destination": 1,
+    "departureTime": 1,
+    "arrivalTime": 1,
+    "price": 1,
+}
+
+
+def to_object_id(value):
+    """
+    Coerce a flight/booking reference to an ObjectId.
+
+    Bookings written by `booking_api` store `flight_id` as a string while
+    `seat_selection_api` stores an ObjectId, so both shapes are accepted.
+    Returns None for values that cannot be a valid ObjectId.
+    """
+    if isinstance(value, ObjectId):
+        return value
+    if isinstance(value, str) and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return None
+
+
+def fetch_flights_by_id(flights_collection, flight_ids, projection=None):
+    """
+    Resolve many flight references with a single `$in` query.
+    Returns a dict keyed by ObjectId.
+    """
+    object_ids = {oid for oid in (to_object_id(fid) for fid in flight_ids) if oid is not None}
+    if not object_ids:
+        return {}
+
+    cursor = flights_collection.find(
+        {"_id": {"$in": list(object_ids)}},
+        projection or FLIGHT_SUMMARY_PROJECTION,
+    )
+    return {flight["_id"]: flight for flight in cursor}
+
+
+def enrich_bookings(bookings, flights_collection, projection=None):
+    """
+    Pair each booking with its flight document using one batched lookup.
+
+    Yields `(booking, flight)` tuples in booking order; bookings whose flight
+    no longer exists are skipped, matching the previous per-booking behaviour.
+    """
+    bookings = list(bookings)
+    flights = fetch_flights_by_id(
+        flights_collection,
+        (booking.get("flight_id") for booking in bookings),
+        projection,
+    )
+
+    for booking in bookings:
+        flight = flights.get(to_object_id(booking.get("flight_id")))
+        if flight:
+            yield booking, flight
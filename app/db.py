@@ -0,0 +1,212 @@
+import os
+import threading
+from flask import current_app, jsonify
+from pymongo import MongoClient, monitoring
+from pymongo.write_concern import WriteConcern
+
+# Defaults for the MONGO_* settings; override them in app.config or the environment
+DEFAULT_SETTINGS = {
+    "MONGO_MAX_POOL_SIZE": 100,
+    "MONGO_MIN_POOL_SIZE": 0,
+    "MONGO_MAX_IDLE_TIME_MS": 60000,
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": 2000,
+    "MONGO_CONNECT_TIMEOUT_MS": 5000,
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": 5000,
+    "MONGO_SOCKET_TIMEOUT_MS": 30000,
+    # None keeps the URI's (or server's) default write concern
+    "MONGO_WRITE_CONCERN_W": None,
+    "MONGO_WRITE_CONCERN_J": None,
+    "MONGO_WRITE_CONCERN_TIMEOUT_MS": None,
+}
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Tracks connection pool usage (CMAP events) across all servers of one client.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.check_out_failures = 0
+
+    def _add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(open=-1)
+
+    def connection_check_out_started(self, event):
+        self._add(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(waiting=-1, check_out_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+    def stats(self, max_pool_size):
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                "check_out_failures": self.check_out_failures,
+                "max_pool_size": max_pool_size,
+                "saturation": round(self.checked_out / max_pool_size, 3) if max_pool_size else 0.0,
+            }
+
+
+class _MongoState:
+    """
+    One app's client, created on first use in each process.
+    """
+
+    def __init__(self, settings, event_listeners):
+        self.settings = settings
+        self.event_listeners = event_listeners
+        self.client = None
+        self.pid = None
+        self.monitor = None
+        self.database = None
+        self._lock = threading.Lock()
+
+    def get_client(self):
+        # A client must never be shared across fork(); build a new one in each child
+        if self.client is None or self.pid != os.getpid():
+            with self._lock:
+                if self.client is None or self.pid != os.getpid():
+                    settings = self.settings
+                    self.monitor = PoolMonitor()
+                    self.client = MongoClient(
+                        settings["MONGO_URI"],
+                        connect=False,
+                        maxPoolSize=settings["MONGO_MAX_POOL_SIZE"],
+                        minPoolSize=settings["MONGO_MIN_POOL_SIZE"],
+                        maxIdleTimeMS=settings["MONGO_MAX_IDLE_TIME_MS"],
+                        waitQueueTimeoutMS=settings["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+                        connectTimeoutMS=settings["MONGO_CONNECT_TIMEOUT_MS"],
+                        serverSelectionTimeoutMS=settings["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+                        socketTimeoutMS=settings["MONGO_SOCKET_TIMEOUT_MS"],
+                        event_listeners=list(self.event_listeners) + [self.monitor],
+                    )
+                    self.database = self._database(self.client)
+                    self.pid = os.getpid()
+        return self.client
+
+    def get_database(self):
+        self.get_client()
+        return self.database
+
+    def _database(self, client):
+        settings = self.settings
+        write_concern = None
+        if settings["MONGO_WRITE_CONCERN_W"] is not None or settings["MONGO_WRITE_CONCERN_J"] is not None:
+            write_concern = WriteConcern(
+                w=settings["MONGO_WRITE_CONCERN_W"],
+                j=settings["MONGO_WRITE_CONCERN_J"],
+                wtimeout=settings["MONGO_WRITE_CONCERN_TIMEOUT_MS"],
+            )
+        return client.get_database(write_concern=write_concern)
+
+    def pool_stats(self):
+        if self.monitor is None or self.pid != os.getpid():
+            return PoolMonitor().stats(self.settings["MONGO_MAX_POOL_SIZE"])
+        return self.monitor.stats(self.settings["MONGO_MAX_POOL_SIZE"])
+
+
+def _setting(app, name, default):
+    value = app.config.get(name, os.getenv(name, default))
+    if value is None or value == "":
+        return None
+    if name == "MONGO_WRITE_CONCERN_J":
+        return str(value).lower() in ("1", "true", "yes")
+    if name == "MONGO_WRITE_CONCERN_W":
+        return int(value) if str(value).isdigit() else value
+    return int(value)
+
+
+class Mongo:
+    """
+    Flask extension owning the app's MongoClient.
+
+    Nothing connects at import or in `init_app`; the client is created on
+    first use and again after a fork, so prefork servers get one pool per
+    worker. Code running in a request or app context gets the database
+    with `get_db()`.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, event_listeners=()):
+        settings = {name: _setting(app, name, default) for name, default in DEFAULT_SETTINGS.items()}
+        settings["MONGO_URI"] = app.config.get("MONGO_URI") or os.getenv("MONGO_URI")
+        app.config.update(settings)
+        app.extensions["mongo"] = _MongoState(settings, event_listeners)
+
+        app.add_url_rule("/healthz", "healthz", _healthz)
+        app.add_url_rule("/readyz", "readyz", _readyz)
+
+    @staticmethod
+    def state(app=None):
+        return (app or current_app).extensions["mongo"]
+
+    def get_db(self, app=None):
+        return self.state(app).get_database()
+
+
+mongo = Mongo()
+
+
+def get_db():
+    """
+    The current app's database handle (connects lazily, fork-safe).
+    """
+    return current_app.extensions["mongo"].get_database()
+
+
+def _healthz():
+    """
+    Liveness: the process is up and serving.
+    """
+    return jsonify({"status": "ok", "pid": os.getpid()}), 200
+
+
+def _readyz():
+    """
+    Readiness: MongoDB answers a ping and the pool is not exhausted.
+    """
+    state = mongo.state()
+    pool = state.pool_stats()
+    try:
+        state.get_client().admin.command("ping")
+        database = "ok"
+    except Exception as e:
+        database = str(e)
+    ready = database == "ok" and not (pool["saturation"] >= 1 and pool["waiting"] > 0)
+    body = {"status": "ready" if ready else "unavailable", "database": database, "pool": pool, "pid": os.getpid()}
+    return jsonify(body), 200 if ready else 503
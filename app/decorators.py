@@ -1,14 +1,26 @@
 from functools import wraps
-from flask import redirect, url_for, flash
+from flask import redirect, url_for, flash, jsonify, request
 from flask_login import current_user
 
+
+def wants_json():
+    return (
+        request.path.startswith("/api/")
+        or request.is_json
+        or request.accept_mimetypes.best == "application/json"
+    )
+
+
 def role_required(role):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            if current_user.is_authenticated and current_user.role == role:
+            if current_user.is_authenticated and current_user.has_role(role):
                 return func(*args, **kwargs)
+            # API callers get a status code; pages get a message and the home page
+            if wants_json():
+                return jsonify({"error": f"Access denied: {role} role required"}), 403
             flash("You do not have permission to access this page.", "danger")
-            return redirect(url_for("main.index"))
+            return redirect(url_for("main.home"))
         return wrapper
     return decorator
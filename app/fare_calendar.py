@@ -0,0 +1,85 @@
+"""
+Fare calendar: cheapest bookable fare and seats left per day for a route.
+
+One aggregation covers the whole date window. Its $match and $sort are
+an equality-plus-range prefix of the route_day_price index, so the
+server reads only index entries and flight documents for that route and
+window. Results go through the search cache, which seat holds, bookings
+and the hold sweeper already invalidate per route.
+"""
+from datetime import datetime, timedelta
+from app.flight_search import DAY_FORMAT, normalize_airport
+from app.search_cache import search_cache
+
+DEFAULT_WINDOW = 7
+MAX_WINDOW = 15
+
+
+def calendar_pipeline(origin_code, destination_code, first_day, last_day):
+    return [
+        {"$match": {
+            "originCode": origin_code,
+            "destinationCode": destination_code,
+            "departureDay": {"$gte": first_day, "$lte": last_day},
+        }},
+        {"$sort": {"departureDay": 1, "price": 1}},
+        {"$group": {
+            "_id": "$departureDay",
+            # $min skips nulls, so sold-out flights never count as the cheapest fare
+            "cheapest_fare": {"$min": {"$cond": [{"$gt": ["$availableSeats", 0]}, "$price", None]}},
+            "seats_left": {"$sum": {"$max": ["$availableSeats", 0]}},
+            "flights": {"$sum": 1},
+        }},
+    ]
+
+
+def parse_calendar_args(args):
+    """
+    Return (origin_code, destination_code, center_day, window) from request
+    args; raises ValueError with a user-facing message on bad input.
+    """
+    origin_code = normalize_airport(args.get("origin"))
+    destination_code = normalize_airport(args.get("destination"))
+    if not origin_code or not destination_code:
+        raise ValueError("origin and destination are required")
+    try:
+        center_day = datetime.strptime(args.get("date") or "", DAY_FORMAT)
+    except ValueError:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+    try:
+        window = int(args.get("days", DEFAULT_WINDOW))
+    except (TypeError, ValueError):
+        raise ValueError("days must be an integer")
+    if not 0 <= window <= MAX_WINDOW:
+        raise ValueError(f"days must be between 0 and {MAX_WINDOW}")
+    return origin_code, destination_code, center_day, window
+
+
+def fare_calendar(flights_collection, origin_code, destination_code, center_day, window=DEFAULT_WINDOW):
+    """
+    One entry per day in [center_day - window, center_day + window]; days
+    without flights have a null fare and zero seats.
+    """
+    days = [(center_day + timedelta(days=offset)).strftime(DAY_FORMAT) for offset in range(-window, window + 1)]
+    query = {"originCode": origin_code, "destinationCode": destination_code}
+    cache_key = search_cache.make_key("fare_calendar", query, days[0], days[-1])
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    rows = {
+        row["_id"]: row
+        for row in flights_collection.aggregate(calendar_pipeline(origin_code, destination_code, days[0], days[-1]))
+    }
+    calendar = []
+    for day in days:
+        row = rows.get(day, {})
+        fare = row.get("cheapest_fare")
+        calendar.append({
+            "date": day,
+            "cheapest_fare": float(fare) if fare is not None else None,
+            "seats_left": int(row.get("seats_left", 0)),
+            "flights": int(row.get("flights", 0)),
+        })
+    search_cache.put(cache_key, calendar, query)
+    return calendar
@@ -0,0 +1,217 @@
+import math
+import re
+from datetime import datetime
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from app.pagination import DEFAULT_PAGE_SIZE, keyset_cursor
+
+# City names we accept in place of an IATA code
+AIRPORT_CODES = {
+    "NEW YORK": "JFK",
+    "LOS ANGELES": "LAX",
+    "CHICAGO": "ORD",
+    "MIAMI": "MIA",
+    "SAN FRANCISCO": "SFO",
+    "SEATTLE": "SEA",
+    "HOUSTON": "IAH",
+    "ATLANTA": "ATL",
+}
+
+_CODE_IN_PARENS = re.compile(r"\(([A-Za-z]{3})\)")
+_BARE_CODE = re.compile(r"^[A-Za-z]{3}$")
+
+DAY_FORMAT = "%Y-%m-%d"
+
+# Compound indexes backing every exact search shape we issue
+SEARCH_INDEXES = [
+    IndexModel(
+        [("originCode", ASCENDING), ("destinationCode", ASCENDING), ("departureDay", ASCENDING), ("price", ASCENDING)],
+        name="route_day_price",
+    ),
+    IndexModel(
+        [("destinationCode", ASCENDING), ("departureDay", ASCENDING), ("price", ASCENDING)],
+        name="destination_day_price",
+    ),
+    IndexModel(
+        [("departureDay", ASCENDING), ("price", ASCENDING)],
+        name="day_price",
+    ),
+    # Keyset pagination orders every listing by (departureTime, _id)
+    IndexModel(
+        [("originCode", ASCENDING), ("destinationCode", ASCENDING), ("departureTime", ASCENDING), ("_id", ASCENDING)],
+        name="route_departure",
+    ),
+    IndexModel(
+        [("departureTime", ASCENDING), ("_id", ASCENDING)],
+        name="departure",
+    ),
+]
+
+
+def normalize_airport(value):
+    """
+    Reduce an airport string to its IATA code.
+    Accepts "New York (JFK)", "jfk" or "New York"; returns None for blank input.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if not value:
+        return None
+
+    match = _CODE_IN_PARENS.search(value)
+    if match:
+        return match.group(1).upper()
+    if _BARE_CODE.match(value):
+        return value.upper()
+    return AIRPORT_CODES.get(value.upper(), value.upper())
+
+
+def departure_day(departure_time):
+    """
+    Day bucket ("YYYY-MM-DD") for a departure datetime or ISO string.
+    """
+    if isinstance(departure_time, str):
+        departure_time = datetime.fromisoformat(departure_time)
+    return departure_time.strftime(DAY_FORMAT)
+
+
+def search_fields(flight):
+    """
+    Derived, indexable fields for a flight document.
+    """
+    return {
+        "originCode": normalize_airport(flight.get("origin")),
+        "destinationCode": normalize_airport(flight.get("destination")),
+        "departureDay": departure_day(flight["departureTime"]),
+    }
+
+
+def parse_price(value, name):
+    """
+    A price bound from a request argument; raises ValueError with a
+    user-facing message unless it is a finite, non-negative number.
+    """
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}. Use a number.")
+    if not math.isfinite(price) or price < 0:
+        raise ValueError(f"Invalid {name}. Use a number of zero or more.")
+    return price
+
+
+def build_search_query(origin=None, destination=None, date=None, min_price=None, max_price=None):
+    """
+    Build an exact-match query served by the SEARCH_INDEXES.
+    Raises ValueError with a user-facing message when `date` is not
+    YYYY-MM-DD or a price bound is not a valid price.
+    """
+    query = {}
+    origin_code = normalize_airport(origin)
+    destination_code = normalize_airport(destination)
+    if origin_code:
+        query["originCode"] = origin_code
+    if destination_code:
+        query["destinationCode"] = destination_code
+    if date:
+        try:
+            query["departureDay"] = datetime.strptime(date, DAY_FORMAT).strftime(DAY_FORMAT)
+        except ValueError:
+            raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+
+    price_query = {}
+    if min_price:
+        price_query["$gte"] = parse_price(min_price, "minimum price")
+    if max_price:
+        price_query["$lte"] = parse_price(max_price, "maximum price")
+    if price_query.get("$gte", 0) > price_query.get("$lte", math.inf):
+        raise ValueError("The minimum price cannot be above the maximum price.")
+    if price_query:
+        query["price"] = price_query
+    return query
+
+
+def ensure_indexes(db):
+    """
+    Declare the search indexes; a no-op when they already exist.
+    """
+    db.get_collection("flights").create_indexes(SEARCH_INDEXES)
+
+
+def _plan_stages(plan):
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "outerStage", "innerStage"):
+        if key in plan:
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def winning_plan_stages(flights_collection, query, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Plan stages for the page the search API would fetch: the keyset sort
+    and limit change which index wins, so they are explained too.
+    """
+    explain = keyset_cursor(flights_collection, query, page_size, cursor).explain()
+    return _plan_stages(explain["queryPlanner"]["winningPlan"])
+
+
+def assert_index_used(flights_collection, query, cursor=None):
+    """
+    Raise RuntimeError if the winning plan for a page of `query` is a collection scan.
+    """
+    stages = winning_plan_stages(flights_collection, query, cursor)
+    if "COLLSCAN" in stages:
+        raise RuntimeError(f"Search query falls back to COLLSCAN: {query}")
+    return stages
+
+
+def backfill_search_fields(flights_collection, batch_size=1000):
+    """
+    Write the derived search fields onto flights that are missing them.
+    For a large collection prefer `python -m app.migrations search_fields`,
+    which runs in parallel and resumes from checkpoints.
+    """
+    updated = 0
+    operations = []
+    missing = {"$or": [{"originCode": {"$exists": False}}, {"departureDay": {"$exists": False}}]}
+    for flight in flights_collection.find(missing, {"origin": 1, "destination": 1, "departureTime": 1}):
+        operations.append(UpdateOne({"_id": flight["_id"]}, {"$set": search_fields(flight)}))
+        if len(operations) >= batch_size:
+            updated += flights_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += flights_collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+
+# Representative search shapes checked by tests/test_search_indexes.py and `python -m app.flight_search`
+EXPLAIN_SAMPLES = [
+    {"origin": "JFK", "destination": "LAX", "date": None},
+    {"origin": "JFK", "destination": "LAX", "date": "2025-01-15"},
+    {"origin": None, "destination": "MIA", "date": "2025-01-15"},
+    {"origin": None, "destination": None, "date": "2025-01-15", "max_price": 500},
+]
+
+if __name__ == "__main__":
+    import os
+    import sys
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGO_URI")).get_database()
+    ensure_indexes(db)
+    if "--backfill" in sys.argv:
+        print(f"Backfilled search fields on {backfill_search_fields(db.flights)} flights.")
+
+    failures = 0
+    for sample in EXPLAIN_SAMPLES:
+        query = build_search_query(**sample)
+        try:
+            print(f"OK   {query} -> {assert_index_used(db.flights, query)}")
+        except RuntimeError as e:
+            failures += 1
+            print(f"FAIL {e}")
+    sys.exit(1 if failures else 0)
@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, IntegerField
+from wtforms import StringField, PasswordField, SubmitField, IntegerField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, NumberRange, Regexp
 
 class LoginForm(FlaskForm):
@@ -33,7 +33,7 @@ class PaymentForm(FlaskForm):
             Regexp(r"^(0[1-9]|1[0-2])/[0-9]{2}$", message="Invalid Expiry Date format. Use MM/YY."),
         ],
     )
-    cvv = StringField(
+    cvv = PasswordField(
         "CVV",
         validators=[
             DataRequired(message="CVV is required."),
@@ -41,4 +41,6 @@ class PaymentForm(FlaskForm):
             Regexp(r"^\d{3}$", message="CVV must contain only digits."),
         ],
     )
+    # Lets a resubmitted form be recognized as a retry (see app.idempotency)
+    idempotency_key = HiddenField()
     submit = SubmitField("Submit Payment")
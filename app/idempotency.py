@@ -0,0 +1,213 @@
+"""
+Idempotency keys for write endpoints.
+
+A client that may retry sends an `Idempotency-Key` header (HTML forms use
+an `idempotency_key` field instead). The first request with a key claims
+it in the `idempotency_keys` collection and runs normally; its response
+is then stored there until IDEMPOTENCY_TTL expires it through a TTL index.
+Replays get the stored response back without running the view, so no
+seat, booking or gateway charge is repeated. A duplicate that arrives
+while the first is still running waits for it, on a local event when
+both are in this process, by polling the record otherwise, and then
+replays its response. Server errors are not stored, so they can be retried.
+"""
+import hashlib
+import hmac
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, jsonify, make_response, request
+from flask_login import current_user
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from app.db import get_db
+
+COLLECTION = "idempotency_keys"
+HEADER = "Idempotency-Key"
+FORM_FIELD = "idempotency_key"
+CSRF_FIELD = "csrf_token"
+MAX_KEY_LENGTH = 255
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_LOCK_TIMEOUT = 30
+DEFAULT_WAIT = 10
+
+# Response headers worth replaying; cookies belong to the original session
+REPLAYED_HEADERS = ("Content-Type", "Location")
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def ensure_indexes(db):
+    db.get_collection(COLLECTION).create_index([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expiry")
+
+
+def _request_key():
+    return request.headers.get(HEADER) or request.form.get(FORM_FIELD)
+
+
+def _fingerprint():
+    """
+    Keyed hash of the request. Form posts hash their parsed fields, since
+    the raw body is gone once request.form has been read; the CSRF token
+    changes per page and is left out. The HMAC keeps card fields in a
+    payment form from being recoverable from the stored digest.
+    """
+    digest = hmac.new(current_app.config["SECRET_KEY"].encode(), digestmod=hashlib.sha256)
+    digest.update(f"{request.method} {request.path}\n".encode())
+    if request.form:
+        for name, value in sorted(request.form.items(multi=True)):
+            if name != CSRF_FIELD:
+                digest.update(f"{name}={value}\n".encode())
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _replay(record):
+    stored = record["response"]
+    response = make_response(stored["body"], stored["status"])
+    for name, value in stored["headers"].items():
+        response.headers[name] = value
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _still_processing():
+    response = jsonify({"error": "A request with this idempotency key is still being processed"})
+    response.headers["Retry-After"] = "1"
+    return response, 409
+
+
+def _key_reused():
+    return jsonify({"error": f"{HEADER} was already used with a different request"}), 422
+
+
+def _claim(collection, record_id, fingerprint):
+    """
+    Insert the in-progress record, or take over one whose owner died
+    mid-request. Returns None on success, else the existing record.
+    """
+    config = current_app.config
+    now = datetime.utcnow()
+    claim = {
+        "status": "in_progress",
+        "fingerprint": fingerprint,
+        "locked_until": now + timedelta(seconds=config["IDEMPOTENCY_LOCK_TIMEOUT"]),
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=config["IDEMPOTENCY_TTL"]),
+    }
+    try:
+        collection.insert_one(dict(claim, _id=record_id))
+        return None
+    except DuplicateKeyError:
+        pass
+    stale = collection.find_one_and_update(
+        {"_id": record_id, "status": "in_progress", "locked_until": {"$lt": now}, "fingerprint": fingerprint},
+        {"$set": claim},
+    )
+    if stale:
+        return None
+    return collection.find_one({"_id": record_id}) or {"status": "in_progress", "fingerprint": fingerprint}
+
+
+def _wait_for(collection, record_id, deadline):
+    """
+    Poll until the request holding the key finishes. Returns its completed
+    record, None if it released the key, or False if still running at `deadline`.
+    """
+    delay = 0.05
+    while True:
+        record = collection.find_one({"_id": record_id})
+        if record is None or record["status"] == "complete":
+            return record
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+def _resolve(collection, record_id, record, fingerprint, deadline):
+    """
+    The response for a request whose key is already taken, or None if the
+    key was released (the original failed) and this request should run.
+    """
+    if record.get("fingerprint") != fingerprint:
+        return _key_reused()
+    if record["status"] != "complete":
+        record = _wait_for(collection, record_id, deadline)
+    if record is False:
+        return _still_processing()
+    if record is None:
+        return None
+    if record.get("fingerprint") != fingerprint:
+        return _key_reused()
+    return _replay(record)
+
+
+def idempotent(view):
+    """
+    Make a view's non-GET requests idempotent per (user, endpoint, key).
+    Place it below @login_required so the key is scoped to the caller.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = _request_key()
+        if request.method in ("GET", "HEAD", "OPTIONS") or not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+        user_id = str(current_user.id) if current_user.is_authenticated else "anonymous"
+        record_id = f"{user_id}:{request.endpoint}:{key}"
+        fingerprint = _fingerprint()
+        collection = get_db().get_collection(COLLECTION)
+        deadline = time.monotonic() + current_app.config["IDEMPOTENCY_WAIT"]
+
+        # Duplicates within this process wait on the first one's event before checking the store
+        with _in_flight_lock:
+            event = _in_flight.get(record_id)
+            owner = event is None
+            if owner:
+                event = _in_flight[record_id] = threading.Event()
+        if not owner:
+            event.wait(current_app.config["IDEMPOTENCY_WAIT"])
+
+        try:
+            for _attempt in range(2):
+                existing = _claim(collection, record_id, fingerprint)
+                if existing is None:
+                    break
+                result = _resolve(collection, record_id, existing, fingerprint, deadline)
+                if result is not None:
+                    return result
+            else:
+                return _still_processing()
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                collection.delete_one({"_id": record_id, "status": "in_progress"})
+                raise
+            if response.status_code >= 500 or response.is_streamed:
+                collection.delete_one({"_id": record_id, "status": "in_progress"})
+                return response
+            collection.update_one({"_id": record_id}, {"$set": {
+                "status": "complete",
+                "response": {
+                    "status": response.status_code,
+                    "headers": {name: response.headers[name] for name in REPLAYED_HEADERS if name in response.headers},
+                    "body": response.get_data(),
+                },
+                "completed_at": datetime.utcnow(),
+            }})
+            return response
+        finally:
+            if owner:
+                with _in_flight_lock:
+                    _in_flight.pop(record_id, None)
+                event.set()
+
+    return wrapper
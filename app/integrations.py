@@ -0,0 +1,86 @@
+import threading
+import time
+
+
+class _LazyIntegration:
+    """
+    Stand-in that builds the integration on first attribute access.
+    """
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._registry.get(self._name), attribute)
+
+
+class Integrations:
+    """
+    Optional integrations (mail, SMS, payments) registered by name and
+    built on first use, so booting a worker imports and connects nothing
+    the requests it serves never touch.
+
+    Factories take the app config and should do their own imports.
+    """
+
+    def __init__(self):
+        self.config = {}
+        self._factories = {}
+        self._instances = {}
+        self._init_seconds = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.config = app.config
+        app.extensions["integrations"] = self
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    started = time.perf_counter()
+                    instance = self._factories[name](self.config)
+                    self._init_seconds[name] = time.perf_counter() - started
+                    self._instances[name] = instance
+        return instance
+
+    def lazy(self, name):
+        return _LazyIntegration(self, name)
+
+    def initialized(self):
+        """
+        Integrations built so far, with the seconds each took to build.
+        """
+        return dict(self._init_seconds)
+
+    def reset(self):
+        with self._lock:
+            self._instances.clear()
+            self._init_seconds.clear()
+
+
+def _email(config):
+    from app.transports import build_email_transport
+    return build_email_transport(config)
+
+
+def _sms(config):
+    from app.transports import build_sms_transport
+    return build_sms_transport(config)
+
+
+def _payments(config):
+    from app.payments import build_payment_gateway
+    return build_payment_gateway(config)
+
+
+integrations = Integrations()
+integrations.register("email", _email)
+integrations.register("sms", _sms)
+integrations.register("payments", _payments)
@@ -0,0 +1,311 @@
+"""
+Connecting-itinerary search over an in-memory route graph.
+
+Each process keeps every upcoming flight in a RouteGraph indexed by
+departure time, per origin and per (origin, destination) route, so a
+1- or 2-stop search is a handful of bisects and never touches Mongo.
+The graph is loaded on the first itinerary search in a process and then
+kept current by a change stream on `flights`; deployments without change
+streams reload it every ITINERARY_REFRESH_INTERVAL seconds instead.
+"""
+import heapq
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from app.flight_search import DAY_FORMAT, normalize_airport
+from app.models import FLIGHT_PROJECTIONS, Flight
+
+MAX_STOPS = 2
+DEFAULT_MIN_CONNECTION = 45
+DEFAULT_MAX_CONNECTION = 360
+DEFAULT_REFRESH_INTERVAL = 300
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+SORT_KEYS = ("price", "duration")
+
+GRAPH_PROJECTION = FLIGHT_PROJECTIONS["detail"]
+
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+]
+
+
+def _is_leg(flight):
+    return (
+        flight.origin_code and flight.destination_code
+        and isinstance(flight.departure_time, datetime) and isinstance(flight.arrival_time, datetime)
+    )
+
+
+def itinerary_dict(legs):
+    departure, arrival = legs[0].departure_time, legs[-1].arrival_time
+    return {
+        "legs": [leg.to_dict() for leg in legs],
+        "stops": len(legs) - 1,
+        "total_price": round(sum(leg.price for leg in legs), 2),
+        "departure_time": departure,
+        "arrival_time": arrival,
+        "duration_minutes": int((arrival - departure).total_seconds() // 60),
+        "connection_minutes": [
+            int((following.departure_time - leg.arrival_time).total_seconds() // 60)
+            for leg, following in zip(legs, legs[1:])
+        ],
+    }
+
+
+class RouteGraph:
+    """
+    Flights keyed by origin and by route, each kept sorted by departure time.
+    Mutations mark the affected keys dirty; a key is re-sorted on its next read.
+    """
+
+    def __init__(self, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.mode = None
+        self.loaded_at = None
+        self._collection = None
+        self._pid = None
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self._flights = {}
+        self._members = {}
+        self._sorted = {}
+
+    def configure(self, refresh_interval=None):
+        if refresh_interval is not None:
+            self.refresh_interval = refresh_interval
+
+    def ensure_loaded(self, flights_collection):
+        """
+        Load the graph and start its refresher, once per process.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._collection = flights_collection
+            self._stop_event = threading.Event()
+            self.load()
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="route-graph-refresher", daemon=True).start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            self._pid = None
+
+    def load(self):
+        """
+        Rebuild the graph from every flight that has not yet departed.
+        """
+        since = datetime.utcnow() - timedelta(days=1)
+        flights = [Flight(document) for document in self._collection.find({"departureTime": {"$gte": since}}, GRAPH_PROJECTION)]
+        with self._lock:
+            self._reset()
+            for flight in flights:
+                self._add(flight)
+            self.loaded_at = datetime.utcnow()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "flights": len(self._flights),
+                "airports": len({key[1] for key in self._members if key[0] == "origin"}),
+                "loaded_at": self.loaded_at,
+            }
+
+    @staticmethod
+    def _keys(flight):
+        return (("origin", flight.origin_code), ("route", (flight.origin_code, flight.destination_code)))
+
+    def _add(self, flight):
+        if not _is_leg(flight):
+            return
+        self._flights[flight.id] = flight
+        for key in self._keys(flight):
+            self._members.setdefault(key, {})[flight.id] = flight
+            self._sorted.pop(key, None)
+
+    def _discard(self, flight_id):
+        flight = self._flights.pop(flight_id, None)
+        if flight is None:
+            return
+        for key in self._keys(flight):
+            members = self._members.get(key, {})
+            members.pop(flight_id, None)
+            if not members:
+                self._members.pop(key, None)
+            self._sorted.pop(key, None)
+
+    def upsert(self, document):
+        with self._lock:
+            self._discard(str(document["_id"]))
+            self._add(Flight(document))
+
+    def remove(self, flight_id):
+        with self._lock:
+            self._discard(str(flight_id))
+
+    def update_fields(self, flight_id, fields):
+        """
+        Apply an update's changed top-level fields to a flight already in the graph.
+        """
+        changed = {field: value for field, value in fields.items() if field in GRAPH_PROJECTION}
+        if not changed:
+            return
+        with self._lock:
+            flight = self._flights.get(str(flight_id))
+            if flight is None:
+                return
+            if "availableSeats" in changed and len(changed) == 1:
+                # Seat sales are by far the most common update; no re-sorting needed
+                flight.capacity = int(changed["availableSeats"])
+                return
+            document = {"_id": flight_id, **self._document(flight), **changed}
+            self._discard(flight.id)
+            self._add(Flight(document))
+
+    @staticmethod
+    def _document(flight):
+        return {
+            "origin": flight.origin, "destination": flight.destination,
+            "originCode": flight.origin_code, "destinationCode": flight.destination_code,
+            "departureTime": flight.departure_time, "arrivalTime": flight.arrival_time,
+            "departureDay": flight.departure_day, "price": flight.price,
+            "availableSeats": flight.capacity, "airline": flight.airline, "class": flight.travel_class,
+        }
+
+    def _departing(self, key, earliest, latest):
+        """
+        Flights under `key` departing in [earliest, latest].
+        """
+        index = self._sorted.get(key)
+        if index is None:
+            flights = sorted(self._members.get(key, {}).values(), key=lambda flight: flight.departure_time)
+            index = self._sorted[key] = ([flight.departure_time for flight in flights], flights)
+        departures, flights = index
+        return flights[bisect_left(departures, earliest):bisect_right(departures, latest)]
+
+    def search(self, origin, destination, earliest, latest, max_stops=MAX_STOPS,
+               min_connection=timedelta(minutes=DEFAULT_MIN_CONNECTION),
+               max_connection=timedelta(minutes=DEFAULT_MAX_CONNECTION),
+               sort_by="price", limit=DEFAULT_LIMIT, seats=1):
+        """
+        Itineraries from `origin` to `destination` whose first leg departs in
+        [earliest, latest], with at most `max_stops` connections, each between
+        min_connection and max_connection long. Returns up to `limit`
+        itinerary dicts ranked by total price or total duration.
+        """
+        if sort_by == "duration":
+            rank = lambda legs: (legs[-1].arrival_time - legs[0].departure_time, sum(leg.price for leg in legs))
+        else:
+            rank = lambda legs: (sum(leg.price for leg in legs), legs[-1].arrival_time - legs[0].departure_time)
+        found = []
+
+        def extend(legs, visited):
+            last = legs[-1]
+            if last.destination_code == destination:
+                found.append(tuple(legs))
+                return
+            stops_left = max_stops - (len(legs) - 1)
+            if stops_left <= 0:
+                return
+            # The final leg must land at the destination, so read the route index directly
+            key = ("route", (last.destination_code, destination)) if stops_left == 1 else ("origin", last.destination_code)
+            for following in self._departing(key, last.arrival_time + min_connection, last.arrival_time + max_connection):
+                if following.capacity < seats or following.destination_code in visited:
+                    continue
+                extend(legs + [following], visited | {following.destination_code})
+
+        with self._lock:
+            for first in self._departing(("origin", origin), earliest, latest):
+                if first.capacity >= seats and first.destination_code != origin:
+                    extend([first], {origin, first.destination_code})
+        return [itinerary_dict(legs) for legs in heapq.nsmallest(limit, found, key=rank)]
+
+    def _run(self):
+        try:
+            self._watch()
+        except Exception as e:
+            # Standalone servers have no change streams (OperationFailure)
+            print(f"Route graph change stream unavailable ({e}); reloading every {self.refresh_interval}s")
+        self.mode = "reload"
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Error reloading route graph: {e}")
+
+    def _watch(self):
+        with self._collection.watch(CHANGE_STREAM_PIPELINE) as stream:
+            self.mode = "change_stream"
+            # Catch up on anything written between the initial load and the stream opening
+            self.load()
+            while not self._stop_event.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    self._apply_change(change)
+
+    def _apply_change(self, change):
+        flight_id = change["documentKey"]["_id"]
+        operation = change["operationType"]
+        if operation == "delete":
+            self.remove(flight_id)
+        elif operation in ("insert", "replace"):
+            self.upsert({field: value for field, value in change["fullDocument"].items()
+                         if field == "_id" or field in GRAPH_PROJECTION})
+        else:
+            self.update_fields(flight_id, change.get("updateDescription", {}).get("updatedFields", {}))
+
+
+def parse_itinerary_search(args, config):
+    """
+    Keyword arguments for RouteGraph.search from request args; raises
+    ValueError with a user-facing message on bad input.
+    """
+    origin = normalize_airport(args.get("origin"))
+    destination = normalize_airport(args.get("destination"))
+    if not origin or not destination:
+        raise ValueError("origin and destination are required")
+    if origin == destination:
+        raise ValueError("origin and destination must differ")
+    try:
+        day = datetime.strptime(args.get("date") or "", DAY_FORMAT)
+    except ValueError:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+
+    try:
+        max_stops = int(args.get("max_stops", MAX_STOPS))
+        min_connection = int(args.get("min_connection", config["ITINERARY_MIN_CONNECTION"]))
+        max_connection = int(args.get("max_connection", config["ITINERARY_MAX_CONNECTION"]))
+        limit = int(args.get("limit", DEFAULT_LIMIT))
+        seats = int(args.get("seats", 1))
+    except (TypeError, ValueError):
+        raise ValueError("max_stops, min_connection, max_connection, limit and seats must be integers")
+    if not 0 <= max_stops <= MAX_STOPS:
+        raise ValueError(f"max_stops must be between 0 and {MAX_STOPS}")
+    if not 0 <= min_connection <= max_connection:
+        raise ValueError("min_connection must be between 0 and max_connection")
+    sort_by = args.get("sort", "price")
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_KEYS)}")
+
+    return {
+        "origin": origin,
+        "destination": destination,
+        "earliest": day,
+        "latest": day + timedelta(days=1) - timedelta(microseconds=1),
+        "max_stops": max_stops,
+        "min_connection": timedelta(minutes=min_connection),
+        "max_connection": timedelta(minutes=max_connection),
+        "sort_by": sort_by,
+        "limit": max(1, min(limit, MAX_LIMIT)),
+        "seats": max(1, seats),
+    }
+
+
+route_graph = RouteGraph()
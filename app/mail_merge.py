@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from jinja2 import Environment
+from pymongo import ASCENDING
+from app.booking_enrichment import to_object_id
+from app.outbox import enqueue_many
+
+_TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates", "email")
+
+# Named plain-text notification templates ("Subject: ..." line, blank line, body)
+NOTIFICATION_TEMPLATES = {
+    "booking_confirmation": os.path.join(os.path.dirname(__file__), "apis", "booking_confirmation_email.txt"),
+    "flight_delay": os.path.join(_TEMPLATE_DIR, "flight_delay.txt"),
+    "gate_change": os.path.join(_TEMPLATE_DIR, "gate_change.txt"),
+}
+
+_environment = Environment(autoescape=False, keep_trailing_newline=True)
+
+BOOKING_PROJECTION = {"user_id": 1, "seat_number": 1}
+USER_CONTACT_PROJECTION = {"email": 1, "name": 1, "username": 1}
+
+
+def ensure_indexes(db):
+    db.get_collection("bookings").create_index([("flight_id", ASCENDING)], name="bookings_by_flight")
+
+
+@lru_cache(maxsize=64)
+def compiled_template(source):
+    """
+    Parse a template source once per process.
+    """
+    return _environment.from_string(source)
+
+
+@lru_cache(maxsize=None)
+def _template_source(name):
+    with open(NOTIFICATION_TEMPLATES[name]) as template_file:
+        return template_file.read()
+
+
+def render_notification(name_or_source, context):
+    """
+    Render a named template (or raw template source) into (subject, body).
+    """
+    source = _template_source(name_or_source) if name_or_source in NOTIFICATION_TEMPLATES else name_or_source
+    rendered = compiled_template(source).render(**context).strip()
+    first_line, _, body = rendered.partition("\n")
+    if first_line.lower().startswith("subject:"):
+        return first_line[len("subject:"):].strip(), body.strip()
+    return "", rendered
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class MergeProgress:
+    """
+    Thread-safe counters describing a running mail-merge job.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def record(self, sent=0, failed=0, skipped=0):
+        with self._lock:
+            self.sent += sent
+            self.failed += failed
+            self.skipped += skipped
+
+    def finish(self, error=None):
+        self.error = error
+        self.finished_at = time.monotonic()
+
+    def as_dict(self):
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        processed = self.sent + self.failed + self.skipped
+        return {
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "done": self.finished_at is not None,
+            "error": self.error,
+            "elapsed_seconds": round(elapsed, 3),
+            "messages_per_second": round(self.sent / elapsed, 1) if elapsed > 0 else 0.0,
+            "percent": round(100.0 * processed / self.total, 1) if self.total else 100.0,
+        }
+
+
+def iter_passenger_messages(db, flight, template, extra_context=None, batch_size=200):
+    """
+    Stream a flight's bookings and yield one rendered message per passenger.
+    Users are loaded with one `$in` query per batch of bookings.
+    Yields None for bookings whose user has no email address.
+    """
+    flight_context = {
+        "origin": flight.get("origin"),
+        "destination": flight.get("destination"),
+        "departure_time": flight.get("departureTime"),
+        "arrival_time": flight.get("arrivalTime"),
+        "flight_number": flight.get("flight_number", str(flight["_id"])),
+        "flight_date": flight.get("departureDay"),
+    }
+    flight_context.update(extra_context or {})
+
+    bookings = db.bookings.find(
+        {"flight_id": {"$in": [flight["_id"], str(flight["_id"])]}}, BOOKING_PROJECTION
+    ).batch_size(batch_size)
+
+    for booking_batch in _chunks(bookings, batch_size):
+        user_ids = {to_object_id(booking.get("user_id")) for booking in booking_batch} - {None}
+        users = {
+            user["_id"]: user
+            for user in db.users.find({"_id": {"$in": list(user_ids)}}, USER_CONTACT_PROJECTION)
+        }
+        for booking in booking_batch:
+            user = users.get(to_object_id(booking.get("user_id")))
+            if not user or not user.get("email"):
+                yield None
+                continue
+            subject, body = render_notification(template, dict(
+                flight_context,
+                user_name=user.get("name") or user.get("username", "Customer"),
+                seat=booking.get("seat_number"),
+            ))
+            yield {"channel": "email", "recipient": user["email"], "subject": subject, "body": body}
+
+
+def notify_flight_passengers(db, flight_id, template, transport, extra_context=None,
+                             connections=4, chunk_size=100, progress=None):
+    """
+    Send `template` to every passenger on a flight.
+
+    Messages are rendered from the compiled-template cache and sent in chunks,
+    each chunk over one reused SMTP connection, with up to `connections`
+    chunks in flight. Messages that fail are handed to the notification
+    outbox so its workers retry them. Returns the MergeProgress.
+    """
+    flight_oid = to_object_id(flight_id)
+    flight = db.flights.find_one(
+        {"_id": flight_oid},
+        {"origin": 1, "destination": 1, "departureTime": 1, "arrivalTime": 1, "departureDay": 1, "flight_number": 1},
+    )
+    if not flight:
+        raise ValueError(f"Flight {flight_id} not found")
+
+    if progress is None:
+        progress = MergeProgress(db.bookings.count_documents({"flight_id": {"$in": [flight_oid, str(flight_oid)]}}))
+
+    def send_chunk(messages):
+        results = transport.send_batch(messages)
+        failed = [message for message, error in results if error]
+        if failed:
+            enqueue_many(db, failed)
+        progress.record(sent=len(results) - len(failed), failed=len(failed))
+
+    try:
+        with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="mail-merge") as executor:
+            futures = []
+            messages = iter_passenger_messages(db, flight, template, extra_context)
+            for chunk in _chunks(messages, chunk_size):
+                deliverable = [message for message in chunk if message is not None]
+                progress.record(skipped=len(chunk) - len(deliverable))
+                if deliverable:
+                    futures.append(executor.submit(send_chunk, deliverable))
+            for future in futures:
+                future.result()
+        progress.finish()
+    except Exception as e:
+        progress.finish(error=str(e))
+        raise
+    return progress
+
+
+# Jobs started from the admin endpoint, keyed by job id (per process);
+# finished ones are dropped FINISHED_JOB_TTL seconds after they end
+FINISHED_JOB_TTL = 3600
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _evict_finished_jobs():
+    cutoff = time.monotonic() - FINISHED_JOB_TTL
+    with _jobs_lock:
+        for job_id in [job_id for job_id, progress in _jobs.items()
+                       if progress.finished_at is not None and progress.finished_at < cutoff]:
+            del _jobs[job_id]
+
+
+def start_notification_job(db, flight_id, template, transport, extra_context=None, **options):
+    """
+    Run notify_flight_passengers in a background thread; returns the job id.
+    """
+    flight_oid = to_object_id(flight_id)
+    progress = MergeProgress(db.bookings.count_documents({"flight_id": {"$in": [flight_oid, str(flight_oid)]}}))
+    job_id = uuid.uuid4().hex
+    _evict_finished_jobs()
+    with _jobs_lock:
+        _jobs[job_id] = progress
+
+    def run():
+        try:
+            notify_flight_passengers(db, flight_id, template, transport, extra_context, progress=progress, **options)
+        except Exception as e:
+            print(f"Mail-merge job {job_id} failed: {e}")
+
+    threading.Thread(target=run, name=f"mail-merge-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+
+def job_progress(job_id):
+    _evict_finished_jobs()
+    with _jobs_lock:
+        progress = _jobs.get(job_id)
+    return progress.as_dict() if progress else None
+
+
+if __name__ == "__main__":
+    # python -m app.mail_merge <flight_id> <template> [key=value ...]
+    import sys
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+    from app.transports import build_transports
+
+    load_dotenv()
+    flight_id, template_name = sys.argv[1], sys.argv[2]
+    context = dict(argument.split("=", 1) for argument in sys.argv[3:])
+    db = MongoClient(os.getenv("MONGO_URI")).get_database()
+    result = notify_flight_passengers(db, flight_id, template_name, build_transports()["email"], context)
+    print(result.as_dict())
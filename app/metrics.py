@@ -0,0 +1,156 @@
+import bisect
+import threading
+import time
+from flask import Response, request
+from pymongo import monitoring
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label used for Mongo commands issued outside a request (sweeper, workers)
+BACKGROUND = "background"
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics(monitoring.CommandListener):
+    """
+    Per-endpoint request latency histograms plus Mongo command counts and
+    durations attributed to the request that issued them.
+
+    pymongo delivers command events on the thread running the command, so
+    the active endpoint is tracked in a thread-local set by the request hooks.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._commands = {}
+
+    def init_app(self, app):
+        """
+        Install request hooks and the /metrics endpoint. When METRICS_ENABLED
+        is off nothing is installed, so requests pay no cost at all.
+        """
+        self.enabled = app.config.get("METRICS_ENABLED", False)
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule("/metrics", "metrics", self.render)
+
+    def listeners(self):
+        """
+        Event listeners to pass to MongoClient (none when disabled).
+        """
+        return [self] if self.enabled else []
+
+    def _before_request(self):
+        self._local.endpoint = request.endpoint or "unmatched"
+        self._local.started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            key = (self._local.endpoint, request.method, str(response.status_code))
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                histogram = self._requests.get(key)
+                if histogram is None:
+                    histogram = self._requests[key] = Histogram()
+                histogram.observe(elapsed)
+        return response
+
+    def _teardown_request(self, exc=None):
+        self._local.endpoint = None
+        self._local.started = None
+
+    def _record_command(self, event, failed):
+        key = (getattr(self._local, "endpoint", None) or BACKGROUND, event.command_name)
+        with self._lock:
+            counters = self._commands.get(key)
+            if counters is None:
+                counters = self._commands[key] = [0, 0.0, 0]
+            counters[0] += 1
+            counters[1] += event.duration_micros / 1e6
+            counters[2] += failed
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record_command(event, 0)
+
+    def failed(self, event):
+        self._record_command(event, 1)
+
+    def render(self):
+        """
+        Expose everything in the Prometheus text format.
+        """
+        with self._lock:
+            requests = {key: (list(h.counts), h.total, h.count) for key, h in self._requests.items()}
+            commands = {key: list(counters) for key, counters in self._commands.items()}
+
+        lines = [
+            "# HELP airline_http_request_duration_seconds Request latency by endpoint, method and status.",
+            "# TYPE airline_http_request_duration_seconds histogram",
+        ]
+        for (endpoint, method, status), (counts, total, count) in sorted(requests.items()):
+            labels = f'endpoint="{endpoint}",method="{method}",status="{status}"'
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'airline_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'airline_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"airline_http_request_duration_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"airline_http_request_duration_seconds_count{{{labels}}} {count}")
+
+        lines += [
+            "# HELP airline_mongo_commands_total Mongo commands by originating endpoint and command.",
+            "# TYPE airline_mongo_commands_total counter",
+        ]
+        lines += [
+            f'airline_mongo_commands_total{{endpoint="{endpoint}",command="{command}"}} {counters[0]}'
+            for (endpoint, command), counters in sorted(commands.items())
+        ]
+        lines += [
+            "# HELP airline_mongo_command_seconds_total Time spent in Mongo commands.",
+            "# TYPE airline_mongo_command_seconds_total counter",
+        ]
+        lines += [
+            f'airline_mongo_command_seconds_total{{endpoint="{endpoint}",command="{command}"}} {counters[1]:.6f}'
+            for (endpoint, command), counters in sorted(commands.items())
+        ]
+        lines += [
+            "# HELP airline_mongo_command_failures_total Mongo commands that returned an error.",
+            "# TYPE airline_mongo_command_failures_total counter",
+        ]
+        lines += [
+            f'airline_mongo_command_failures_total{{endpoint="{endpoint}",command="{command}"}} {counters[2]}'
+            for (endpoint, command), counters in sorted(commands.items())
+        ]
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._commands.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,271 @@
+import threading
+import time
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import PyMongoError
+from app.flight_search import search_fields
+from app.seat_inventory import booked_seats_by_flight, legacy_seat_bits
+
+CHECKPOINTS = "migration_checkpoints"
+
+
+class Migration:
+    """
+    A reshape of documents in one collection.
+
+    `filter` selects the documents that still need the change (and guards each
+    write, so documents changed concurrently are left alone); `transform`
+    returns the update for one document, or None to leave it as is. With
+    `load`, each batch first calls load(db, documents) once and the result
+    is passed to transform as a second argument, so related data is read
+    per batch rather than per document.
+    """
+
+    __slots__ = ("name", "collection", "filter", "projection", "transform", "load")
+
+    def __init__(self, name, collection, filter, projection, transform, load=None):
+        self.name = name
+        self.collection = collection
+        self.filter = filter
+        self.projection = projection
+        self.transform = transform
+        self.load = load
+
+
+def _booked_seats(db, flights):
+    return booked_seats_by_flight(db.get_collection("bookings"), [flight["_id"] for flight in flights])
+
+
+def _seat_bits_update(flight, booked):
+    # Seat-map bookings never cleared is_available, so the bookings collection decides too
+    seat_bits, available = legacy_seat_bits(flight, booked[flight["_id"]])
+    return {
+        "$set": {"seatBits": seat_bits, "availableSeats": available},
+        "$unset": {"seats": ""},
+    }
+
+
+def _search_fields_update(flight):
+    return {"$set": search_fields(flight)}
+
+
+MIGRATIONS = {
+    migration.name: migration
+    for migration in (
+        Migration(
+            "seat_bits", "flights",
+            {"seatBits": {"$exists": False}},
+            {"seats": 1},
+            _seat_bits_update,
+            load=_booked_seats,
+        ),
+        Migration(
+            "search_fields", "flights",
+            {"$or": [{"originCode": {"$exists": False}}, {"departureDay": {"$exists": False}}]},
+            {"origin": 1, "destination": 1, "departureTime": 1},
+            _search_fields_update,
+        ),
+    )
+}
+
+
+def split_ranges(collection, query, partitions):
+    """
+    Split the documents matching `query` into roughly equal `_id` ranges.
+    Returns [(lower, upper)] with lower inclusive, upper exclusive and the
+    first lower / last upper None (unbounded).
+    """
+    buckets = list(collection.aggregate([
+        {"$match": query},
+        {"$project": {"_id": 1}},
+        {"$bucketAuto": {"groupBy": "$_id", "buckets": max(partitions, 1)}},
+    ], allowDiskUse=True))
+    if not buckets:
+        return []
+    bounds = [bucket["_id"]["min"] for bucket in buckets[1:]]
+    return list(zip([None] + bounds, bounds + [None]))
+
+
+def _range_query(query, lower, upper, after=None):
+    id_range = {}
+    if after is not None:
+        id_range["$gt"] = after
+    elif lower is not None:
+        id_range["$gte"] = lower
+    if upper is not None:
+        id_range["$lt"] = upper
+    return dict(query, _id=id_range) if id_range else dict(query)
+
+
+class MigrationRunner:
+    """
+    Applies a Migration with a pool of threads, one `_id` range at a time.
+
+    Updates are sent as unordered `bulk_write` batches. After every batch
+    the range's checkpoint records the last `_id` written, so a rerun
+    resumes where the previous one stopped; failed ranges are reported and
+    retried on the next run instead of aborting the others.
+    """
+
+    def __init__(self, db, migration, workers=8, batch_size=1000, dry_run=False, log=print):
+        self.db = db
+        self.migration = migration
+        self.collection = db.get_collection(migration.collection)
+        self.checkpoints = db.get_collection(CHECKPOINTS)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.log = log
+        self.scanned = 0
+        self.changed = 0
+        self.failed_ranges = []
+        self._lock = threading.Lock()
+
+    def _plan(self, restart=False):
+        """
+        Resume the unfinished ranges of an interrupted run, or split the
+        collection and record fresh ones.
+        """
+        name = self.migration.name
+        unfinished = [] if restart else list(
+            self.checkpoints.find({"migration": name, "status": {"$ne": "done"}}).sort("index", ASCENDING)
+        )
+        if unfinished:
+            return unfinished
+        if not self.dry_run:
+            self.checkpoints.delete_many({"migration": name})
+
+        ranges = split_ranges(self.collection, self.migration.filter, self.workers * 4)
+        plan = [
+            {"_id": f"{name}:{index}", "migration": name, "index": index,
+             "lower": lower, "upper": upper, "last_id": None, "status": "pending"}
+            for index, (lower, upper) in enumerate(ranges)
+        ]
+        if plan and not self.dry_run:
+            self.checkpoints.insert_many(plan, ordered=False)
+        return plan
+
+    def _flush(self, checkpoint, operations, last_id):
+        if not self.dry_run:
+            self.collection.bulk_write(operations, ordered=False)
+            self.checkpoints.update_one(
+                {"_id": checkpoint["_id"]},
+                {"$set": {"last_id": last_id, "status": "running", "updated_at": datetime.utcnow()},
+                 "$inc": {"changed": len(operations)}},
+            )
+        with self._lock:
+            self.changed += len(operations)
+
+    def _apply(self, checkpoint, documents):
+        migration = self.migration
+        if migration.load is None:
+            updates = [migration.transform(document) for document in documents]
+        else:
+            context = migration.load(self.db, documents)
+            updates = [migration.transform(document, context) for document in documents]
+        operations = [
+            UpdateOne(dict(migration.filter, _id=document["_id"]), update)
+            for document, update in zip(documents, updates) if update is not None
+        ]
+        if operations:
+            self._flush(checkpoint, operations, documents[-1]["_id"])
+
+    def _run_range(self, checkpoint):
+        migration = self.migration
+        query = _range_query(migration.filter, checkpoint["lower"], checkpoint["upper"], checkpoint.get("last_id"))
+        cursor = self.collection.find(query, migration.projection).sort("_id", ASCENDING).batch_size(self.batch_size)
+
+        batch, scanned = [], 0
+        for document in cursor:
+            scanned += 1
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                self._apply(checkpoint, batch)
+                batch = []
+        if batch:
+            self._apply(checkpoint, batch)
+        if not self.dry_run:
+            self.checkpoints.update_one(
+                {"_id": checkpoint["_id"]},
+                {"$set": {"status": "done", "finished_at": datetime.utcnow()}, "$unset": {"error": ""}},
+            )
+        with self._lock:
+            self.scanned += scanned
+
+    def _worker(self, queue):
+        while True:
+            with self._lock:
+                if not queue:
+                    return
+                checkpoint = queue.pop()
+            try:
+                self._run_range(checkpoint)
+            except Exception as e:
+                # A bad document in a transform fails its range, not the whole worker
+                error = str(e) if isinstance(e, PyMongoError) else f"{type(e).__name__}: {e}"
+                with self._lock:
+                    self.failed_ranges.append((checkpoint["_id"], error))
+                if not self.dry_run:
+                    try:
+                        self.checkpoints.update_one(
+                            {"_id": checkpoint["_id"]}, {"$set": {"status": "failed", "error": error}}
+                        )
+                    except PyMongoError as checkpoint_error:
+                        self.log(f"{checkpoint['_id']}: could not record failure: {checkpoint_error}")
+
+    def run(self, restart=False):
+        """
+        Apply the migration (or, with dry_run, only count what would change).
+        Returns a summary dict.
+        """
+        started = time.monotonic()
+        plan = self._plan(restart)
+        self.log(f"{self.migration.name}: {len(plan)} ranges to process with {self.workers} workers"
+                 f"{' (dry run)' if self.dry_run else ''}")
+
+        queue = list(reversed(plan))
+        threads = [
+            threading.Thread(target=self._worker, args=(queue,), name=f"migration-{index}", daemon=True)
+            for index in range(min(self.workers, len(plan)))
+        ]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=5)
+            self.log(f"{self.migration.name}: {self.changed} documents {'to change' if self.dry_run else 'changed'}")
+
+        elapsed = time.monotonic() - started
+        return {
+            "migration": self.migration.name,
+            "dry_run": self.dry_run,
+            "ranges": len(plan),
+            "scanned": self.scanned,
+            "changed": self.changed,
+            "failed_ranges": self.failed_ranges,
+            "elapsed_seconds": round(elapsed, 2),
+        }
+
+
+if __name__ == "__main__":
+    # python -m app.migrations <name> [--dry-run] [--restart] [--workers N] [--batch-size N]
+    import argparse
+    import os
+    import sys
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run a flight-document migration.")
+    parser.add_argument("name", choices=sorted(MIGRATIONS))
+    parser.add_argument("--dry-run", action="store_true", help="Count the documents that would change")
+    parser.add_argument("--restart", action="store_true", help="Discard checkpoints from earlier runs")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = MongoClient(os.getenv("MONGO_URI")).get_database()
+    runner = MigrationRunner(db, MIGRATIONS[args.name], args.workers, args.batch_size, args.dry_run)
+    summary = runner.run(restart=args.restart)
+    print(summary)
+    sys.exit(1 if summary["failed_ranges"] else 0)
@@ -1,77 +1,224 @@
-from flask_login import UserMixin
 from bson.objectid import ObjectId
 from datetime import datetime
-from app import mongo_db
+from app.db import get_db
+from app.booking_enrichment import FLIGHT_SUMMARY_PROJECTION, fetch_flights_by_id, to_object_id
+from app.pagination import keyset_page
+from app.seat_inventory import decode_seats, free_seat_counts
+
+# Named projections; each call site asks for the smallest one it can render
+FLIGHT_PROJECTIONS = {
+    "list": {
+        "origin": 1, "destination": 1, "departureTime": 1, "arrivalTime": 1,
+        "price": 1, "availableSeats": 1, "airline": 1, "class": 1, "departureDay": 1,
+    },
+    "detail": {
+        "origin": 1, "destination": 1, "originCode": 1, "destinationCode": 1,
+        "departureTime": 1, "arrivalTime": 1, "departureDay": 1,
+        "price": 1, "availableSeats": 1, "airline": 1, "class": 1,
+    },
+    "seatmap": {"origin": 1, "destination": 1, "price": 1, "seatBits": 1, "seats": 1},
+}
+
+BOOKING_PROJECTIONS = {
+    "list": {"user_id": 1, "flight_id": 1, "seat_number": 1, "payment_status": 1, "booking_time": 1, "timestamp": 1},
+}
+
+USER_PROJECTIONS = {
+    "session": {"email": 1, "name": 1, "username": 1, "role": 1, "roles": 1},
+    "auth": {"email": 1, "name": 1, "username": 1, "role": 1, "roles": 1, "password_hash": 1},
+}
+
 
 class Role:
+    __slots__ = ("id", "name")
+
     def __init__(self, role_data):
         self.id = str(role_data.get("_id"))
         self.name = role_data.get("name")
 
     @staticmethod
     def get_roles_for_user(user_id):
-        roles_collection = mongo_db.get_collection("roles")
-        user_roles = roles_collection.find({"user_id": user_id})
+        roles_collection = get_db().get_collection("roles")
+        user_roles = roles_collection.find({"user_id": user_id}, {"name": 1})
         return [Role(role) for role in user_roles]
 
-class User(UserMixin):
+
+class User:
+    # Implements Flask-Login's user interface itself; UserMixin has no
+    # __slots__, so inheriting it would give every instance a __dict__
+    __slots__ = ("id", "username", "email", "password_hash", "created_at", "role", "roles", "permissions")
+
     def __init__(self, user_data):
         self.id = str(user_data["_id"])
-        self.username = user_data.get("username", "Unknown")
+        self.username = user_data.get("username", user_data.get("name", "Unknown"))
         self.email = user_data["email"]
-        self.password_hash = user_data["password_hash"]
+        self.password_hash = user_data.get("password_hash")
         self.created_at = user_data.get("created_at", datetime.utcnow())
         self.role = user_data.get("role", "user")
         self.roles = Role.get_roles_for_user(self.id)
+        # Every role name the user holds, resolved once so checks are O(1)
+        self.permissions = frozenset(
+            [self.role, *user_data.get("roles", []), *(role.name for role in self.roles)]
+        )
+
+    @property
+    def name(self):
+        return self.username
+
+    @property
+    def is_active(self):
+        return True
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return self.id
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
 
     @staticmethod
-    def get_user_by_email(email):
-        users_collection = mongo_db.get_collection("users")
-        user_data = users_collection.find_one({"email": email})
+    def get_user_by_email(email, projection="auth"):
+        users_collection = get_db().get_collection("users")
+        user_data = users_collection.find_one({"email": email}, USER_PROJECTIONS[projection])
         return User(user_data) if user_data else None
 
     @staticmethod
-    def get_user_by_id(user_id):
-        users_collection = mongo_db.get_collection("users")
-        user_data = users_collection.find_one({"_id": ObjectId(user_id)})
+    def get_user_by_id(user_id, projection="session"):
+        user_id = to_object_id(user_id)
+        if user_id is None:
+            return None
+        users_collection = get_db().get_collection("users")
+        user_data = users_collection.find_one({"_id": user_id}, USER_PROJECTIONS[projection])
         return User(user_data) if user_data else None
 
+    def has_role(self, role_name):
+        return role_name in self.permissions
+
     def is_admin(self):
-        return self.role == "admin"
+        return self.has_role("admin")
+
 
 class Flight:
+    __slots__ = (
+        "id", "origin", "destination", "origin_code", "destination_code",
+        "departure_time", "arrival_time", "departure_day", "price", "capacity",
+        "airline", "travel_class", "seat_bits", "seats",
+    )
+
     def __init__(self, flight_data):
         self.id = str(flight_data["_id"])
-        self.origin = flight_data["origin"]
-        self.destination = flight_data["destination"]
-        self.departure_time = flight_data.get("departureTime")
-        self.arrival_time = flight_data.get("arrivalTime")
-        self.price = float(flight_data["price"])
-        self.capacity = int(flight_data["availableSeats"])
+        self.origin = flight_data.get("origin", "Unknown")
+        self.destination = flight_data.get("destination", "Unknown")
+        self.origin_code = flight_data.get("originCode")
+        self.destination_code = flight_data.get("destinationCode")
+        self.departure_time = flight_data.get("departureTime", "TBD")
+        self.arrival_time = flight_data.get("arrivalTime", "TBD")
+        self.departure_day = flight_data.get("departureDay")
+        self.price = float(flight_data.get("price", 0))
+        self.capacity = int(flight_data.get("availableSeats", 0))
+        self.airline = flight_data.get("airline")
+        self.travel_class = flight_data.get("class", "Unknown")
+        self.seat_bits = flight_data.get("seatBits")
+        self.seats = flight_data.get("seats")
+
+    @property
+    def object_id(self):
+        return ObjectId(self.id)
+
+    def seat_map(self):
+        return decode_seats({"seatBits": self.seat_bits, "seats": self.seats or []})
+
+    def free_seats_by_class(self):
+        return free_seat_counts({"seatBits": self.seat_bits})
+
+    def route(self):
+        """
+        Mapping accepted by SearchCache.invalidate_flight and the sales rollups.
+        """
+        return {
+            "_id": self.object_id,
+            "origin": self.origin, "destination": self.destination,
+            "originCode": self.origin_code, "destinationCode": self.destination_code,
+        }
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "origin": self.origin,
+            "destination": self.destination,
+            "departure_date": self.departure_day,
+            "departure_time": self.departure_time,
+            "arrival_time": self.arrival_time,
+            "price": self.price,
+            "capacity": self.capacity,
+            "airline": self.airline,
+            "class": self.travel_class,
+        }
+
+    @staticmethod
+    def iter_flights(query=None, projection="list", sort=None, limit=0):
+        """
+        Lazily yield Flight objects; nothing is materialized up front.
+        """
+        flights_collection = get_db().get_collection("flights")
+        cursor = flights_collection.find(query or {}, FLIGHT_PROJECTIONS[projection])
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return (Flight(flight) for flight in cursor)
+
+    @staticmethod
+    def get_all_flights(projection="list"):
+        return Flight.iter_flights({}, projection)
 
     @staticmethod
-    def get_all_flights():
-        flights_collection = mongo_db.get_collection("flights")
-        flight_data = flights_collection.find({})
-        return [Flight(flight) for flight in flight_data]
+    def get_page(query, page_size, cursor=None, projection="list"):
+        """
+        One keyset page of flights; returns (flights, next_cursor).
+        """
+        flights_collection = get_db().get_collection("flights")
+        flight_data, next_cursor = keyset_page(
+            flights_collection, query, page_size, cursor, projection=FLIGHT_PROJECTIONS[projection]
+        )
+        return [Flight(flight) for flight in flight_data], next_cursor
 
     @staticmethod
-    def get_flight_by_id(flight_id):
-        flights_collection = mongo_db.get_collection("flights")
-        flight_data = flights_collection.find_one({"_id": ObjectId(flight_id)})
+    def get_flight_by_id(flight_id, projection="detail"):
+        flight_id = to_object_id(flight_id)
+        if flight_id is None:
+            return None
+        flights_collection = get_db().get_collection("flights")
+        flight_data = flights_collection.find_one({"_id": flight_id}, FLIGHT_PROJECTIONS[projection])
         return Flight(flight_data) if flight_data else None
 
+
 class Booking:
+    __slots__ = ("id", "user_id", "flight_id", "seat_number", "payment_status", "booking_time")
+
     def __init__(self, booking_data):
         self.id = str(booking_data["_id"])
         self.user_id = booking_data["user_id"]
         self.flight_id = booking_data["flight_id"]
         self.seat_number = booking_data["seat_number"]
-        self.booking_time = booking_data.get("booking_time", datetime.utcnow())
+        self.payment_status = booking_data.get("payment_status", "Pending")
+        self.booking_time = booking_data.get("booking_time", booking_data.get("timestamp"))
 
     @staticmethod
     def create_booking(user_id, flight_id, seat_number):
-        bookings_collection = mongo_db.get_collection("bookings")
+        bookings_collection = get_db().get_collection("bookings")
         booking_data = {
             "user_id": user_id,
             "flight_id": flight_id,
@@ -82,13 +229,48 @@ class Booking:
         return str(result.inserted_id)
 
     @staticmethod
-    def get_bookings_for_user(user_id):
-        bookings_collection = mongo_db.get_collection("bookings")
-        bookings = bookings_collection.find({"user_id": user_id})
-        return [Booking(booking) for booking in bookings]
+    def user_filter(user_id):
+        """
+        Match a user's bookings whichever way `user_id` was stored: booking_api
+        writes the string id, bookings converted from seat holds an ObjectId.
+        """
+        object_id = to_object_id(user_id)
+        return {"$in": [str(user_id), object_id]} if object_id else str(user_id)
+
+    @staticmethod
+    def iter_bookings_for_user(user_id, projection="list"):
+        """
+        Lazily yield the user's bookings.
+        """
+        bookings_collection = get_db().get_collection("bookings")
+        bookings = bookings_collection.find({"user_id": Booking.user_filter(user_id)}, BOOKING_PROJECTIONS[projection])
+        return (Booking(booking) for booking in bookings)
+
+    @staticmethod
+    def get_bookings_for_user(user_id, projection="list"):
+        return list(Booking.iter_bookings_for_user(user_id, projection))
+
+    @staticmethod
+    def get_bookings_with_flights(user_id, projection="list"):
+        """
+        The user's bookings paired with their flights as (Booking, Flight),
+        using one flight query; bookings whose flight is gone are skipped.
+        """
+        bookings = Booking.get_bookings_for_user(user_id, projection)
+        flights = fetch_flights_by_id(
+            get_db().get_collection("flights"), (booking.flight_id for booking in bookings), FLIGHT_SUMMARY_PROJECTION
+        )
+        return [
+            (booking, Flight(flights[to_object_id(booking.flight_id)]))
+            for booking in bookings
+            if to_object_id(booking.flight_id) in flights
+        ]
 
     @staticmethod
-    def get_booking_by_id(booking_id):
-        bookings_collection = mongo_db.get_collection("bookings")
-        booking_data = bookings_collection.find_one({"_id": ObjectId(booking_id)})
+    def get_booking_by_id(booking_id, projection="list"):
+        booking_id = to_object_id(booking_id)
+        if booking_id is None:
+            return None
+        bookings_collection = get_db().get_collection("bookings")
+        booking_data = bookings_collection.find_one({"_id": booking_id}, BOOKING_PROJECTIONS[projection])
         return Booking(booking_data) if booking_data else None
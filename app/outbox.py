@@ -0,0 +1,190 @@
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, UpdateOne
+
+OUTBOX_COLLECTION = "notification_outbox"
+
+# Worker threads per channel in one worker process. The limit is per
+# process, so run a single `python -m app.outbox` per deployment (web
+# processes leave OUTBOX_WORKERS_ENABLED off) to make it a global limit.
+DEFAULT_CONCURRENCY = {"email": 4, "sms": 2}
+
+
+def ensure_indexes(db):
+    collection = db.get_collection(OUTBOX_COLLECTION)
+    collection.create_index(
+        [("channel", ASCENDING), ("status", ASCENDING), ("next_attempt_at", ASCENDING)],
+        name="outbox_claim",
+    )
+    collection.create_index([("lease", ASCENDING)], name="outbox_lease", sparse=True)
+
+
+def enqueue(db, channel, recipient, body, subject=None, **meta):
+    """
+    Record a notification for background delivery and return its id.
+    This is the only work done on the request path: one insert.
+    """
+    now = datetime.utcnow()
+    document = {
+        "channel": channel,
+        "recipient": recipient,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+    if meta:
+        document["meta"] = meta
+    return db.get_collection(OUTBOX_COLLECTION).insert_one(document).inserted_id
+
+
+def enqueue_many(db, messages):
+    """
+    Bulk variant of `enqueue`; `messages` are dicts with channel, recipient,
+    body and optional subject.
+    """
+    now = datetime.utcnow()
+    documents = [
+        dict(message, status="pending", attempts=0, next_attempt_at=now, created_at=now)
+        for message in messages
+    ]
+    if not documents:
+        return []
+    return db.get_collection(OUTBOX_COLLECTION).insert_many(documents, ordered=False).inserted_ids
+
+
+class OutboxWorkerPool:
+    """
+    Drains the outbox with a fixed number of threads per channel.
+
+    Each worker claims up to `batch_size` due messages in three round trips
+    (find candidate ids, lease them with one update_many under a fresh
+    lease token, read back what it won), leasing them for `lease_seconds`
+    so a crashed worker's messages are picked up again. It hands them to
+    the channel's transport in one call, then records the outcome with a
+    single bulk write. Failures, including a transport that raises, are
+    retried with exponential backoff until `max_attempts`.
+    """
+
+    def __init__(self, db, transports, concurrency=None, batch_size=50, max_attempts=5,
+                 base_backoff=5, max_backoff=3600, lease_seconds=120, poll_interval=1.0):
+        self.collection = db.get_collection(OUTBOX_COLLECTION)
+        self.transports = transports
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for channel, transport in self.transports.items():
+            for index in range(self.concurrency.get(channel, 1)):
+                thread = threading.Thread(
+                    target=self._run, args=(channel, transport),
+                    name=f"outbox-{channel}-{index}", daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self, channel, transport):
+        while not self._stop_event.is_set():
+            try:
+                delivered = self.drain_once(channel, transport)
+            except Exception as e:
+                print(f"Outbox worker error on {channel}: {e}")
+                delivered = 0
+            if not delivered:
+                self._stop_event.wait(self.poll_interval)
+
+    def claim_batch(self, channel):
+        now = datetime.utcnow()
+        due = {
+            "channel": channel,
+            "$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "locked_until": {"$lt": now}},
+            ],
+        }
+        candidates = [
+            message["_id"]
+            for message in self.collection.find(due, {"_id": 1}).sort("next_attempt_at", ASCENDING).limit(self.batch_size)
+        ]
+        if not candidates:
+            return []
+        # The due filter guards the update, so a message another worker leased meanwhile is skipped
+        token = uuid.uuid4().hex
+        self.collection.update_many(
+            dict(due, _id={"$in": candidates}),
+            {"$set": {"status": "sending", "lease": token, "locked_until": now + timedelta(seconds=self.lease_seconds)}},
+        )
+        return list(self.collection.find({"lease": token}))
+
+    def backoff(self, attempts):
+        delay = min(self.base_backoff * (2 ** (attempts - 1)), self.max_backoff)
+        return delay * random.uniform(0.8, 1.2)
+
+    def drain_once(self, channel, transport):
+        """
+        Claim and deliver one batch; returns how many messages were handled.
+        """
+        batch = self.claim_batch(channel)
+        if not batch:
+            return 0
+
+        try:
+            results = transport.send_batch(batch)
+        except Exception as e:
+            # e.g. a socket timeout: the whole batch failed and counts as one attempt each
+            results = [(message, f"{type(e).__name__}: {e}") for message in batch]
+
+        now = datetime.utcnow()
+        operations = []
+        for message, error in results:
+            if error is None:
+                update = {"$set": {"status": "sent", "sent_at": now}, "$unset": {"locked_until": "", "lease": ""}}
+            else:
+                attempts = message.get("attempts", 0) + 1
+                if attempts >= self.max_attempts:
+                    status, next_attempt_at = "failed", None
+                else:
+                    status, next_attempt_at = "pending", now + timedelta(seconds=self.backoff(attempts))
+                update = {
+                    "$set": {"status": status, "attempts": attempts, "last_error": error, "next_attempt_at": next_attempt_at},
+                    "$unset": {"locked_until": "", "lease": ""},
+                }
+            operations.append(UpdateOne({"_id": message["_id"]}, update))
+
+        self.collection.bulk_write(operations, ordered=False)
+        return len(batch)
+
+
+if __name__ == "__main__":
+    # Run delivery workers as a standalone process
+    import os
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+    from app.transports import build_transports
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGO_URI")).get_database()
+    ensure_indexes(db)
+    pool = OutboxWorkerPool(db, build_transports())
+    pool.start()
+    print("Outbox workers running; press Ctrl+C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pool.stop(timeout=5)
@@ -0,0 +1,83 @@
+import base64
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import ASCENDING
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Listing pages never need the seat inventory or active holds
+LIST_PROJECTION = {"seats": 0, "seatBits": 0, "holds": 0}
+
+KEYSET_SORT = [("departureTime", ASCENDING), ("_id", ASCENDING)]
+
+
+def encode_cursor(flight):
+    """
+    Opaque next-page token for the last flight on a page.
+    """
+    raw = f"{flight['departureTime'].isoformat()}|{flight['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Return (departure_time, _id) from a token; raises ValueError if malformed.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        departure_time, flight_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(departure_time), ObjectId(flight_id)
+    except Exception:
+        raise ValueError("Invalid page cursor")
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        size = int(value) if value else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def keyset_query(query, cursor=None):
+    """
+    Restrict `query` to the flights after `cursor` in (departureTime, _id) order.
+    """
+    if not cursor:
+        return query
+    departure_time, flight_id = decode_cursor(cursor)
+    return {"$and": [query, {"$or": [
+        {"departureTime": {"$gt": departure_time}},
+        {"departureTime": departure_time, "_id": {"$gt": flight_id}},
+    ]}]}
+
+
+def split_page(documents, page_size):
+    """
+    Trim the look-ahead document fetched past the page; returns (documents, next_cursor).
+    """
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        return documents, encode_cursor(documents[-1])
+    return documents, None
+
+
+def keyset_cursor(collection, query, page_size, cursor=None, projection=None):
+    """
+    The cursor behind one page, including the look-ahead document.
+    """
+    return (
+        collection.find(keyset_query(query, cursor), projection or LIST_PROJECTION)
+        .sort(KEYSET_SORT)
+        .limit(page_size + 1)
+    )
+
+
+def keyset_page(collection, query, page_size, cursor=None, projection=None):
+    """
+    Fetch one page ordered by (departureTime, _id) starting after `cursor`.
+    Returns (documents, next_cursor); next_cursor is None on the last page.
+    """
+    documents = list(keyset_cursor(collection, query, page_size, cursor, projection))
+    return split_page(documents, page_size)
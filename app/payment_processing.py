@@ -0,0 +1,319 @@
+"""
+Asynchronous card payments.
+
+The payment route does only local work: it records a `payments` document
+in state "pending" and queues the card details (held in memory only, never
+stored) for the PaymentProcessor. Its bounded pool of worker threads
+calls the gateway through a circuit breaker and moves the payment to
+"paid" or "failed". Clients poll GET /api/payments/<id> for the outcome.
+
+A seat paid for from a hold stays a hold until the charge succeeds: the
+hold is tagged with the payment and extended past the reaper's timeout,
+and only a successful charge turns it into a Paid booking and counts the
+sale. A failed charge gives the hold back to the user for a short retry
+window, after which the hold sweeper releases the seat as usual. Paying
+for an existing unpaid booking marks it "Pending" while the charge runs.
+
+When the queue is full or the breaker is open the payment fails at once
+without touching the gateway, so a slow or broken provider costs
+callers one fast error instead of a blocked request thread.
+"""
+import queue
+import threading
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo import ASCENDING
+from app.payments import CircuitBreaker, GatewayError
+from app.sales_rollups import booking_day, record_booking, record_payment
+from app.seat_holds import active_hold_filter, convert_hold, payment_hold_filter
+
+PAYMENTS_COLLECTION = "payments"
+
+PENDING = "pending"
+PAID = "paid"
+FAILED = "failed"
+
+# Booking payment_status for each payment state
+BOOKING_STATUS = {PENDING: "Pending", PAID: "Paid", FAILED: "Failed"}
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_PENDING_TIMEOUT = 120
+# How long a failed payment's hold stays with the user for a retry
+RETRY_HOLD_SECONDS = 120
+
+UNAVAILABLE_MESSAGE = "Payments are temporarily unavailable. You have not been charged; please try again shortly."
+GATEWAY_ERROR_MESSAGE = "The payment provider could not be reached. You have not been charged; please try again."
+ABANDONED_MESSAGE = "The payment could not be completed. You have not been charged; please try again."
+HOLD_LOST_MESSAGE = "Your seat hold expired before the payment completed. Any charge has been refunded."
+
+
+def ensure_indexes(db):
+    collection = db.get_collection(PAYMENTS_COLLECTION)
+    collection.create_index([("user_id", ASCENDING), ("created_at", ASCENDING)], name="user_created")
+    collection.create_index([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created")
+
+
+def start_payment(db, flight, seat_number, user_id, holding, booking_query, pending_timeout=DEFAULT_PENDING_TIMEOUT):
+    """
+    Record a pending payment for a held seat or an unpaid booking.
+
+    A hold is tagged with the payment and kept until at least twice
+    `pending_timeout` from now, so it outlives the reaper and cannot expire
+    while the gateway is working; otherwise the user's existing unpaid
+    booking is marked "Pending". Returns (payment_id, None), or
+    (None, reason) where reason is "expired", "paid" or "in_progress".
+    """
+    now = datetime.utcnow()
+    payment_id = ObjectId()
+    payment = {"_id": payment_id, "user_id": str(user_id)}
+    if holding:
+        hold_filter = active_hold_filter(flight.object_id, seat_number, user_id)
+        hold_filter["holds"]["$elemMatch"]["payment_id"] = {"$exists": False}
+        hold_until = now + timedelta(seconds=2 * pending_timeout)
+        held = db.flights.find_one_and_update(
+            hold_filter,
+            {"$set": {"holds.$.payment_id": payment_id, "holds.$.expires_at": hold_until}},
+            projection={"holds": {"$elemMatch": {"seat_number": str(seat_number), "user_id": str(user_id)}}},
+        )
+        if held is None:
+            if has_pending_hold(db, flight.object_id, seat_number, user_id):
+                return None, "in_progress"
+            return None, "expired"
+        payment.update(booking_id=None, hold_expires_at=held["holds"][0]["expires_at"])
+        price = flight.price
+    else:
+        booking = db.bookings.find_one_and_update(
+            dict(booking_query, payment_status={"$nin": [BOOKING_STATUS[PAID], BOOKING_STATUS[PENDING]]}),
+            {"$set": {"payment_status": BOOKING_STATUS[PENDING], "payment_started_at": now}},
+            projection={"price": 1},
+        )
+        if booking is None:
+            existing = db.bookings.find_one(booking_query, {"payment_status": 1})
+            if existing is None:
+                return None, "expired"
+            return None, "paid" if existing.get("payment_status") == BOOKING_STATUS[PAID] else "in_progress"
+        payment["booking_id"] = booking["_id"]
+        price = booking.get("price") or flight.price
+
+    route = flight.route()
+    payment.update({
+        "flight_id": flight.object_id,
+        "flight": {key: route[key] for key in ("origin", "destination", "originCode", "destinationCode")},
+        "seat_number": str(seat_number),
+        "amount": float(price),
+        "status": PENDING,
+        "created_at": now,
+        "updated_at": now,
+    })
+    db.get_collection(PAYMENTS_COLLECTION).insert_one(payment)
+    return payment_id, None
+
+
+def has_pending_hold(db, flight_id, seat_number, user_id):
+    """
+    Whether the user's hold on the seat is reserved by a payment in progress.
+    """
+    return db.flights.count_documents({"_id": flight_id, "holds": {"$elemMatch": {
+        "seat_number": str(seat_number), "user_id": str(user_id), "payment_id": {"$exists": True},
+    }}}, limit=1) > 0
+
+
+def get_payment(db, payment_id, user_id):
+    """
+    A user's payment document, or None if it does not exist or is not theirs.
+    """
+    try:
+        payment_id = ObjectId(payment_id)
+    except Exception:
+        return None
+    return db.get_collection(PAYMENTS_COLLECTION).find_one({"_id": payment_id, "user_id": str(user_id)})
+
+
+def payment_status(payment):
+    return {
+        "id": str(payment["_id"]),
+        "status": payment["status"],
+        "message": payment.get("message"),
+        "amount": payment.get("amount"),
+        "seat_number": payment.get("seat_number"),
+        "flight_id": str(payment["flight_id"]),
+        "transaction_id": payment.get("transaction_id"),
+    }
+
+
+def fail_payment(db, payment_id, message):
+    """
+    Move a pending payment to the failed state. A held seat goes back to
+    the user until its original expiry or RETRY_HOLD_SECONDS from now,
+    whichever is later; a booking is marked "Failed". Returns False if the
+    payment was no longer pending.
+    """
+    now = datetime.utcnow()
+    payment = db.get_collection(PAYMENTS_COLLECTION).find_one_and_update(
+        {"_id": payment_id, "status": PENDING},
+        {"$set": {"status": FAILED, "message": message, "updated_at": now}},
+        projection={"booking_id": 1, "flight_id": 1, "seat_number": 1, "hold_expires_at": 1},
+    )
+    if payment is None:
+        return False
+    if payment.get("booking_id") is None:
+        retry_until = max(payment["hold_expires_at"], now + timedelta(seconds=RETRY_HOLD_SECONDS))
+        db.flights.update_one(
+            payment_hold_filter(payment["flight_id"], payment["seat_number"], payment_id),
+            {"$set": {"holds.$.expires_at": retry_until}, "$unset": {"holds.$.payment_id": ""}},
+        )
+    else:
+        db.bookings.update_one(
+            {"_id": payment["booking_id"], "payment_status": BOOKING_STATUS[PENDING]},
+            {"$set": {"payment_status": BOOKING_STATUS[FAILED], "payment_failed_at": now}},
+        )
+    return True
+
+
+def complete_payment(db, payment_id, transaction_id):
+    """
+    Move a pending payment to the paid state, turning its hold into a Paid
+    booking or marking its booking Paid, and count the sale. Returns False
+    if the payment was no longer pending or its hold was lost; the caller
+    refunds the charge.
+    """
+    now = datetime.utcnow()
+    payments = db.get_collection(PAYMENTS_COLLECTION)
+    payment = payments.find_one_and_update(
+        {"_id": payment_id, "status": PENDING},
+        {"$set": {"status": PAID, "transaction_id": transaction_id, "message": "Payment successful!", "updated_at": now}},
+    )
+    if payment is None:
+        return False
+    flight = dict(payment["flight"], _id=payment["flight_id"])
+    paid_fields = {"payment_status": BOOKING_STATUS[PAID], "transaction_id": transaction_id, "paid_at": now}
+
+    if payment.get("booking_id") is None:
+        booking_id = convert_hold(
+            db, payment["flight_id"], payment["seat_number"], payment["user_id"],
+            dict(paid_fields, payment_id=payment_id), payment_id=payment_id,
+        )
+        if booking_id is None:
+            # Swept after outliving the reaper; the seat may belong to someone else now
+            payments.update_one({"_id": payment_id}, {"$set": {"status": FAILED, "message": HOLD_LOST_MESSAGE}})
+            return False
+        payments.update_one({"_id": payment_id}, {"$set": {"booking_id": booking_id}})
+        record_booking(db, flight, payment["amount"], paid=True, when=now)
+        return True
+
+    booking = db.bookings.find_one_and_update(
+        {"_id": payment["booking_id"]},
+        {"$set": paid_fields},
+        projection={"price": 1, "timestamp": 1, "booking_time": 1},
+    )
+    if booking:
+        record_payment(db, flight, booking.get("price") or payment["amount"], when=booking_day(booking))
+    return True
+
+
+class PaymentProcessor:
+    """
+    A fixed pool of worker threads draining a bounded queue of charges.
+    """
+
+    def __init__(self, db, gateway, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 breaker=None, pending_timeout=DEFAULT_PENDING_TIMEOUT, reap=True):
+        self.db = db
+        self.gateway = gateway
+        self.workers = workers
+        self.breaker = breaker or CircuitBreaker()
+        self.pending_timeout = pending_timeout
+        self.reap = reap
+        self._queue = queue.Queue(queue_size)
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"payment-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.reap:
+            reaper = threading.Thread(target=self._reap, name="payment-reaper", daemon=True)
+            reaper.start()
+            self._threads.append(reaper)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def submit(self, payment_id, card_number, expiry_date, cvv):
+        """
+        Queue a charge; on a full queue or an open breaker the payment is
+        failed immediately. Returns whether the charge was queued.
+        """
+        if self.breaker.state == CircuitBreaker.OPEN:
+            fail_payment(self.db, payment_id, UNAVAILABLE_MESSAGE)
+            return False
+        try:
+            self._queue.put_nowait((payment_id, card_number, expiry_date, cvv))
+        except queue.Full:
+            fail_payment(self.db, payment_id, UNAVAILABLE_MESSAGE)
+            return False
+        return True
+
+    def stats(self):
+        return dict(self.breaker.stats(), queued=self._queue.qsize(), workers=self.workers)
+
+    def _work(self):
+        while not self._stop_event.is_set():
+            try:
+                job = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                self.process(*job)
+            except Exception as e:
+                print(f"Error processing payment {job[0]}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def process(self, payment_id, card_number, expiry_date, cvv):
+        payment = self.db.get_collection(PAYMENTS_COLLECTION).find_one({"_id": payment_id, "status": PENDING}, {"amount": 1})
+        if payment is None:
+            return
+        if not self.breaker.allow():
+            fail_payment(self.db, payment_id, UNAVAILABLE_MESSAGE)
+            return
+
+        charged = False
+        try:
+            result = self.gateway.charge(card_number, expiry_date, cvv, amount=payment["amount"])
+            charged = True
+        except GatewayError as e:
+            print(f"Payment gateway error for payment {payment_id}: {e}")
+            fail_payment(self.db, payment_id, GATEWAY_ERROR_MESSAGE)
+            return
+        finally:
+            # Any exception counts, so a half-open trial never stays in flight
+            if charged:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+        if not result["success"]:
+            fail_payment(self.db, payment_id, result["message"])
+        elif not complete_payment(self.db, payment_id, result["transaction_id"]):
+            # Settled meanwhile (e.g. by the reaper) or the seat was lost; give the money back
+            self.gateway.refund(result["transaction_id"], amount=payment["amount"])
+
+    def _reap(self):
+        """
+        Fail payments left pending by a worker process that died, so their
+        seats can be paid for again.
+        """
+        while not self._stop_event.wait(self.pending_timeout / 2):
+            cutoff = datetime.utcnow() - timedelta(seconds=self.pending_timeout)
+            try:
+                stale = self.db.get_collection(PAYMENTS_COLLECTION).find(
+                    {"status": PENDING, "created_at": {"$lt": cutoff}}, {"_id": 1}
+                )
+                for payment in stale:
+                    fail_payment(self.db, payment["_id"], ABANDONED_MESSAGE)
+            except Exception as e:
+                print(f"Error reaping stale payments: {e}")
@@ -0,0 +1,181 @@
+import random
+from abc import ABC, abstractmethod
+import re
+import threading
+import time
+from datetime import datetime
+
+
+class GatewayError(Exception):
+    """
+    The gateway failed or could not be reached; the card was not charged.
+    Declines are not errors; they come back as unsuccessful results.
+    """
+
+
+def luhn_checksum(card_number):
+    total = 0
+    reverse_digits = card_number[::-1]
+    for i, digit in enumerate(reverse_digits):
+        n = int(digit)
+        if i % 2 == 1:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return total % 10 == 0
+
+
+def validate_card(card_number, expiry_date, cvv):
+    """
+    Return an error message for card details that cannot be charged, else None.
+    """
+    if not re.match(r"^\d{16}$", card_number) or not luhn_checksum(card_number):
+        return "Invalid card number."
+
+    try:
+        exp_month, exp_year = map(int, expiry_date.split("/"))
+        expiry_datetime = datetime.strptime(f"{exp_month:02d}/{exp_year:02d}", "%m/%y")
+        if expiry_datetime < datetime.now():
+            return "Card has expired."
+    except ValueError:
+        return "Invalid expiry date format."
+
+    if not re.match(r"^\d{3}$", cvv):
+        return "Invalid CVV."
+    return None
+
+
+class PaymentGateway(ABC):
+    """
+    Interface every gateway implements.
+
+    charge() returns {"success", "message"} plus "transaction_id" on success,
+    and raises GatewayError when the outcome is a technical failure rather
+    than a decline. Calls may block for seconds; they run on the payment
+    workers (see app.payment_processing), never on a request thread.
+    """
+
+    name = None
+
+    @abstractmethod
+    def charge(self, card_number, expiry_date, cvv, amount=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def refund(self, transaction_id, amount=None):
+        raise NotImplementedError
+
+
+class MockPaymentGateway(PaymentGateway):
+    """
+    Validates the card locally, then simulates a remote authorization:
+    each call takes `latency` seconds (a (min, max) range), fails outright
+    with probability `failure_rate` and is declined with probability
+    `decline_rate`.
+    """
+
+    name = "mock"
+
+    def __init__(self, latency=(0.0, 0.0), failure_rate=0.0, decline_rate=0.5, rng=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self.rng = rng or random.Random()
+
+    def _simulate_call(self):
+        low, high = self.latency
+        if high > 0:
+            time.sleep(self.rng.uniform(low, high))
+        if self.rng.random() < self.failure_rate:
+            raise GatewayError("Network error")
+
+    def charge(self, card_number, expiry_date, cvv, amount=None):
+        error = validate_card(card_number, expiry_date, cvv)
+        if error:
+            return {"success": False, "message": error}
+
+        self._simulate_call()
+        if self.rng.random() >= self.decline_rate:
+            transaction_id = f"TXN{self.rng.randint(100000, 999999)}"
+            return {"success": True, "message": "Payment successful!", "transaction_id": transaction_id}
+        else:
+            failure_reasons = ["Insufficient funds", "Transaction declined"]
+            return {"success": False, "message": self.rng.choice(failure_reasons)}
+
+    def refund(self, transaction_id, amount=None):
+        self._simulate_call()
+        return {"success": True, "message": "Refunded", "transaction_id": transaction_id}
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing gateway. After `failure_threshold` consecutive
+    errors the breaker opens and calls are refused for `reset_timeout`
+    seconds; then a single trial call is let through (half-open), which
+    closes the breaker on success or reopens it on failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """
+        Whether a call may go ahead now.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            if self._trial_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+def build_payment_gateway(config=None):
+    config = config or {}
+    gateway = config.get("PAYMENT_GATEWAY", "mock")
+    if gateway == "mock":
+        return MockPaymentGateway(
+            latency=(float(config.get("PAYMENT_MOCK_LATENCY_MIN", 0)), float(config.get("PAYMENT_MOCK_LATENCY_MAX", 0))),
+            failure_rate=float(config.get("PAYMENT_MOCK_FAILURE_RATE", 0)),
+            decline_rate=float(config.get("PAYMENT_MOCK_DECLINE_RATE", 0.5)),
+        )
+    raise ValueError(f"Unknown PAYMENT_GATEWAY: {gateway}")
@@ -0,0 +1,85 @@
+"""
+Request parsing and response shaping shared by the sync (Flask) and async
+(ASGI) versions of the read endpoints, so both serve identical responses.
+Nothing here touches the database.
+"""
+from datetime import date, datetime
+from bson.objectid import ObjectId
+from werkzeug.http import http_date
+from app.flight_search import build_search_query
+from app.models import FLIGHT_PROJECTIONS
+from app.pagination import parse_page_size
+from app.search_cache import search_cache
+
+
+def parse_search(args):
+    """
+    Return (query, cursor, page_size, cache_key) for a search request;
+    raises ValueError with a user-facing message on a malformed date.
+    """
+    query = build_search_query(
+        (args.get("origin") or "").strip(),
+        (args.get("destination") or "").strip(),
+        args.get("date"),
+    )
+    cursor = args.get("cursor")
+    page_size = parse_page_size(args.get("page_size"))
+    return query, cursor, page_size, search_cache.make_key("search_flights", query, cursor, page_size)
+
+
+def search_result(flights, next_cursor):
+    """
+    The cacheable result of one search page of Flight objects.
+    """
+    return [flight.to_dict() for flight in flights], next_cursor
+
+
+def search_response(result):
+    flight_list, next_cursor = result
+    if not flight_list:
+        return {"message": "No flights found matching the criteria"}, 404
+    return {"flights": flight_list, "next_cursor": next_cursor}, 200
+
+
+def flight_detail_response(flight):
+    if not flight:
+        return {"message": "Flight not found"}, 404
+    return flight.to_dict(), 200
+
+
+def available_seats_response(flight):
+    if not flight:
+        return {"error": "Flight not found"}, 404
+    return {"seats": flight.seat_map()}, 200
+
+
+def seat_map_response(flight):
+    if not flight:
+        return {"error": "Flight not found"}, 404
+    return {
+        "flight_id": flight.id,
+        "origin": flight.origin,
+        "destination": flight.destination,
+        "seats": flight.seat_map(),
+    }, 200
+
+
+def flight_lookup(flight_id, projection):
+    """
+    (filter, projection) for a single-flight read, or None for an invalid id.
+    The sync endpoints get the same read from Flight.get_flight_by_id.
+    """
+    if not ObjectId.is_valid(flight_id):
+        return None
+    return {"_id": ObjectId(flight_id)}, FLIGHT_PROJECTIONS[projection]
+
+
+def json_default(value):
+    """
+    Encode values the way Flask's default JSON provider does.
+    """
+    if isinstance(value, (datetime, date)):
+        return http_date(value)
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
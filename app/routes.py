@@ -1,86 +1,38 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, Response, current_app, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from bson.objectid import ObjectId
-from datetime import datetime, timedelta
-from app import bcrypt, mongo_db
+import uuid
+from app import bcrypt
+from app.db import get_db
 from app.forms import LoginForm, RegisterForm, BookingForm, PaymentForm
-import random
-import re
-
-# Utility Function for Payment Processing
-def mock_payment_gateway(card_number, expiry_date, cvv):
-    def luhn_checksum(card_num):
-        total = 0
-        reverse_digits = card_num[::-1]
-        for i, digit in enumerate(reverse_digits):
-            n = int(digit)
-            if i % 2 == 1:
-                n *= 2
-                if n > 9:
-                    n -= 9
-            total += n
-        return total % 10 == 0
-
-    if not re.match(r"^\d{16}$", card_number) or not luhn_checksum(card_number):
-        return {"success": False, "message": "Invalid card number."}
-
-    try:
-        exp_month, exp_year = map(int, expiry_date.split("/"))
-        expiry_datetime = datetime.strptime(f"{exp_month:02d}/{exp_year:02d}", "%m/%y")
-        if expiry_datetime < datetime.now():
-            return {"success": False, "message": "Card has expired."}
-    except ValueError:
-        return {"success": False, "message": "Invalid expiry date format."}
-
-    if not re.match(r"^\d{3}$", cvv):
-        return {"success": False, "message": "Invalid CVV."}
-
-    if random.choice([True, False]):
-        transaction_id = f"TXN{random.randint(100000, 999999)}"
-        return {"success": True, "message": "Payment successful!", "transaction_id": transaction_id}
-    else:
-        failure_reasons = ["Insufficient funds", "Transaction declined", "Network error"]
-        return {"success": False, "message": random.choice(failure_reasons)}
+from app.flight_search import build_search_query
+from app.search_cache import search_cache
+from app.decorators import role_required
+from app.idempotency import idempotent
+from app.seat_inventory import seat_mask
+from app.seat_holds import has_active_hold, place_hold
+from app.payments import validate_card
+from app.payment_processing import get_payment, payment_status, start_payment
+from app.pagination import parse_page_size
+from app.models import Booking, Flight, User
+from app.user_cache import user_cache
+from app.mail_merge import job_progress, start_notification_job, NOTIFICATION_TEMPLATES
+from app.integrations import integrations
+from app import read_api
+from app.slow_queries import top_offenders
+from app.itineraries import parse_itinerary_search, route_graph
+from app.seat_stream import HEARTBEAT_EVENT, QueueSubscriber, format_event, seat_map_hub
 
 # Blueprint Declaration
 main = Blueprint('main', __name__)
 
-# Helper: Simulate User for Flask-Login
-class MongoUser:
-    def __init__(self, user_data):
-        self.id = str(user_data["_id"])
-        self.email = user_data["email"]
-        self.role = user_data.get("role", "user")
-        self.name = user_data.get("name", "Unknown")
-
-    @property
-    def is_active(self):
-        return True
-
-    @property
-    def is_authenticated(self):
-        return True
-
-    @property
-    def is_anonymous(self):
-        return False
-
-    def get_id(self):
-        return self.id
-
-    @staticmethod
-    def get(user_id):
-        user_collection = mongo_db.get_collection('users')
-        user_data = user_collection.find_one({"_id": ObjectId(user_id)})
-        return MongoUser(user_data) if user_data else None
-
 # Flight Details Page
 @main.route('/flight/<flight_id>/details', methods=['GET'])
 def flight_details(flight_id):
     """
     Display flight details and available seat classes.
     """
-    flight = mongo_db.flights.find_one({"_id": ObjectId(flight_id)})
+    flight = Flight.get_flight_by_id(flight_id, projection="detail")
     if not flight:
         flash("Flight not found.", "error")
         return redirect(url_for('main.list_flights'))
@@ -97,78 +49,95 @@ def seat_selection_page(flight_id):
     return render_template('seat_selection.html', flight_id=flight_id)
 
 @main.route('/api/flights/<flight_id>/seats', methods=['GET', 'POST'])
+@login_required
+@idempotent
 def seat_selection_api(flight_id):
     """
     API for fetching and booking seats for a flight.
     - GET: Return seat map and flight details.
-    - POST: Book a selected seat (simplified, no availability check).
+    - POST: Hold a selected seat until payment completes or the hold expires.
     """
-    # Check MongoDB connection
-    if not mongo_db:
-        return jsonify({"error": "Database connection not established"}), 500
-
     # Fetch flight details
-    flight = mongo_db.flights.find_one({"_id": ObjectId(flight_id)})
+    flight = Flight.get_flight_by_id(flight_id, projection="seatmap")
     if not flight:
         return jsonify({"error": "Flight not found"}), 404
 
     if request.method == 'POST':
         data = request.json
-        print(f"Received POST Data: {data}")  # Log the data received from frontend
 
         selected_seat_number = data.get("seat_number")
 
         # Validate seat number
         if not selected_seat_number:
-            print("Error: Seat number is missing")
             return jsonify({"error": "Seat number is required"}), 400
 
         selected_seat_number = selected_seat_number.strip()
         user_id = str(current_user.id)
-        print(f"Attempting to book seat {selected_seat_number} for user {user_id} on flight {flight_id}")
 
-        # Check for duplicate booking
-        bookings_collection = mongo_db.get_collection('bookings')
-        existing_booking = bookings_collection.find_one({
-            "flight_id": ObjectId(flight_id),
-            "seat_number": selected_seat_number,
-        })
-        if existing_booking:
-            print(f"Error: Seat {selected_seat_number} is already booked")
+        try:
+            seat_mask(selected_seat_number)
+        except ValueError:
+            return jsonify({"error": "Invalid seat number"}), 400
+
+        # Atomically claim the seat and record the hold; fails if the seat is taken
+        hold_ttl = current_app.config["SEAT_HOLD_TTL"]
+        if not place_hold(get_db().flights, flight.object_id, selected_seat_number, user_id, ttl=hold_ttl, projection={"_id": 1}):
             return jsonify({"error": "Seat is already booked"}), 400
 
-        # Insert booking
-        booking = {
-            "user_id": user_id,
-            "flight_id": ObjectId(flight_id),
-            "seat_number": selected_seat_number,
-            "status": "active",
-            "timestamp": datetime.utcnow(),
-            "price": flight.get("price", 0)
-        }
-        bookings_collection.insert_one(booking)
-        print(f"Seat {selected_seat_number} booked successfully for user {user_id}")
+        search_cache.invalidate_flight(flight.route())
 
-        return jsonify({"message": f"Seat {selected_seat_number} booked successfully!"}), 200
+        return jsonify({
+            "message": f"Seat {selected_seat_number} is held for you for {hold_ttl // 60} minutes.",
+            "hold_expires_in": hold_ttl,
+        }), 200
 
     # GET: Return flight and seat information
-    return jsonify({
-        "flight_id": str(flight["_id"]),
-        "origin": flight.get("origin"),
-        "destination": flight.get("destination"),
-        "seats": flight.get("seats", [])
-    }), 200
+    body, status = read_api.seat_map_response(flight)
+    return jsonify(body), status
 
-from flask import render_template
+@main.route('/api/flights/<flight_id>/seats/stream', methods=['GET'])
+@login_required
+def seat_map_stream(flight_id):
+    """
+    Server-sent events for a flight's seat map: a `snapshot` event with the
+    full map, then `delta` events listing only seats whose availability changed.
+    Each open stream holds a server thread, so at scale route this path to
+    the ASGI tier (app.asgi), which serves the same events on one event loop.
+    """
+    if not ObjectId.is_valid(flight_id):
+        return jsonify({"error": "Invalid flight ID format"}), 400
+
+    seat_map_hub.start(get_db().flights)
+    flight_key = ObjectId(flight_id)
+    subscriber = QueueSubscriber()
+    seats = seat_map_hub.subscribe(flight_key, subscriber)
+    if seats is None:
+        return jsonify({"error": "Flight not found"}), 404
+    heartbeat = current_app.config["SEAT_STREAM_HEARTBEAT"]
+
+    def events():
+        try:
+            yield "retry: 2000\n" + format_event("snapshot", {"seats": seats})
+            # A stale subscriber missed events; closing makes the browser reconnect for a fresh snapshot
+            while not subscriber.stale:
+                yield subscriber.get(heartbeat) or HEARTBEAT_EVENT
+        finally:
+            seat_map_hub.unsubscribe(flight_key, subscriber)
+
+    return Response(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
 
 @main.route('/payment/<flight_id>/<seat_number>', methods=['GET', 'POST'])
 @login_required
+@idempotent
 def payment(flight_id, seat_number):
     """
     Display the payment page and handle payment processing.
     """
     form = PaymentForm()
-    flight = mongo_db.flights.find_one({"_id": ObjectId(flight_id)})
+    flight = Flight.get_flight_by_id(flight_id, projection="detail")
     if not flight:
         flash("Flight not found.", "error")
         return redirect(url_for("main.list_flights"))
@@ -177,23 +146,68 @@ def payment(flight_id, seat_number):
         card_number = form.card_number.data
         expiry_date = form.expiry_date.data
         cvv = form.cvv.data
+        user_id = str(current_user.id)
+        # Bookings made from holds store ObjectIds, older ones strings
+        booking_query = {
+            "flight_id": {"$in": [flight_id, flight.object_id]},
+            "seat_number": seat_number,
+            "user_id": Booking.user_filter(user_id),
+        }
 
-        # Process payment using mock gateway
-        payment_result = mock_payment_gateway(card_number, expiry_date, cvv)
+        # The seat must still be held (or already booked) before we charge the card
+        holding = has_active_hold(get_db().flights, flight.object_id, seat_number, user_id)
+        if not holding and not get_db().bookings.find_one(booking_query, {"_id": 1}):
+            flash("Your seat hold has expired. Please select a seat again.", "error")
+            return redirect(url_for("main.seat_selection_page", flight_id=flight_id))
 
-        if payment_result["success"]:
-            # Update the booking status in MongoDB
-            mongo_db.bookings.update_one(
-                {"flight_id": flight_id, "seat_number": seat_number, "user_id": str(current_user.id)},
-                {"$set": {"payment_status": "Paid", "transaction_id": payment_result["transaction_id"]}}
-            )
-            flash("Payment successful!", "success")
-            return redirect(url_for("main.dashboard"))
+        card_error = validate_card(card_number, expiry_date, cvv)
+        if card_error:
+            flash(card_error, "error")
         else:
-            flash(payment_result["message"], "error")
-
+            # The charge runs on the payment workers; this request only queues it
+            processor = current_app.extensions["payment_processor"]
+            payment_id, reason = start_payment(
+                get_db(), flight, seat_number, user_id, holding, booking_query, pending_timeout=processor.pending_timeout
+            )
+            if reason == "expired":
+                flash("Your seat hold has expired. Please select a seat again.", "error")
+                return redirect(url_for("main.seat_selection_page", flight_id=flight_id))
+            if reason:
+                flash("This seat is already paid for." if reason == "paid" else "A payment for this seat is already in progress.", "info")
+                return redirect(url_for("main.dashboard"))
+            processor.submit(payment_id, card_number, expiry_date, cvv)
+            return redirect(url_for("main.payment_status_page", payment_id=str(payment_id)))
+
+    # Card details are never echoed back: the page may be stored as an idempotent response
+    form.card_number.data = None
+    form.cvv.data = None
+    # A fresh key per rendered form: resubmitting this page is a retry, a corrected form is not
+    form.idempotency_key.data = uuid.uuid4().hex
     return render_template("payment.html", flight=flight, seat_number=seat_number, form=form)
 
+@main.route('/payments/<payment_id>', methods=['GET'])
+@login_required
+def payment_status_page(payment_id):
+    """
+    Waiting page for a queued payment; polls the status API until it settles.
+    """
+    payment = get_payment(get_db(), payment_id, current_user.id)
+    if not payment:
+        flash("Payment not found.", "error")
+        return redirect(url_for("main.dashboard"))
+    return render_template("payment_status.html", payment=payment_status(payment))
+
+@main.route('/api/payments/<payment_id>', methods=['GET'])
+@login_required
+def payment_status_api(payment_id):
+    """
+    Current state of a payment: pending, paid or failed.
+    """
+    payment = get_payment(get_db(), payment_id, current_user.id)
+    if not payment:
+        return jsonify({"error": "Payment not found"}), 404
+    return jsonify(payment_status(payment)), 200
+
 # Routes Implementation
 @main.route('/')
 def home():
@@ -205,11 +219,12 @@ def login():
     if form.validate_on_submit():
         email = form.email.data
         password = form.password.data
-        user_collection = mongo_db.get_collection('users')
+        user_collection = get_db().get_collection('users')
         user = user_collection.find_one({"email": email})
 
         if user and bcrypt.check_password_hash(user['password_hash'], password):
-            login_user(MongoUser(user))
+            user_cache.invalidate(user["_id"])
+            login_user(User(user))
             flash('Welcome back!', 'success')
             return redirect(request.args.get('next') or url_for('main.dashboard'))
         else:
@@ -224,7 +239,7 @@ def register():
         name = form.name.data
         email = form.email.data
         password = form.password.data
-        user_collection = mongo_db.get_collection('users')
+        user_collection = get_db().get_collection('users')
 
         if user_collection.find_one({"email": email}):
             flash('Email is already registered. Please log in.', 'error')
@@ -249,27 +264,19 @@ def registration_success():
 @main.route('/dashboard')
 @login_required
 def dashboard():
-    bookings_collection = mongo_db.get_collection('bookings')
-    flights_collection = mongo_db.get_collection('flights')
-
-    user_id = ObjectId(current_user.id)
-    user_bookings = bookings_collection.find({'user_id': user_id})
-
     enriched_bookings = []
-    for booking in user_bookings:
-        flight = flights_collection.find_one({"_id": ObjectId(booking["flight_id"])})
-        if flight:
-            enriched_bookings.append({
-                "seat_number": booking["seat_number"],
-                "payment_status": booking["payment_status"],
-                "flight": {
-                    "origin": flight.get("origin", "Unknown"),
-                    "destination": flight.get("destination", "Unknown"),
-                    "departure_time": flight.get("departureTime", "TBD"),
-                    "arrival_time": flight.get("arrivalTime", "TBD"),
-                    "price": float(flight.get("price", 0)),
-                }
-            })
+    for booking, flight in Booking.get_bookings_with_flights(current_user.id):
+        enriched_bookings.append({
+            "seat_number": booking.seat_number,
+            "payment_status": booking.payment_status,
+            "flight": {
+                "origin": flight.origin,
+                "destination": flight.destination,
+                "departure_time": flight.departure_time,
+                "arrival_time": flight.arrival_time,
+                "price": flight.price,
+            }
+        })
 
     return render_template(
         'dashboard.html',
@@ -279,51 +286,98 @@ def dashboard():
 
 @main.route('/flights')
 def list_flights():
-    flights_collection = mongo_db.get_collection('flights')
     origin = request.args.get('origin')
     destination = request.args.get('destination')
     date = request.args.get('date')
     travel_class = request.args.get('class')
     min_price = request.args.get('min_price')
     max_price = request.args.get('max_price')
+    cursor = request.args.get('cursor')
+    page_size = parse_page_size(request.args.get('page_size'))
 
-    query = {}
-    if origin:
-        query['origin'] = {"$regex": origin, "$options": "i"}
-    if destination:
-        query['destination'] = {"$regex": destination, "$options": "i"}
-    if date:
+    try:
+        query = build_search_query(origin, destination, date, min_price, max_price)
+    except ValueError as e:
+        flash(str(e), "error")
+        return redirect(url_for('main.list_flights'))
+    if travel_class:
+        query['class'] = travel_class
+
+    cache_key = search_cache.make_key('list_flights', query, cursor, page_size)
+    cached = search_cache.get(cache_key)
+    if cached is None:
         try:
-            date_obj = datetime.strptime(date, "%Y-%m-%d")
-            next_day = date_obj + timedelta(days=1)
-            query['departureTime'] = {"$gte": date_obj, "$lt": next_day}
+            cached = Flight.get_page(query, page_size, cursor, projection="list")
         except ValueError:
-            flash("Invalid date format. Use YYYY-MM-DD.", "error")
+            flash("Invalid page cursor.", "error")
             return redirect(url_for('main.list_flights'))
-    if travel_class:
-        query['class'] = travel_class
-    if min_price or max_price:
-        price_query = {}
-        if min_price:
-            price_query["$gte"] = float(min_price)
-        if max_price:
-            price_query["$lte"] = float(max_price)
-        query['price'] = price_query
-
-    flights = list(flights_collection.find(query))
-    formatted_flights = [
-        {
-            "id": str(flight["_id"]),
-            "origin": flight.get("origin", "Unknown"),
-            "destination": flight.get("destination", "Unknown"),
-            "departure_time": flight.get("departureTime", "TBD"),
-            "arrival_time": flight.get("arrivalTime", "TBD"),
-            "price": float(flight.get("price", 0)),
-            "class": flight.get("class", "Unknown"),
-        }
-        for flight in flights
-    ]
-    return render_template('flights.html', flights=formatted_flights)
+        search_cache.put(cache_key, cached, query)
+
+    flights, next_cursor = cached
+
+    # No direct flights: offer connections when the search names a route and a day
+    itineraries = []
+    if not flights and not cursor and origin and destination and date:
+        try:
+            search = parse_itinerary_search(
+                {"origin": origin, "destination": destination, "date": date, "max_stops": 2}, current_app.config
+            )
+        except ValueError:
+            search = None
+        if search:
+            route_graph.ensure_loaded(get_db().flights)
+            itineraries = route_graph.search(**search)
+
+    return render_template('flights.html', flights=flights, next_cursor=next_cursor, itineraries=itineraries)
+
+@main.route('/admin/search-cache', methods=['GET'])
+@login_required
+@role_required('admin')
+def search_cache_stats():
+    """
+    Hit/miss/eviction counters for the flight search cache.
+    """
+    return jsonify(search_cache.stats()), 200
+
+@main.route('/admin/slow-queries', methods=['GET'])
+@login_required
+@role_required('admin')
+def slow_queries():
+    """
+    Slowest query shapes by total time, with collection scans flagged.
+    """
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify(top_offenders(get_db(), limit)), 200
+
+@main.route('/admin/flights/<flight_id>/notify', methods=['POST'])
+@login_required
+@role_required('admin')
+def notify_flight(flight_id):
+    """
+    Start a bulk notification (e.g. delay or gate change) to every passenger on a flight.
+    """
+    data = request.get_json() or {}
+    template = data.get("template")
+    if template not in NOTIFICATION_TEMPLATES:
+        return jsonify({"error": f"template must be one of {sorted(NOTIFICATION_TEMPLATES)}"}), 400
+    if not Flight.get_flight_by_id(flight_id, projection="list"):
+        return jsonify({"error": "Flight not found"}), 404
+
+    transport = integrations.get("email")
+    job_id = start_notification_job(get_db(), flight_id, template, transport, data.get("context", {}))
+    return jsonify({"job_id": job_id, "status_url": url_for('main.notify_job_status', job_id=job_id)}), 202
+
+@main.route('/admin/notify-jobs/<job_id>', methods=['GET'])
+@login_required
+@role_required('admin')
+def notify_job_status(job_id):
+    """
+    Progress and throughput of a bulk notification job.
+    """
+    progress = job_progress(job_id)
+    if progress is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(progress), 200
 
 @main.route('/logout')
 @login_required
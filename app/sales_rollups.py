@@ -0,0 +1,219 @@
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from app.booking_enrichment import to_object_id
+from app.flight_search import DAY_FORMAT, normalize_airport
+
+FLIGHT_ROLLUPS = "sales_by_flight"
+DAY_ROLLUPS = "sales_by_day"
+
+# Fields a caller must load on the flight to record a sale
+SALES_PROJECTION = {"price": 1, "origin": 1, "destination": 1, "originCode": 1, "destinationCode": 1}
+
+COUNTERS = ("bookings", "revenue", "paid_bookings", "paid_revenue")
+
+
+def ensure_indexes(db):
+    db.get_collection(FLIGHT_ROLLUPS).create_index([("revenue", DESCENDING)], name="by_revenue")
+    db.get_collection(DAY_ROLLUPS).create_index(
+        [("day", ASCENDING), ("origin", ASCENDING), ("destination", ASCENDING)], name="day_route"
+    )
+
+
+def _route(flight):
+    return (
+        flight.get("originCode") or normalize_airport(flight.get("origin")),
+        flight.get("destinationCode") or normalize_airport(flight.get("destination")),
+    )
+
+
+def _apply(db, flight, increments, when=None):
+    """
+    Atomically apply `increments` to the flight's all-time row and to its
+    row for the booking day (two upserts, no reads).
+    """
+    flight_id = to_object_id(flight["_id"])
+    origin, destination = _route(flight)
+    day = (when or datetime.utcnow()).strftime(DAY_FORMAT)
+    update = {
+        "$inc": increments,
+        "$set": {"origin": origin, "destination": destination, "updated_at": datetime.utcnow()},
+    }
+    db.get_collection(FLIGHT_ROLLUPS).update_one({"_id": flight_id}, update, upsert=True)
+    db.get_collection(DAY_ROLLUPS).update_one(
+        {"_id": f"{day}:{flight_id}"},
+        dict(update, **{"$setOnInsert": {"day": day, "flight_id": flight_id}}),
+        upsert=True,
+    )
+
+
+def record_booking(db, flight, price, paid=False, when=None, quantity=1):
+    """
+    Count new bookings (optionally already paid) against their flight and day;
+    `quantity` seats sold together at `price` each are recorded in one write.
+    """
+    increments = {"bookings": quantity, "revenue": float(price) * quantity}
+    if paid:
+        increments.update({"paid_bookings": quantity, "paid_revenue": float(price) * quantity})
+    _apply(db, flight, increments, when)
+
+
+def record_payment(db, flight, price, when=None):
+    """
+    Count payment of a booking that was already recorded as created.
+    """
+    _apply(db, flight, {"paid_bookings": 1, "paid_revenue": float(price)}, when)
+
+
+def record_cancellation(db, flight, price, paid=False, when=None):
+    """
+    Reverse a booking's contribution when it is cancelled.
+    """
+    increments = {"bookings": -1, "revenue": -float(price)}
+    if paid:
+        increments.update({"paid_bookings": -1, "paid_revenue": -float(price)})
+    _apply(db, flight, increments, when)
+
+
+def _format(row, key):
+    formatted = {key: row[key]} if key != "flight_id" else {"flight_id": str(row["flight_id"])}
+    formatted.update({
+        "total_bookings": row.get("bookings", 0),
+        "total_revenue": float(row.get("revenue", 0)),
+        "paid_bookings": row.get("paid_bookings", 0),
+        "paid_revenue": float(row.get("paid_revenue", 0)),
+    })
+    return formatted
+
+
+def query_sales(db, start=None, end=None, origin=None, destination=None, group_by="flight"):
+    """
+    Read sales from the rollups only.
+    Without filters, per-flight totals come straight from sales_by_flight;
+    otherwise the matching sales_by_day rows are summed.
+    """
+    origin, destination = normalize_airport(origin), normalize_airport(destination)
+    match = {}
+    if start or end:
+        match["day"] = {}
+        if start:
+            match["day"]["$gte"] = datetime.strptime(start, DAY_FORMAT).strftime(DAY_FORMAT)
+        if end:
+            match["day"]["$lte"] = datetime.strptime(end, DAY_FORMAT).strftime(DAY_FORMAT)
+    if origin:
+        match["origin"] = origin
+    if destination:
+        match["destination"] = destination
+
+    if group_by == "flight" and not match.get("day"):
+        rows = db.get_collection(FLIGHT_ROLLUPS).find(match).sort("revenue", DESCENDING)
+        return [_format(dict(row, flight_id=row["_id"]), "flight_id") for row in rows]
+
+    key = "flight_id" if group_by == "flight" else "day"
+    pipeline = [
+        {"$match": match},
+        {"$group": dict(
+            {"_id": f"${key}"},
+            **{counter: {"$sum": f"${counter}"} for counter in COUNTERS}
+        )},
+        {"$sort": {"revenue": -1} if key == "flight_id" else {"_id": 1}},
+    ]
+    rows = db.get_collection(DAY_ROLLUPS).aggregate(pipeline)
+    return [_format(dict(row, **{key: row["_id"]}), key) for row in rows]
+
+
+def booking_day(booking):
+    """
+    When a booking was created; sales are attributed to this day for every
+    later change (payment, cancellation) so rebuilds reproduce live counters.
+    """
+    when = booking.get("timestamp") or booking.get("booking_time")
+    if not isinstance(when, datetime):
+        when = booking["_id"].generation_time.replace(tzinfo=None)
+    return when
+
+
+def compute_rollups(db):
+    """
+    Recompute both rollups from the bookings collection (the expensive
+    join the live counters avoid). Returns (flight_rows, day_rows) keyed by _id.
+    """
+    flights = {}
+    for flight in db.flights.find({}, SALES_PROJECTION):
+        flights[flight["_id"]] = flight
+
+    flight_rows, day_rows = {}, {}
+    cursor = db.bookings.find({}, {"flight_id": 1, "price": 1, "payment_status": 1, "timestamp": 1, "booking_time": 1})
+    for booking in cursor:
+        flight = flights.get(to_object_id(booking.get("flight_id")))
+        if not flight:
+            continue
+        price = float(booking.get("price") or flight.get("price", 0))
+        paid = booking.get("payment_status") == "Paid"
+        origin, destination = _route(flight)
+        day = booking_day(booking).strftime(DAY_FORMAT)
+
+        for rows, row_id, extra in (
+            (flight_rows, flight["_id"], {}),
+            (day_rows, f"{day}:{flight['_id']}", {"day": day, "flight_id": flight["_id"]}),
+        ):
+            row = rows.setdefault(row_id, dict(
+                {"_id": row_id, "origin": origin, "destination": destination},
+                **extra, **{counter: 0 for counter in COUNTERS}
+            ))
+            row["bookings"] += 1
+            row["revenue"] += price
+            if paid:
+                row["paid_bookings"] += 1
+                row["paid_revenue"] += price
+    return flight_rows, day_rows
+
+
+def verify_rollups(db, tolerance=0.01):
+    """
+    Compare live rollups with a fresh recomputation; returns a list of mismatches.
+    """
+    mismatches = []
+    for collection_name, expected in zip((FLIGHT_ROLLUPS, DAY_ROLLUPS), compute_rollups(db)):
+        actual = {row["_id"]: row for row in db.get_collection(collection_name).find()}
+        for row_id in set(expected) | set(actual):
+            want, have = expected.get(row_id, {}), actual.get(row_id, {})
+            for counter in COUNTERS:
+                if abs(want.get(counter, 0) - have.get(counter, 0)) > tolerance:
+                    mismatches.append((collection_name, row_id, counter, want.get(counter, 0), have.get(counter, 0)))
+    return mismatches
+
+
+def rebuild_rollups(db):
+    """
+    Replace both rollup collections with a fresh recomputation.
+    """
+    flight_rows, day_rows = compute_rollups(db)
+    now = datetime.utcnow()
+    for collection_name, rows in ((FLIGHT_ROLLUPS, flight_rows), (DAY_ROLLUPS, day_rows)):
+        collection = db.get_collection(collection_name)
+        collection.delete_many({})
+        if rows:
+            collection.insert_many([dict(row, updated_at=now) for row in rows.values()], ordered=False)
+    ensure_indexes(db)
+    return len(flight_rows), len(day_rows)
+
+
+if __name__ == "__main__":
+    # python -m app.sales_rollups [rebuild|verify]
+    import os
+    import sys
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    db = MongoClient(os.getenv("MONGO_URI")).get_database()
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command == "rebuild":
+        flight_count, day_count = rebuild_rollups(db)
+        print(f"Rebuilt {flight_count} flight rollups and {day_count} day rollups.")
+    else:
+        mismatches = verify_rollups(db)
+        for mismatch in mismatches:
+            print("MISMATCH collection=%s id=%s counter=%s expected=%s actual=%s" % mismatch)
+        print(f"{len(mismatches)} mismatches.")
+        sys.exit(1 if mismatches else 0)
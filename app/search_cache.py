@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+from app.flight_search import normalize_airport
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class SearchCache:
+    """
+    In-process LRU cache for formatted flight search results.
+
+    Entries are keyed by the normalized Mongo query, expire after `ttl`
+    seconds and are dropped early when a write touches their route.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._entries.clear()
+
+    @staticmethod
+    def make_key(namespace, query, *extra):
+        return (namespace, _freeze(query)) + extra
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, _route = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, query):
+        """
+        Store `value`; `query` records which route the entry depends on.
+        """
+        if self.maxsize <= 0:
+            return
+        route = (query.get("originCode"), query.get("destinationCode"))
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl, route)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_route(self, origin_code, destination_code):
+        """
+        Drop every entry whose query could include flights on this route,
+        including searches that left origin or destination open.
+        """
+        with self._lock:
+            stale = [
+                key for key, (_value, _expires, (origin, destination)) in self._entries.items()
+                if origin in (None, origin_code) and destination in (None, destination_code)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def invalidate_flight(self, flight):
+        """
+        Invalidate the route of a flight document (needs origin/destination
+        or their *Code fields).
+        """
+        if not flight:
+            return
+        origin_code = flight.get("originCode") or normalize_airport(flight.get("origin"))
+        destination_code = flight.get("destinationCode") or normalize_airport(flight.get("destination"))
+        self.invalidate_route(origin_code, destination_code)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Projection needed to invalidate a flight's route after a write
+ROUTE_PROJECTION = {"origin": 1, "destination": 1, "originCode": 1, "destinationCode": 1}
+
+search_cache = SearchCache()
@@ -0,0 +1,155 @@
+import threading
+from datetime import datetime, timedelta
+from bson.int64 import Int64
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from app.seat_inventory import seat_mask, seat_masks, with_seat_bits
+
+DEFAULT_HOLD_TTL = 600  # seconds
+
+
+def ensure_indexes(db):
+    db.get_collection("flights").create_index([("holds.expires_at", ASCENDING)], name="hold_expiry")
+
+
+def place_hold(flights_collection, flight_id, seat_number, user_id, ttl=DEFAULT_HOLD_TTL, projection=None):
+    """
+    Claim a free seat and record a time-limited hold on it in one atomic write.
+    Returns the (projected) flight document, or None if the seat was not free.
+    """
+    seat_class, mask = seat_mask(seat_number)
+    field = f"seatBits.{seat_class}"
+    hold = {
+        "seat_number": str(seat_number),
+        "user_id": str(user_id),
+        "expires_at": datetime.utcnow() + timedelta(seconds=ttl),
+    }
+    return with_seat_bits(flights_collection, flight_id, lambda: flights_collection.find_one_and_update(
+        {"_id": flight_id, field: {"$bitsAllSet": mask}},
+        {
+            "$bit": {field: {"xor": Int64(mask)}},
+            "$inc": {"availableSeats": -1},
+            "$push": {"holds": hold},
+        },
+        projection=projection,
+    ))
+
+
+def active_hold_filter(flight_id, seat_number, user_id):
+    return {
+        "_id": flight_id,
+        "holds": {"$elemMatch": {
+            "seat_number": str(seat_number),
+            "user_id": str(user_id),
+            "expires_at": {"$gt": datetime.utcnow()},
+        }},
+    }
+
+
+def has_active_hold(flights_collection, flight_id, seat_number, user_id):
+    return flights_collection.count_documents(active_hold_filter(flight_id, seat_number, user_id), limit=1) > 0
+
+
+def payment_hold_filter(flight_id, seat_number, payment_id):
+    return {"_id": flight_id, "holds": {"$elemMatch": {"seat_number": str(seat_number), "payment_id": payment_id}}}
+
+
+def convert_hold(db, flight_id, seat_number, user_id, booking_fields, payment_id=None):
+    """
+    Turn an unexpired hold into a booking. The seat stays claimed; only the
+    hold entry is removed. With `payment_id` the hold must be the one that
+    payment reserved. Returns the new booking id, or None if the hold has
+    expired or belongs to someone else.
+    """
+    if payment_id is None:
+        hold_filter = active_hold_filter(flight_id, seat_number, user_id)
+    else:
+        hold_filter = payment_hold_filter(flight_id, seat_number, payment_id)
+    flight = db.flights.find_one_and_update(
+        hold_filter,
+        {"$pull": {"holds": {"seat_number": str(seat_number)}}},
+        projection={"price": 1},
+    )
+    if not flight:
+        return None
+
+    booking = {
+        "user_id": ObjectId(user_id),
+        "flight_id": flight_id,
+        "seat_number": str(seat_number),
+        "status": "active",
+        "timestamp": datetime.utcnow(),
+        "price": flight.get("price", 0),
+    }
+    booking.update(booking_fields)
+    return db.bookings.insert_one(booking).inserted_id
+
+
+# Fields the sweeper reads; the route lets callers invalidate cached searches
+SWEEP_PROJECTION = {"holds": 1, "origin": 1, "destination": 1, "originCode": 1, "destinationCode": 1}
+
+
+def sweep_expired_holds(flights_collection, now=None, on_release=None):
+    """
+    Release every expired hold with one bulk write. Each flight gets a single
+    update that is guarded on the exact holds being released, so a hold
+    converted concurrently is never returned to the pool; that flight is
+    simply retried on the next sweep. `on_release` is called with each
+    flight touched. Returns the number of flights updated.
+    """
+    now = now or datetime.utcnow()
+    operations = []
+    released_flights = []
+    cursor = flights_collection.find({"holds.expires_at": {"$lt": now}}, SWEEP_PROJECTION)
+    for flight in cursor:
+        expired = [hold for hold in flight.get("holds", []) if hold["expires_at"] < now]
+        if not expired:
+            continue
+        seat_numbers = [hold["seat_number"] for hold in expired]
+        guard = [
+            {"$elemMatch": {"seat_number": hold["seat_number"], "expires_at": hold["expires_at"]}}
+            for hold in expired
+        ]
+        operations.append(UpdateOne(
+            {"_id": flight["_id"], "holds": {"$all": guard}},
+            {
+                "$pull": {"holds": {"seat_number": {"$in": seat_numbers}, "expires_at": {"$lt": now}}},
+                "$bit": {
+                    f"seatBits.{seat_class}": {"or": Int64(mask)}
+                    for seat_class, mask in seat_masks(seat_numbers).items()
+                },
+                "$inc": {"availableSeats": len(seat_numbers)},
+            },
+        ))
+        released_flights.append(flight)
+
+    if not operations:
+        return 0
+    result = flights_collection.bulk_write(operations, ordered=False)
+    if on_release:
+        for flight in released_flights:
+            on_release(flight)
+    return result.modified_count
+
+
+class HoldSweeper(threading.Thread):
+    """
+    Daemon thread that periodically releases expired seat holds.
+    """
+
+    def __init__(self, flights_collection, interval=30, on_release=None):
+        super().__init__(name="seat-hold-sweeper", daemon=True)
+        self.flights_collection = flights_collection
+        self.interval = interval
+        self.on_release = on_release
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                sweep_expired_holds(self.flights_collection, on_release=self.on_release)
+            except Exception as e:
+                print(f"Error sweeping expired seat holds: {e}")
+
+    def stop(self):
+        self._stop_event.set()
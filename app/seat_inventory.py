@@ -0,0 +1,246 @@
+from bson.int64 import Int64
+
+# Seat classes and the (inclusive) seat-number range each one covers
+SEAT_LAYOUT = [
+    ("First", 1, 10),
+    ("Business", 11, 30),
+    ("Economy", 31, 60),
+]
+TOTAL_SEATS = sum(last - first + 1 for _, first, last in SEAT_LAYOUT)
+
+# Fields needed to decode a seat map
+SEATMAP_PROJECTION = {"seatBits": 1, "seats": 1}
+
+
+def new_seat_bits():
+    """
+    Per-class bitsets for an empty flight. Bit i of a class is set while
+    seat (first + i) of that class is free.
+    """
+    return {
+        seat_class: Int64((1 << (last - first + 1)) - 1)
+        for seat_class, first, last in SEAT_LAYOUT
+    }
+
+
+def seat_mask(seat_number):
+    """
+    Return (seat_class, mask) for a seat number; raises ValueError for
+    seats outside the layout.
+    """
+    if isinstance(seat_number, bool) or not isinstance(seat_number, (str, int)):
+        raise ValueError(f"Invalid seat number: {seat_number!r}")
+    try:
+        number = int(seat_number)
+    except ValueError:
+        raise ValueError(f"Invalid seat number: {seat_number!r}")
+    for seat_class, first, last in SEAT_LAYOUT:
+        if first <= number <= last:
+            return seat_class, 1 << (number - first)
+    raise ValueError(f"Unknown seat number: {seat_number}")
+
+
+def seat_masks(seat_numbers):
+    """
+    Combine several seats into one mask per class.
+    """
+    masks = {}
+    for seat_number in seat_numbers:
+        seat_class, mask = seat_mask(seat_number)
+        masks[seat_class] = masks.get(seat_class, 0) | mask
+    return masks
+
+
+def bits_from_seats(seats, booked=()):
+    """
+    Build seat bitsets from a legacy `seats` array of dicts. Seats in
+    `booked` are taken even if still flagged available: legacy seat-map
+    bookings never cleared is_available.
+    """
+    booked = {str(seat_number) for seat_number in booked}
+    bits = {seat_class: 0 for seat_class, _, _ in SEAT_LAYOUT}
+    for seat in seats:
+        if seat.get("is_available", True) and str(seat["seat_number"]) not in booked:
+            seat_class, mask = seat_mask(seat["seat_number"])
+            bits[seat_class] |= mask
+    return {seat_class: Int64(value) for seat_class, value in bits.items()}
+
+
+def booked_seats_by_flight(bookings_collection, flight_ids):
+    """
+    Map each flight id to the seat numbers booked on it, with one query for
+    all flights. Bookings reference flights by ObjectId or by string.
+    """
+    by_key = {str(flight_id): flight_id for flight_id in flight_ids}
+    booked = {flight_id: set() for flight_id in flight_ids}
+    cursor = bookings_collection.aggregate([
+        {"$match": {"flight_id": {"$in": list(flight_ids) + list(by_key)}}},
+        {"$group": {"_id": "$flight_id", "seats": {"$addToSet": "$seat_number"}}},
+    ])
+    for row in cursor:
+        flight_id = by_key.get(str(row["_id"]))
+        if flight_id is not None:
+            booked[flight_id].update(str(seat_number) for seat_number in row["seats"] if seat_number is not None)
+    return booked
+
+
+def legacy_seat_bits(flight, booked=()):
+    """
+    Bitsets and free-seat count for a flight that predates seatBits.
+    """
+    seat_bits = bits_from_seats(flight["seats"], booked) if flight.get("seats") else new_seat_bits()
+    if not flight.get("seats"):
+        for seat_number in booked:
+            try:
+                seat_class, mask = seat_mask(seat_number)
+            except ValueError:
+                continue
+            seat_bits[seat_class] = Int64(int(seat_bits[seat_class]) & ~mask)
+    return seat_bits, sum(free_seat_counts({"seatBits": seat_bits}).values())
+
+
+def ensure_seat_bits(flights_collection, flight_id):
+    """
+    Migrate one flight to seatBits in place if it has not been yet, so a
+    claim on a flight the seat_bits migration has not reached still works.
+    Returns True if the flight was migrated now.
+    """
+    flight = flights_collection.find_one({"_id": flight_id, "seatBits": {"$exists": False}}, {"seats": 1})
+    if flight is None:
+        return False
+    bookings = flights_collection.database.get_collection("bookings")
+    seat_bits, available = legacy_seat_bits(flight, booked_seats_by_flight(bookings, [flight_id])[flight_id])
+    result = flights_collection.update_one(
+        {"_id": flight_id, "seatBits": {"$exists": False}},
+        {"$set": {"seatBits": seat_bits, "availableSeats": available}, "$unset": {"seats": ""}},
+    )
+    return result.modified_count == 1
+
+
+def decode_seats(flight):
+    """
+    Expand a flight's bitsets into the seat-map shape the frontend expects.
+    Flights not yet migrated fall back to their legacy `seats` array.
+    """
+    seat_bits = flight.get("seatBits")
+    if seat_bits is None:
+        return flight.get("seats", [])
+
+    seats = []
+    for seat_class, first, last in SEAT_LAYOUT:
+        bits = int(seat_bits.get(seat_class, 0))
+        for number in range(first, last + 1):
+            seats.append({
+                "seat_number": str(number),
+                "seat_class": seat_class,
+                "is_available": bool(bits >> (number - first) & 1),
+            })
+    return seats
+
+
+def free_seat_counts(flight):
+    """
+    Free seats per class, computed as a popcount of each bitset.
+    """
+    seat_bits = flight.get("seatBits") or {}
+    return {
+        seat_class: bin(int(seat_bits.get(seat_class, 0))).count("1")
+        for seat_class, _, _ in SEAT_LAYOUT
+    }
+
+
+def with_seat_bits(flights_collection, flight_id, claim):
+    """
+    Run `claim()`; if it fails because the flight still has no seatBits,
+    migrate the flight and try once more.
+    """
+    result = claim()
+    if result is None and ensure_seat_bits(flights_collection, flight_id):
+        result = claim()
+    return result
+
+
+def claim_seat(flights_collection, flight_id, seat_number, projection=None):
+    """
+    Atomically mark a free seat as taken.
+    Returns the (projected) flight document, or None if the seat was not free.
+    """
+    seat_class, mask = seat_mask(seat_number)
+    field = f"seatBits.{seat_class}"
+    return with_seat_bits(flights_collection, flight_id, lambda: flights_collection.find_one_and_update(
+        {"_id": flight_id, field: {"$bitsAllSet": mask}},
+        {"$bit": {field: {"xor": Int64(mask)}}, "$inc": {"availableSeats": -1}},
+        projection=projection,
+    ))
+
+
+def release_seat(flights_collection, flight_id, seat_number, projection=None):
+    """
+    Atomically return a taken seat to the pool.
+    Returns the (projected) flight document, or None if the seat was already free.
+    """
+    seat_class, mask = seat_mask(seat_number)
+    field = f"seatBits.{seat_class}"
+    return flights_collection.find_one_and_update(
+        {"_id": flight_id, field: {"$bitsAllClear": mask}},
+        {"$bit": {field: {"or": Int64(mask)}}, "$inc": {"availableSeats": 1}},
+        projection=projection,
+    )
+
+
+def claim_seats(flights_collection, flight_id, seat_numbers, projection=None):
+    """
+    Atomically mark several seats as taken in one conditional update: either
+    every seat was free and all are claimed, or nothing changes.
+    Returns the (projected) flight document, or None if any seat was not free.
+    """
+    masks = seat_masks(seat_numbers)
+    query = {"_id": flight_id}
+    query.update({f"seatBits.{seat_class}": {"$bitsAllSet": mask} for seat_class, mask in masks.items()})
+    return with_seat_bits(flights_collection, flight_id, lambda: flights_collection.find_one_and_update(
+        query,
+        {
+            "$bit": {f"seatBits.{seat_class}": {"xor": Int64(mask)} for seat_class, mask in masks.items()},
+            "$inc": {"availableSeats": -len(seat_numbers)},
+        },
+        projection=projection,
+    ))
+
+
+def release_seats(flights_collection, flight_id, seat_numbers, projection=None):
+    """
+    Atomically return several taken seats to the pool; the counterpart of
+    claim_seats. Returns None (and changes nothing) if any seat was already free.
+    """
+    masks = seat_masks(seat_numbers)
+    query = {"_id": flight_id}
+    query.update({f"seatBits.{seat_class}": {"$bitsAllClear": mask} for seat_class, mask in masks.items()})
+    return flights_collection.find_one_and_update(
+        query,
+        {
+            "$bit": {f"seatBits.{seat_class}": {"or": Int64(mask)} for seat_class, mask in masks.items()},
+            "$inc": {"availableSeats": len(seat_numbers)},
+        },
+        projection=projection,
+    )
+
+
+def seat_changes(old_bits, new_bits):
+    """
+    Seats whose availability differs between two sets of bitsets, in the
+    seat-map shape decode_seats produces.
+    """
+    changes = []
+    for seat_class, first, last in SEAT_LAYOUT:
+        old = int((old_bits or {}).get(seat_class, 0))
+        new = int((new_bits or {}).get(seat_class, 0))
+        flipped = old ^ new
+        while flipped:
+            offset = (flipped & -flipped).bit_length() - 1
+            flipped &= flipped - 1
+            changes.append({
+                "seat_number": str(first + offset),
+                "seat_class": seat_class,
+                "is_available": bool(new >> offset & 1),
+            })
+    return changes
@@ -0,0 +1,281 @@
+"""
+Live seat-map push: one feed per process, fanned out to every viewer.
+
+A single SeatMapHub thread per process follows seat changes for the
+flights someone is currently viewing and pushes availability deltas to
+their subscribers. The feed is a change stream on `flights` when the
+deployment supports one (replica sets / sharded clusters); otherwise the
+hub polls the watched flights' bitsets with one query per interval and
+diffs them against its last snapshot. Either way Mongo work scales with
+the number of watched flights, not with the number of viewers.
+
+Subscribers only need a `push(event)` method that never blocks; the Flask
+SSE endpoint uses QueueSubscriber and the ASGI tier uses AsyncSubscriber.
+"""
+import asyncio
+import json
+import os
+import queue
+import threading
+from pymongo.errors import OperationFailure, PyMongoError
+from app.seat_inventory import decode_seats, seat_changes
+
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_HEARTBEAT = 15.0
+SUBSCRIBER_QUEUE_SIZE = 256
+# Attempts at a first snapshot that no concurrent change raced with
+SNAPSHOT_READS = 3
+
+# Only updates/replacements can change a seat map; keep just the fields we diff
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["update", "replace"]}}},
+    {"$project": {
+        "documentKey": 1,
+        "operationType": 1,
+        "updateDescription.updatedFields": 1,
+        "fullDocument.seatBits": 1,
+    }},
+]
+
+
+def format_event(name, data):
+    """
+    Encode one server-sent event.
+    """
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+HEARTBEAT_EVENT = ": keepalive\n\n"
+
+
+class QueueSubscriber:
+    """
+    Thread-side subscriber for the WSGI endpoint. If the client falls so far
+    behind that its queue fills up it is marked stale; the endpoint then
+    closes the stream and the browser reconnects with a fresh snapshot.
+    """
+    __slots__ = ("queue", "stale")
+
+    def __init__(self, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize)
+        self.stale = False
+
+    def push(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.stale = True
+
+    def get(self, timeout):
+        """
+        Next event, or None on timeout.
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscriber:
+    """
+    Event-loop-side subscriber for the ASGI tier; pushes are handed to the
+    loop thread-safely.
+    """
+    __slots__ = ("loop", "queue", "stale")
+
+    def __init__(self, loop, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.stale = False
+
+    def push(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stale = True
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class SeatMapHub:
+    """
+    Per-process registry of watched flights and their subscribers.
+    """
+
+    def __init__(self, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.mode = None
+        self._collection = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stop_event = threading.Event()
+
+    def configure(self, poll_interval=None):
+        if poll_interval is not None:
+            self.poll_interval = poll_interval
+
+    def start(self, flights_collection):
+        """
+        Start the feed thread for this process; safe to call on every subscribe.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Inherited state belongs to the parent's subscribers and thread
+            self._flights = {}
+            self._collection = flights_collection
+            self._stop_event = threading.Event()
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name="seat-map-hub", daemon=True).start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._lock:
+            self._pid = None
+
+    def subscribe(self, flight_id, subscriber):
+        """
+        Register a subscriber for a flight (an ObjectId) and return the seat
+        map it should start from, or None if the flight does not exist.
+        Later deltas are relative to this snapshot.
+        """
+        with self._lock:
+            watched = self._flights.get(flight_id)
+            if watched is None:
+                # Registered before the read below so no change can slip past it
+                watched = self._flights[flight_id] = {"flight": None, "subscribers": set(), "version": 0}
+            watched["subscribers"].add(subscriber)
+            if watched["flight"] is not None:
+                return decode_seats(watched["flight"])
+
+        # First viewer of this flight: read it without blocking every other subscribe and publish,
+        # and read again if a change arrived meanwhile, since that change has no baseline to diff against
+        for _ in range(SNAPSHOT_READS):
+            with self._lock:
+                version = watched["version"]
+            flight = self._collection.find_one({"_id": flight_id}, {"seatBits": 1, "seats": 1})
+            if flight is None:
+                self.unsubscribe(flight_id, subscriber)
+                return None
+            with self._lock:
+                # Another first viewer may have finished meanwhile; share its baseline
+                if watched["flight"] is None and watched["version"] == version:
+                    watched["flight"] = flight
+                if watched["flight"] is not None:
+                    return decode_seats(watched["flight"])
+        with self._lock:
+            if watched["flight"] is None:
+                watched["flight"] = flight
+            return decode_seats(watched["flight"])
+
+    def unsubscribe(self, flight_id, subscriber):
+        with self._lock:
+            watched = self._flights.get(flight_id)
+            if watched is None:
+                return
+            watched["subscribers"].discard(subscriber)
+            if not watched["subscribers"]:
+                del self._flights[flight_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "flights": len(self._flights),
+                "subscribers": sum(len(watched["subscribers"]) for watched in self._flights.values()),
+            }
+
+    def publish(self, flight_id, seat_bits):
+        """
+        Diff a flight's new bitsets against the last snapshot and push the
+        changed seats to its subscribers.
+        """
+        with self._lock:
+            watched = self._flights.get(flight_id)
+            if watched is None or seat_bits is None:
+                return
+            if watched["flight"] is None:
+                # The first snapshot is still being read; make subscribe() read again
+                watched["version"] += 1
+                return
+            changes = seat_changes(watched["flight"].get("seatBits"), seat_bits)
+            watched["flight"] = {"_id": flight_id, "seatBits": seat_bits}
+            subscribers = list(watched["subscribers"])
+        if changes:
+            event = format_event("delta", {"seats": changes})
+            for subscriber in subscribers:
+                subscriber.push(event)
+
+    def _run(self):
+        try:
+            self._watch()
+        except Exception as e:
+            # Standalone servers have no change streams (OperationFailure)
+            print(f"Seat map change stream unavailable ({e}); polling every {self.poll_interval}s")
+        if not self._stop_event.is_set():
+            self._poll()
+
+    def _watch(self):
+        resume_token = None
+        while not self._stop_event.is_set():
+            try:
+                with self._collection.watch(CHANGE_STREAM_PIPELINE, resume_after=resume_token) as stream:
+                    self.mode = "change_stream"
+                    while not self._stop_event.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        resume_token = stream.resume_token
+                        self._apply_change(change)
+            except OperationFailure:
+                raise
+            except PyMongoError as e:
+                print(f"Seat map change stream interrupted: {e}")
+                self._stop_event.wait(self.poll_interval)
+
+    def _apply_change(self, change):
+        flight_id = change["documentKey"]["_id"]
+        if change["operationType"] == "replace":
+            self.publish(flight_id, (change.get("fullDocument") or {}).get("seatBits"))
+            return
+        updated = change.get("updateDescription", {}).get("updatedFields", {})
+        if not any(field == "seatBits" or field.startswith("seatBits.") for field in updated):
+            return
+        with self._lock:
+            watched = self._flights.get(flight_id)
+            if watched is None:
+                return
+            if watched["flight"] is None:
+                watched["version"] += 1
+                return
+            seat_bits = dict(watched["flight"].get("seatBits") or {})
+        for field, value in updated.items():
+            if field == "seatBits":
+                seat_bits = dict(value)
+            elif field.startswith("seatBits."):
+                seat_bits[field.split(".", 1)[1]] = value
+        self.publish(flight_id, seat_bits)
+
+    def _poll(self):
+        self.mode = "polling"
+        while not self._stop_event.wait(self.poll_interval):
+            with self._lock:
+                flight_ids = list(self._flights)
+            if not flight_ids:
+                continue
+            try:
+                for flight in self._collection.find({"_id": {"$in": flight_ids}}, {"seatBits": 1}):
+                    self.publish(flight["_id"], flight.get("seatBits"))
+            except PyMongoError as e:
+                print(f"Error polling seat maps: {e}")
+
+
+seat_map_hub = SeatMapHub()
@@ -0,0 +1,184 @@
+import queue
+import random
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import request
+from pymongo import DESCENDING, monitoring
+from pymongo.errors import CollectionInvalid
+from app.flight_search import _plan_stages
+
+SLOW_QUERY_COLLECTION = "slow_queries"
+SLOW_QUERY_LOG_SIZE = 16 * 1024 * 1024
+# In-flight commands remembered until they finish; the oldest are dropped past this
+MAX_PENDING = 1024
+
+# Commands the server can explain
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+
+def _explainable_command(command):
+    """
+    Strip session/cluster fields the driver adds so the command can be re-sent inside `explain`.
+    """
+    return {key: value for key, value in command.items() if not key.startswith("$") and key not in ("lsid", "txnNumber")}
+
+
+def _query_planner(explain):
+    if "queryPlanner" in explain:
+        return explain["queryPlanner"], explain.get("executionStats", {})
+    # Aggregations nest the planner under their $cursor stage
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"].get("queryPlanner", {}), stage["$cursor"].get("executionStats", {})
+    return {}, {}
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """
+    Samples Mongo commands slower than a threshold and records them, with
+    the route that issued them and their `explain("executionStats")`, in a
+    capped collection. Explains run on a background thread; the request
+    path only pays for a dict lookup and, for slow commands, a queue put.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.threshold_ms = 100
+        self.sample_rate = 1.0
+        self.db = None
+        self._local = threading.local()
+        self._pending = OrderedDict()
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=256)
+        self._thread = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get("SLOW_QUERY_LOG_ENABLED", False)
+        self.threshold_ms = app.config.get("SLOW_QUERY_MS", 100)
+        self.sample_rate = app.config.get("SLOW_QUERY_SAMPLE_RATE", 1.0)
+        if self.enabled:
+            app.before_request(self._before_request)
+            app.teardown_request(self._teardown_request)
+
+    def listeners(self):
+        return [self] if self.enabled else []
+
+    def start(self, db):
+        """
+        Create the capped collection and start the explain worker.
+        """
+        if not self.enabled:
+            return
+        self.db = db
+        if SLOW_QUERY_COLLECTION not in db.list_collection_names():
+            try:
+                db.create_collection(SLOW_QUERY_COLLECTION, capped=True, size=SLOW_QUERY_LOG_SIZE)
+            except CollectionInvalid:
+                pass  # created concurrently by another worker
+        self._thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+        self._thread.start()
+
+    def _before_request(self):
+        self._local.route = request.url_rule.rule if request.url_rule else request.path
+        self._local.endpoint = request.endpoint
+
+    def _teardown_request(self, exc=None):
+        self._local.route = None
+        self._local.endpoint = None
+
+    def _pop_pending(self, event):
+        with self._pending_lock:
+            return self._pending.pop((event.connection_id, event.request_id), None)
+
+    def started(self, event):
+        if event.command_name not in EXPLAINABLE:
+            return
+        with self._pending_lock:
+            self._pending[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+            # Commands whose succeeded/failed event never arrives must not pile up
+            while len(self._pending) > MAX_PENDING:
+                self._pending.popitem(last=False)
+
+    def succeeded(self, event):
+        pending = self._pop_pending(event)
+        if pending is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        database_name, command = pending
+        try:
+            self._queue.put_nowait({
+                "route": getattr(self._local, "route", None) or "background",
+                "endpoint": getattr(self._local, "endpoint", None),
+                "command_name": event.command_name,
+                "database": database_name,
+                "command": _explainable_command(command),
+                "duration_ms": round(event.duration_micros / 1000, 2),
+                "at": datetime.utcnow(),
+            })
+        except queue.Full:
+            pass
+
+    def failed(self, event):
+        self._pop_pending(event)
+
+    def _run(self):
+        while True:
+            sample = self._queue.get()
+            try:
+                self.capture(sample)
+            except Exception as e:
+                # One bad sample must not kill the only explain thread
+                print(f"Slow-query explain failed: {type(e).__name__}: {e}")
+
+    def capture(self, sample):
+        """
+        Explain one sampled command and store it in the slow-query log.
+        """
+        command = sample.pop("command")
+        collection = command.get(sample["command_name"])
+        explain = self.db.client[sample.pop("database")].command(
+            "explain", command, verbosity="executionStats"
+        )
+        planner, stats = _query_planner(explain)
+        stages = _plan_stages(planner["winningPlan"]) if "winningPlan" in planner else []
+        sample.update({
+            "collection": collection,
+            "filter": repr(command.get("filter") or command.get("query") or command.get("pipeline") or command.get("q")),
+            "plan_stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "n_returned": stats.get("nReturned"),
+        })
+        self.db.get_collection(SLOW_QUERY_COLLECTION).insert_one(sample)
+
+
+def top_offenders(db, limit=20):
+    """
+    Slow commands grouped by route, collection and command, ordered by
+    total time, flagging groups where any capture was a collection scan.
+    """
+    pipeline = [
+        {"$group": {
+            "_id": {"route": "$route", "collection": "$collection", "command": "$command_name"},
+            "count": {"$sum": 1},
+            "total_ms": {"$sum": "$duration_ms"},
+            "max_ms": {"$max": "$duration_ms"},
+            "collscan": {"$max": "$collscan"},
+            "max_docs_examined": {"$max": "$docs_examined"},
+            "last_seen": {"$max": "$at"},
+            "example_filter": {"$last": "$filter"},
+            "plan_stages": {"$last": "$plan_stages"},
+        }},
+        {"$sort": {"total_ms": DESCENDING}},
+        {"$limit": limit},
+    ]
+    return [
+        dict(row.pop("_id"), **row, avg_ms=round(row["total_ms"] / row["count"], 2))
+        for row in db.get_collection(SLOW_QUERY_COLLECTION).aggregate(pipeline)
+    ]
+
+
+slow_query_log = SlowQueryLog()
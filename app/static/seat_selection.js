@@ -2,66 +2,132 @@ document.addEventListener("DOMContentLoaded", function () {
     const planeContainer = document.getElementById("planeContainer");
     const confirmButton = document.getElementById("confirmButton");
     let selectedSeat = null;
+    let idempotencyKey = null;
+    // The seat being reserved, and the latest stream update for it that arrived meanwhile
+    let reservingSeat = null;
+    let deferredSeat = null;
 
-    // Fetch seat list for the flight
-    fetch(`/api/flights/${flightId}/seats`)
-        .then(response => {
-            console.log("Fetching seat list. Response Status:", response.status);
-            return response.text().then(text => {
-                try {
-                    return JSON.parse(text);
-                } catch (e) {
-                    console.error("Invalid JSON response:", text);
-                    throw new Error("Server returned invalid JSON");
-                }
-            });
-        })
-        .then(data => {
-            console.log("Seat Data Received:", data);
+    const seatDivs = {};
+
+    // crypto.randomUUID needs a secure context; plain-HTTP hosts fall back to getRandomValues
+    function newIdempotencyKey() {
+        if (window.crypto && typeof crypto.randomUUID === "function") {
+            return crypto.randomUUID();
+        }
+        if (window.crypto && typeof crypto.getRandomValues === "function") {
+            return Array.from(crypto.getRandomValues(new Uint8Array(16)), byte => byte.toString(16).padStart(2, "0")).join("");
+        }
+        return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}-${Math.random().toString(16).slice(2)}`;
+    }
 
-            if (data.error) {
-                console.error("Error in seat data:", data.error);
-                alert(data.error);
+    // Show a seat as free or taken; a taken seat can no longer stay selected
+    function applySeat(seat) {
+        // Our own hold comes back as "taken"; settle the seat once the reservation answers
+        if (seat.seat_number === reservingSeat) {
+            deferredSeat = seat;
+            return;
+        }
+        const seatDiv = seatDivs[seat.seat_number];
+        if (!seatDiv) {
+            return;
+        }
+        seatDiv.dataset.available = seat.is_available ? "true" : "false";
+        seatDiv.classList.toggle("unavailable", !seat.is_available);
+        seatDiv.style.pointerEvents = seat.is_available ? "" : "none"; // Non-clickable for unavailable seats
+
+        if (!seat.is_available && selectedSeat === seat.seat_number) {
+            seatDiv.classList.remove("selected");
+            selectedSeat = null;
+            confirmButton.disabled = true;
+            alert(`Seat ${seat.seat_number} was just taken. Please choose another seat.`);
+        }
+    }
+
+    // Render seat data dynamically
+    function renderSeats(seats) {
+        planeContainer.innerHTML = ""; // Clear previous content
+        Object.keys(seatDivs).forEach(number => delete seatDivs[number]);
+        seats.forEach(seat => {
+            if (!seat.seat_number || !seat.seat_class) {
+                console.warn("Invalid seat data encountered:", seat);
                 return;
             }
 
-            // Render seat data dynamically
-            planeContainer.innerHTML = ""; // Clear previous content
-            data.seats.forEach(seat => {
-                if (!seat.seat_number || !seat.seat_class) {
-                    console.warn("Invalid seat data encountered:", seat);
+            // Create seat div dynamically
+            const seatDiv = document.createElement("div");
+            seatDiv.className = "seat";
+            seatDiv.textContent = `${seat.seat_number} (${seat.seat_class})`;
+            seatDiv.addEventListener("click", () => {
+                if (seatDiv.dataset.available !== "true") {
                     return;
                 }
+                // Deselect previously selected seat
+                document.querySelectorAll(".seat.selected").forEach(el => el.classList.remove("selected"));
+                seatDiv.classList.add("selected");
+                selectedSeat = seat.seat_number;
 
-                // Create seat div dynamically
-                const seatDiv = document.createElement("div");
-                seatDiv.textContent = `${seat.seat_number} (${seat.seat_class})`;
+                // Enable confirm button after seat selection
+                confirmButton.disabled = false;
+                console.log("Selected Seat:", selectedSeat);
+            });
 
-                // Handle seat availability
-                if (!seat.is_available) {
-                    seatDiv.className = "seat unavailable";
-                    seatDiv.style.pointerEvents = "none"; // Non-clickable for unavailable seats
-                } else {
-                    seatDiv.className = "seat";
-                    seatDiv.addEventListener("click", () => {
-                        // Deselect previously selected seat
-                        document.querySelectorAll(".seat.selected").forEach(el => el.classList.remove("selected"));
-                        seatDiv.classList.add("selected");
-                        selectedSeat = seat.seat_number;
-
-                        // Enable confirm button after seat selection
-                        confirmButton.disabled = false;
-                        console.log("Selected Seat:", selectedSeat);
-                    });
-                }
+            seatDivs[seat.seat_number] = seatDiv;
+            planeContainer.appendChild(seatDiv);
+            applySeat(seat);
+        });
 
-                planeContainer.appendChild(seatDiv);
+        // Keep the current selection across reconnects if the seat is still free
+        if (selectedSeat && seatDivs[selectedSeat] && seatDivs[selectedSeat].dataset.available === "true") {
+            seatDivs[selectedSeat].classList.add("selected");
+        } else {
+            selectedSeat = null;
+            confirmButton.disabled = true;
+        }
+    }
+
+    function loadSeatsOnce() {
+        fetch(`/api/flights/${flightId}/seats`)
+            .then(response => {
+                console.log("Fetching seat list. Response Status:", response.status);
+                return response.text().then(text => {
+                    try {
+                        return JSON.parse(text);
+                    } catch (e) {
+                        console.error("Invalid JSON response:", text);
+                        throw new Error("Server returned invalid JSON");
+                    }
+                });
+            })
+            .then(data => {
+                console.log("Seat Data Received:", data);
+
+                if (data.error) {
+                    console.error("Error in seat data:", data.error);
+                    alert(data.error);
+                    return;
+                }
+                renderSeats(data.seats);
+            })
+            .catch(error => {
+                console.error("Error fetching seat data:", error);
+                alert("Failed to load seat data. Please refresh the page.");
             });
-        })
-        .catch(error => {
-            console.error("Error fetching seat data:", error);
-            alert("Failed to load seat data. Please refresh the page.");
-        });
+    }
+
+    // Live seat map: a full snapshot on (re)connect, then only the seats that change
+    if (window.EventSource) {
+        const stream = new EventSource(`/api/flights/${flightId}/seats/stream`);
+        stream.addEventListener("snapshot", event => renderSeats(JSON.parse(event.data).seats));
+        stream.addEventListener("delta", event => JSON.parse(event.data).seats.forEach(applySeat));
+        stream.onerror = () => {
+            // The browser reconnects by itself; give up only if the stream was refused outright
+            if (stream.readyState === EventSource.CLOSED && !Object.keys(seatDivs).length) {
+                loadSeatsOnce();
+            }
+        };
+    } else {
+        loadSeatsOnce();
+    }
 
     // Handle seat confirmation and transition to payment page
     confirmButton.addEventListener("click", () => {
@@ -70,13 +136,30 @@ document.addEventListener("DOMContentLoaded", function () {
             return;
         }
 
-        console.log("Attempting to reserve seat:", selectedSeat);
+        const seatNumber = selectedSeat;
+        console.log("Attempting to reserve seat:", seatNumber);
+
+        // Repeated clicks for the same seat reuse one key, so the server holds the seat only once
+        if (!idempotencyKey || idempotencyKey.seat !== seatNumber) {
+            idempotencyKey = { seat: seatNumber, value: newIdempotencyKey() };
+        }
+
+        function finishReserving() {
+            reservingSeat = null;
+            if (deferredSeat) {
+                const seat = deferredSeat;
+                deferredSeat = null;
+                applySeat(seat);
+            }
+        }
 
+        reservingSeat = seatNumber;
+        deferredSeat = null;
         // Corrected URL for POST request
         fetch(`/api/${flightId}/seats/select`, {  // Corrected URL
             method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ seat_number: selectedSeat }),
+            headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey.value },
+            body: JSON.stringify({ seat_number: seatNumber }),
         })
             .then(response => {
                 console.log("POST Response Status:", response.status);
@@ -95,16 +178,18 @@ document.addEventListener("DOMContentLoaded", function () {
                 if (data.error) {
                     console.error("Error during seat reservation:", data.error);
                     alert(`Error: ${data.error}`);
+                    finishReserving();
                 } else {
                     // Successful reservation, redirect to payment
                     alert(data.message);
                     console.log("Redirecting to payment page...");
-                    window.location.href = `/payment/${flightId}/${selectedSeat}`;
+                    window.location.href = `/payment/${flightId}/${seatNumber}`;
                 }
             })
             .catch(error => {
                 console.error("Error during seat reservation:", error);
                 alert("Failed to reserve seat. Please try again.");
+                finishReserving();
             });
     });
 });
@@ -0,0 +1,186 @@
+import logging
+import os
+import smtplib
+import threading
+from collections import deque
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+
+class TransportError(Exception):
+    """
+    Raised by a transport when a message could not be delivered.
+    """
+
+
+class SMTPTransport:
+    """
+    Sends email over SMTP, reusing one connection per batch.
+    Point MAIL_SERVER/MAIL_PORT at a local sink (e.g. `python -m aiosmtpd -n -l localhost:1025`)
+    with MAIL_USE_TLS=False for testing.
+    """
+
+    channel = "email"
+
+    def __init__(self, host, port, sender, username=None, password=None, use_tls=True, timeout=10):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username and self.password:
+            connection.login(self.username, self.password)
+        return connection
+
+    def build_message(self, message):
+        email = EmailMessage()
+        email["From"] = self.sender
+        email["To"] = message["recipient"]
+        email["Subject"] = message.get("subject", "")
+        email.set_content(message["body"])
+        return email
+
+    def send_batch(self, messages):
+        """
+        Deliver messages over a single connection.
+        Returns a list of (message, error) with error None on success.
+        """
+        results = []
+        try:
+            connection = self.connect()
+        except (OSError, smtplib.SMTPException) as e:
+            return [(message, str(e)) for message in messages]
+
+        try:
+            for message in messages:
+                try:
+                    connection.send_message(self.build_message(message))
+                    results.append((message, None))
+                except smtplib.SMTPServerDisconnected as e:
+                    # Connection is gone; fail the rest so they are retried
+                    results.append((message, str(e)))
+                    break
+                except smtplib.SMTPException as e:
+                    results.append((message, str(e)))
+        finally:
+            try:
+                connection.quit()
+            except (OSError, smtplib.SMTPException):
+                pass
+
+        failed = messages[len(results):]
+        results.extend((message, "SMTP connection closed") for message in failed)
+        return results
+
+    def send(self, message):
+        _, error = self.send_batch([message])[0]
+        if error:
+            raise TransportError(error)
+
+
+class TwilioSMSTransport:
+    """
+    Sends SMS through Twilio.
+    """
+
+    channel = "sms"
+
+    def __init__(self, account_sid, auth_token, from_number):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self._client = None
+
+    @property
+    def client(self):
+        # The twilio package is only imported once the first SMS goes out
+        if self._client is None:
+            from twilio.rest import Client
+            self._client = Client(self.account_sid, self.auth_token)
+        return self._client
+
+    def send_batch(self, messages):
+        results = []
+        for message in messages:
+            try:
+                self.client.messages.create(body=message["body"], from_=self.from_number, to=message["recipient"])
+                results.append((message, None))
+            except Exception as e:
+                results.append((message, str(e)))
+        return results
+
+    def send(self, message):
+        _, error = self.send_batch([message])[0]
+        if error:
+            raise TransportError(error)
+
+
+class FakeSMSTransport:
+    """
+    Records SMS instead of sending them; for local development and tests.
+    Only the most recent `keep` messages are kept, since the outbox workers
+    that use it run for the life of the process.
+    """
+
+    channel = "sms"
+
+    def __init__(self, keep=1000):
+        self.sent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        with self._lock:
+            self.sent.extend(messages)
+        for message in messages:
+            logger.debug("[fake sms] to %s: %s", message["recipient"], message["body"])
+        return [(message, None) for message in messages]
+
+    def send(self, message):
+        self.send_batch([message])
+
+
+def _settings(config):
+    config = config or {}
+
+    def setting(name, default=None):
+        return config.get(name, os.getenv(name, default))
+    return setting
+
+
+def build_email_transport(config=None):
+    setting = _settings(config)
+    return SMTPTransport(
+        host=setting("MAIL_SERVER", "smtp.gmail.com"),
+        port=int(setting("MAIL_PORT", 587)),
+        sender=setting("MAIL_DEFAULT_SENDER", setting("MAIL_USERNAME", "noreply@example.com")),
+        username=setting("MAIL_USERNAME"),
+        password=setting("MAIL_PASSWORD"),
+        use_tls=str(setting("MAIL_USE_TLS", "True")).lower() in ("1", "true", "yes"),
+    )
+
+
+def build_sms_transport(config=None):
+    setting = _settings(config)
+    if setting("SMS_TRANSPORT", "fake") == "twilio":
+        return TwilioSMSTransport(
+            setting("TWILIO_ACCOUNT_SID"),
+            setting("TWILIO_AUTH_TOKEN"),
+            setting("TWILIO_PHONE_NUMBER"),
+        )
+    return FakeSMSTransport()
+
+
+def build_transports(config=None):
+    """
+    Build the channel -> transport mapping from configuration
+    (falls back to environment variables).
+    """
+    return {"email": build_email_transport(config), "sms": build_sms_transport(config)}
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class UserCache:
+    """
+    Per-process cache of loaded users (with their resolved permissions),
+    so the Flask-Login user loader does not hit Mongo on every request.
+
+    Entries live for `ttl` seconds; role changes made in this process
+    invalidate them immediately, other workers pick them up on expiry.
+    """
+
+    def __init__(self, maxsize=4096, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._entries.clear()
+
+    def get(self, user_id, loader):
+        """
+        Return the cached user for `user_id`, calling `loader(user_id)` on a
+        miss. Missing users are not cached.
+        """
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        user = loader(user_id)
+        if user is not None and self.maxsize > 0:
+            with self._lock:
+                self._entries[user_id] = (user, now + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache()
@@ -0,0 +1,279 @@
+"""
+End-to-end latency benchmark for the booking funnel:
+
+    search -> flight details -> seat map -> seat select -> payment -> dashboard
+
+Each virtual user drives the real routes through its own Flask test client
+against a local mongod, so timings include routing, templates and every
+Mongo round trip (counted per request with a CommandListener).
+
+    python -m benchmarks.booking_funnel --users 8 --iterations 50
+    python -m benchmarks.booking_funnel --save-baseline benchmarks/baselines/funnel.json
+    python -m benchmarks.booking_funnel --compare benchmarks/baselines/funnel.json --threshold 0.2
+
+Use a throwaway database: the run adds benchmark users, holds seats and
+creates bookings. Flights are seeded with generate_flights.py when the
+database has fewer than --min-flights of them.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from pymongo import monitoring
+
+STEPS = ("search", "details", "seatmap", "select", "payment", "dashboard")
+
+# A Luhn-valid test card the mock gateway accepts
+CARD = {"card_number": "4111111111111111", "expiry_date": "12/39", "cvv": "123"}
+BENCH_PASSWORD = "bench-password"
+
+
+class CommandCounter(monitoring.CommandListener):
+    """
+    Counts Mongo commands issued by the current thread. Background threads
+    (hold sweeper, outbox workers) have their own counters and are ignored.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, "count", 0)
+
+    def started(self, event):
+        self._local.count = self.count + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class StepStats:
+    __slots__ = ("latencies", "mongo_ops", "errors", "conflicts")
+
+    def __init__(self):
+        self.latencies = []
+        self.mongo_ops = 0
+        self.errors = 0
+        self.conflicts = 0
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "conflicts": self.conflicts,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "throughput_rps": round(count / elapsed, 1) if elapsed > 0 else 0.0,
+            "mongo_ops_per_request": round(self.mongo_ops / count, 2) if count else 0.0,
+        }
+
+
+def _configure_environment(mongo_uri):
+    os.environ["MONGO_URI"] = mongo_uri
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("WTF_CSRF_SECRET_KEY", "benchmark-csrf-secret")
+    os.environ.setdefault("OUTBOX_WORKERS_ENABLED", "False")
+
+
+def _seed(db, bcrypt, users, min_flights):
+    if db.flights.count_documents({}) < min_flights:
+        import generate_flights
+        flights, bookings = generate_flights.generate_flights_and_bookings(
+            seed=7, batch=0, batch_size=min_flights, total=min_flights,
+            start_date=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
+            days=14, user_count=1, load_factor=0.2,
+        )
+        db.flights.insert_many(flights, ordered=False)
+
+    password_hash = bcrypt.generate_password_hash(BENCH_PASSWORD).decode("utf-8")
+    emails = [f"bench{index}@example.com" for index in range(users)]
+    for email in emails:
+        db.users.update_one(
+            {"email": email},
+            {"$setOnInsert": {"name": "Benchmark User", "email": email, "password_hash": password_hash, "role": "user"}},
+            upsert=True,
+        )
+    flights = list(db.flights.find(
+        {"departureTime": {"$gte": datetime.utcnow()}, "availableSeats": {"$gt": 0}},
+        {"originCode": 1, "destinationCode": 1},
+    ).limit(500))
+    if not flights:
+        raise SystemExit("No upcoming flights with free seats; run generate_flights.py first.")
+    return emails, flights
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, app, counter, email, flights, iterations, stats, lock, seed):
+        super().__init__(daemon=True)
+        self.client = app.test_client()
+        self.counter = counter
+        self.email = email
+        self.flights = flights
+        self.iterations = iterations
+        self.stats = stats
+        self.lock = lock
+        self.rng = random.Random(seed)
+
+    def _request(self, step, method, path, expect=(200,), conflict=(), **kwargs):
+        self.counter.reset()
+        started = time.perf_counter()
+        response = self.client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            stats = self.stats[step]
+            stats.latencies.append(elapsed)
+            stats.mongo_ops += self.counter.count
+            if response.status_code in conflict:
+                stats.conflicts += 1
+            elif response.status_code not in expect:
+                stats.errors += 1
+        return response
+
+    def run(self):
+        response = self.client.post("/login", data={"email": self.email, "password": BENCH_PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError(f"Login failed for {self.email}")
+
+        for _ in range(self.iterations):
+            flight = self.rng.choice(self.flights)
+            flight_id = str(flight["_id"])
+            self._request("search", "GET", "/flights", query_string={
+                "origin": flight.get("originCode"), "destination": flight.get("destinationCode"),
+            })
+            self._request("details", "GET", f"/flight/{flight_id}/details")
+            seatmap = self._request("seatmap", "GET", f"/api/flights/{flight_id}/seats").get_json() or {}
+            free = [seat["seat_number"] for seat in seatmap.get("seats", []) if seat.get("is_available")]
+            if not free:
+                continue
+            seat_number = self.rng.choice(free)
+            held = self._request("select", "POST", f"/api/flights/{flight_id}/seats",
+                                 conflict=(400,), json={"seat_number": seat_number})
+            if held.status_code != 200:
+                continue
+            # The charge is queued for the payment workers; the route redirects to the status page
+            self._request("payment", "POST", f"/payment/{flight_id}/{seat_number}",
+                          expect=(200, 302), data=CARD)
+            self._request("dashboard", "GET", "/dashboard")
+
+
+def run_benchmark(users, iterations, min_flights, seed):
+    counter = CommandCounter()
+    # Must be registered before create_app builds the MongoClient
+    monitoring.register(counter)
+
+    from app import bcrypt, create_app, ensure_indexes
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+
+    from app.db import mongo
+    ensure_indexes(mongo.get_db(app))
+    emails, flights = _seed(mongo.get_db(app), bcrypt, users, min_flights)
+
+    stats = {step: StepStats() for step in STEPS}
+    lock = threading.Lock()
+    workers = [
+        VirtualUser(app, counter, email, flights, iterations, stats, lock, seed + index)
+        for index, email in enumerate(emails)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    sweeper = app.extensions.get("seat_hold_sweeper")
+    if sweeper:
+        sweeper.stop()
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "users": users,
+        "iterations": iterations,
+        "elapsed_seconds": round(elapsed, 2),
+        "steps": {step: stats[step].summary(elapsed) for step in STEPS},
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the regressions of `results` against `baseline`: any step whose
+    p95 latency or Mongo ops per request grew by more than `threshold`.
+    """
+    regressions = []
+    for step, current in results["steps"].items():
+        previous = baseline.get("steps", {}).get(step)
+        if not previous:
+            continue
+        for metric in ("p95_ms", "mongo_ops_per_request"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{step}.{metric}: {previous[metric]} -> {current[metric]}")
+    return regressions
+
+
+def print_report(results):
+    print(f"{results['users']} users x {results['iterations']} iterations in {results['elapsed_seconds']}s")
+    print(f"{'step':<10}{'reqs':>7}{'err':>6}{'confl':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>8}{'ops/req':>9}")
+    for step, row in results["steps"].items():
+        print(f"{step:<10}{row['requests']:>7}{row['errors']:>6}{row['conflicts']:>7}{row['p50_ms']:>9}"
+              f"{row['p95_ms']:>9}{row['p99_ms']:>9}{row['throughput_rps']:>8}{row['mongo_ops_per_request']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017/airline-bench"))
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=25, help="Funnel passes per user")
+    parser.add_argument("--min-flights", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH", help="Baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    _configure_environment(args.mongo_uri)
+    results = run_benchmark(args.users, args.iterations, args.min_flights, args.seed)
+    print_report(results)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
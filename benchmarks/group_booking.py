@@ -0,0 +1,197 @@
+"""
+Group booking benchmark: one all-or-nothing request vs N per-seat requests.
+
+Two scenarios, each run for both strategies:
+
+  uncontended  one user at a time books --party seats on a random flight;
+               reports latency and Mongo round trips per party
+  contended    --contenders users race for the same --pool seats of one
+               flight; reports how many parties ended up with only part
+               of their seats (orphaned seats the user has to clean up)
+
+The "sequential" strategy is today's flow, one POST /api/<id>/seats/select
+per seat, stopping at the first refusal. The "group" strategy is a single
+POST /api/bookings/group. Seats and bookings are released after each trial.
+
+    python -m benchmarks.group_booking --party 6 --trials 200 --contenders 8
+    python -m benchmarks.group_booking --output benchmarks/baselines/group_booking.json
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import monitoring
+from benchmarks.booking_funnel import (
+    BENCH_PASSWORD, CommandCounter, _configure_environment, _seed, percentile,
+)
+
+STRATEGIES = ("sequential", "group")
+
+
+def _login(app, email):
+    client = app.test_client()
+    response = client.post("/login", data={"email": email, "password": BENCH_PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError(f"Login failed for {email}")
+    return client
+
+
+def book(client, strategy, flight_id, seat_numbers):
+    """
+    Try to book `seat_numbers`; returns how many seats the user ended up with.
+    """
+    if strategy == "group":
+        response = client.post("/api/bookings/group", json={"flight_id": flight_id, "seat_numbers": seat_numbers})
+        return len(seat_numbers) if response.status_code == 201 else 0
+    claimed = 0
+    for seat_number in seat_numbers:
+        response = client.post(f"/api/{flight_id}/seats/select", json={"seat_number": seat_number})
+        if response.status_code != 200:
+            break
+        claimed += 1
+    return claimed
+
+
+def reset_flight(db, flight_id, snapshot):
+    """
+    Put a flight's inventory back the way it was and drop the run's bookings.
+    """
+    db.flights.update_one({"_id": ObjectId(flight_id)}, {"$set": snapshot})
+    db.bookings.delete_many({"flight_id": flight_id, "group_id": {"$exists": True}})
+
+
+def _snapshot(db, flight_id):
+    flight = db.flights.find_one({"_id": ObjectId(flight_id)}, {"seatBits": 1, "availableSeats": 1, "holds": 1})
+    return {"seatBits": flight["seatBits"], "availableSeats": flight.get("availableSeats", 0), "holds": flight.get("holds", [])}
+
+
+def _free_seats(client, flight_id):
+    seatmap = client.get(f"/api/flights/{flight_id}/seats").get_json() or {}
+    return [seat["seat_number"] for seat in seatmap.get("seats", []) if seat.get("is_available")]
+
+
+def run_uncontended(db, counter, client, flights, strategy, party, trials, rng):
+    latencies, mongo_ops, failures = [], 0, 0
+    for _ in range(trials):
+        flight_id = str(rng.choice(flights)["_id"])
+        free = _free_seats(client, flight_id)
+        if len(free) < party:
+            continue
+        seat_numbers = rng.sample(free, party)
+        snapshot = _snapshot(db, flight_id)
+        counter.reset()
+        started = time.perf_counter()
+        claimed = book(client, strategy, flight_id, seat_numbers)
+        latencies.append(time.perf_counter() - started)
+        mongo_ops += counter.count
+        failures += claimed != party
+        reset_flight(db, flight_id, snapshot)
+    latencies.sort()
+    return {
+        "parties": len(latencies),
+        "failures": failures,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "mongo_ops_per_party": round(mongo_ops / len(latencies), 2) if latencies else 0.0,
+    }
+
+
+def run_contended(db, clients, flights, strategy, party, pool, rounds, rng):
+    outcomes = {"complete": 0, "none": 0, "partial": 0, "orphaned_seats": 0}
+    lock = threading.Lock()
+    for _ in range(rounds):
+        flight_id = str(rng.choice(flights)["_id"])
+        free = _free_seats(clients[0], flight_id)
+        if len(free) < max(pool, party):
+            continue
+        contested = rng.sample(free, max(pool, party))
+        snapshot = _snapshot(db, flight_id)
+        start = threading.Barrier(len(clients))
+
+        def contender(client, seed):
+            seat_numbers = random.Random(seed).sample(contested, party)
+            start.wait()
+            claimed = book(client, strategy, flight_id, seat_numbers)
+            with lock:
+                if claimed == party:
+                    outcomes["complete"] += 1
+                elif claimed == 0:
+                    outcomes["none"] += 1
+                else:
+                    outcomes["partial"] += 1
+                    outcomes["orphaned_seats"] += claimed
+
+        threads = [
+            threading.Thread(target=contender, args=(client, rng.random()), daemon=True)
+            for client in clients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reset_flight(db, flight_id, snapshot)
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017/airline-bench"))
+    parser.add_argument("--party", type=int, default=6, help="Seats per party")
+    parser.add_argument("--trials", type=int, default=200, help="Uncontended parties per strategy")
+    parser.add_argument("--contenders", type=int, default=8, help="Users racing for the same seats")
+    parser.add_argument("--pool", type=int, default=12, help="Seats the contenders pick from")
+    parser.add_argument("--rounds", type=int, default=50, help="Contended rounds per strategy")
+    parser.add_argument("--min-flights", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", metavar="PATH", help="Save results as JSON")
+    args = parser.parse_args()
+
+    _configure_environment(args.mongo_uri)
+    counter = CommandCounter()
+    # Must be registered before create_app builds the MongoClient
+    monitoring.register(counter)
+
+    from app import bcrypt, create_app, ensure_indexes
+    from app.db import mongo
+    app = create_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+    db = mongo.get_db(app)
+    ensure_indexes(db)
+    emails, flights = _seed(db, bcrypt, max(args.contenders, 1), args.min_flights)
+    clients = [_login(app, email) for email in emails]
+
+    results = {"created_at": datetime.utcnow().isoformat(), "party": args.party, "uncontended": {}, "contended": {}}
+    for strategy in STRATEGIES:
+        results["uncontended"][strategy] = run_uncontended(
+            db, counter, clients[0], flights, strategy, args.party, args.trials, random.Random(args.seed)
+        )
+        results["contended"][strategy] = run_contended(
+            db, clients, flights, strategy, args.party, args.pool, args.rounds, random.Random(args.seed)
+        )
+
+    sweeper = app.extensions.get("seat_hold_sweeper")
+    if sweeper:
+        sweeper.stop()
+
+    print(f"Party of {args.party}, uncontended:")
+    print(f"{'strategy':<12}{'parties':>8}{'fail':>6}{'p50 ms':>9}{'p95 ms':>9}{'ops':>7}")
+    for strategy, row in results["uncontended"].items():
+        print(f"{strategy:<12}{row['parties']:>8}{row['failures']:>6}{row['p50_ms']:>9}{row['p95_ms']:>9}{row['mongo_ops_per_party']:>7}")
+    print(f"{args.contenders} contenders for {args.pool} seats, {args.rounds} rounds:")
+    print(f"{'strategy':<12}{'complete':>9}{'none':>6}{'partial':>9}{'orphaned':>10}")
+    for strategy, row in results["contended"].items():
+        print(f"{strategy:<12}{row['complete']:>9}{row['none']:>6}{row['partial']:>9}{row['orphaned_seats']:>10}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Concurrent-capacity benchmark: WSGI vs ASGI read tier.
+
+Start one process of each, against the same database, e.g.
+
+    gunicorn -w 1 --threads 16 -b 127.0.0.1:8000 run:app
+    uvicorn app.asgi:application --workers 1 --port 8001
+
+then sweep concurrency levels with a keep-alive asyncio load generator:
+
+    python -m benchmarks.read_tier --wsgi-url http://127.0.0.1:8000 \\
+        --asgi-url http://127.0.0.1:8001 --concurrency 8,16,32,64,128,256 --p99-ms 250 \\
+        --output benchmarks/baselines/read_tier.json
+
+The request mix is search / flight details / seat map over flights sampled
+from the database. For each server the report lists throughput and
+latency percentiles per level, and the highest concurrency it sustained
+without errors and with p99 under --p99-ms. Run the servers, Mongo and
+this script on separate cores (ideally separate hosts); on a shared core
+the load generator's own latency dominates the comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+from pymongo import MongoClient
+from benchmarks.booking_funnel import percentile
+
+
+def sample_paths(mongo_uri, count, seed):
+    flights = list(MongoClient(mongo_uri).get_database().flights.aggregate([
+        {"$sample": {"size": count}},
+        {"$project": {"originCode": 1, "destinationCode": 1}},
+    ]))
+    if not flights:
+        raise SystemExit("No flights found; run generate_flights.py first.")
+    rng = random.Random(seed)
+    paths = []
+    for flight in flights:
+        query = urlencode({"origin": flight.get("originCode") or "", "destination": flight.get("destinationCode") or ""})
+        paths += [f"/api/flights?{query}", f"/api/flights/{flight['_id']}", f"/api/flights/{flight['_id']}/seats"]
+    rng.shuffle(paths)
+    return paths
+
+
+class Connection:
+    """
+    A minimal keep-alive HTTP/1.1 client connection.
+    """
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode())
+        await self.writer.drain()
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = {name.lower(): value.strip() for name, _, value in (line.partition(":") for line in lines[1:] if line)}
+        await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def run_level(base_url, paths, concurrency, duration):
+    target = urlsplit(base_url)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client(offset):
+        nonlocal errors
+        connection = Connection(target.hostname, target.port or 80)
+        index = offset
+        while time.perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            index += concurrency
+            started = time.perf_counter()
+            try:
+                status = await connection.get(path)
+                if status >= 500:
+                    errors += 1
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                connection.close()
+                continue
+            latencies.append(time.perf_counter() - started)
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(offset) for offset in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def capacity(levels, p99_ms):
+    sustained = [level["concurrency"] for level in levels if not level["errors"] and level["p99_ms"] <= p99_ms]
+    return max(sustained) if sustained else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wsgi-url", required=True)
+    parser.add_argument("--asgi-url", required=True)
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017/airline-bench"))
+    parser.add_argument("--concurrency", default="8,16,32,64,128,256")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per concurrency level")
+    parser.add_argument("--p99-ms", type=float, default=250.0)
+    parser.add_argument("--flights", type=int, default=200, help="Flights to sample for the request mix")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", metavar="PATH", help="Save results as JSON")
+    args = parser.parse_args()
+
+    paths = sample_paths(args.mongo_uri, args.flights, args.seed)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    results = {}
+    for name, url in (("wsgi", args.wsgi_url), ("asgi", args.asgi_url)):
+        # Warm caches and connection pools before measuring
+        asyncio.run(run_level(url, paths, min(levels), 2.0))
+        results[name] = [asyncio.run(run_level(url, paths, level, args.duration)) for level in levels]
+
+    print(f"{'server':<6}{'conc':>6}{'reqs':>8}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, rows in results.items():
+        for row in rows:
+            print(f"{name:<6}{row['concurrency']:>6}{row['requests']:>8}{row['errors']:>6}"
+                  f"{row['throughput_rps']:>9}{row['p50_ms']:>9}{row['p99_ms']:>9}")
+    summary = {name: capacity(rows, args.p99_ms) for name, rows in results.items()}
+    print(f"Max concurrency with p99 <= {args.p99_ms} ms: wsgi={summary['wsgi']} asgi={summary['asgi']}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as output_file:
+            json.dump({
+                "created_at": datetime.utcnow().isoformat(), "concurrency": levels, "duration_seconds": args.duration,
+                "p99_ms": args.p99_ms, "capacity": summary, "levels": results,
+            }, output_file, indent=2)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Worker boot benchmark: time-to-first-request and where import time goes.
+
+Each run starts a fresh interpreter with `-X importtime`, builds the app,
+serves one request through the test client and reports how long each
+phase took, which optional integrations were initialized along the way
+(there should be none) and the slowest top-level packages to import.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --output benchmarks/baselines/startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BOOT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get("/healthz")
+served = time.perf_counter()
+from app.integrations import integrations
+print("BOOT " + json.dumps({
+    "import_s": imported - started,
+    "create_app_s": created - imported,
+    "first_request_s": served - created,
+    "status": response.status_code,
+    "integrations_initialized": sorted(integrations.initialized()),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Sum `-X importtime` self times (microseconds) per top-level package.
+    """
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    return totals
+
+
+def boot_once(env):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT],
+        capture_output=True, text=True, env=env, timeout=120,
+    )
+    wall = time.perf_counter() - started
+    boot_lines = [line for line in result.stdout.splitlines() if line.startswith("BOOT ")]
+    if result.returncode != 0 or not boot_lines:
+        raise RuntimeError(f"Boot failed:\n{result.stderr[-2000:]}")
+    boot = json.loads(boot_lines[-1][len("BOOT "):])
+    boot["time_to_first_request_s"] = wall
+    boot["imports_us"] = parse_importtime(result.stderr)
+    return boot
+
+
+def summarize(boots, top):
+    phases = ("import_s", "create_app_s", "first_request_s", "time_to_first_request_s")
+    imports = {}
+    for boot in boots:
+        for package, micros in boot["imports_us"].items():
+            imports.setdefault(package, []).append(micros)
+    slowest = sorted(imports.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:top]
+    return {
+        "runs": len(boots),
+        "phases_ms": {phase: round(statistics.median(boot[phase] for boot in boots) * 1000, 1) for phase in phases},
+        "integrations_initialized": sorted({name for boot in boots for name in boot["integrations_initialized"]}),
+        "slowest_imports_ms": {package: round(statistics.median(micros) / 1000, 1) for package, micros in slowest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017/airline-bench"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="How many packages to list in the import breakdown")
+    parser.add_argument("--output", metavar="PATH", help="Save the summary as JSON")
+    args = parser.parse_args()
+
+    env = dict(os.environ, MONGO_URI=args.mongo_uri, OUTBOX_WORKERS_ENABLED="False")
+    env.setdefault("SECRET_KEY", "benchmark-secret")
+    env.setdefault("WTF_CSRF_SECRET_KEY", "benchmark-csrf-secret")
+
+    summary = summarize([boot_once(env) for _ in range(args.runs)], args.top)
+    print(f"Median over {summary['runs']} boots:")
+    for phase, millis in summary["phases_ms"].items():
+        print(f"  {phase:<26}{millis:>9} ms")
+    print(f"  integrations initialized: {', '.join(summary['integrations_initialized']) or 'none'}")
+    print("Slowest top-level imports (self time):")
+    for package, millis in summary["slowest_imports_ms"].items():
+        print(f"  {package:<26}{millis:>9} ms")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as output_file:
+            json.dump(summary, output_file, indent=2)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Every representative search shape must be served by an index, for the
+first page and for a later keyset page. Needs a running MongoDB
+(TEST_MONGO_URI, default localhost); skipped when none is reachable.
+"""
+import os
+from datetime import datetime, timedelta
+import pytest
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from app.flight_search import EXPLAIN_SAMPLES, assert_index_used, build_search_query, ensure_indexes, search_fields
+from app.pagination import encode_cursor
+
+ROUTES = [("New York (JFK)", "Los Angeles (LAX)"), ("Chicago (ORD)", "Miami (MIA)"), ("Seattle (SEA)", "Miami (MIA)")]
+
+
+@pytest.fixture(scope="module")
+def flights():
+    client = MongoClient(os.getenv("TEST_MONGO_URI", "mongodb://localhost:27017"), serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("MongoDB is not reachable")
+    db = client.get_database("flight_search_index_test")
+    ensure_indexes(db)
+    start = datetime(2025, 1, 10)
+    documents = []
+    for hour in range(0, 24 * 10, 3):
+        origin, destination = ROUTES[hour % len(ROUTES)]
+        flight = {"origin": origin, "destination": destination, "departureTime": start + timedelta(hours=hour), "price": 100 + hour}
+        flight.update(search_fields(flight))
+        documents.append(flight)
+    db.flights.insert_many(documents)
+    yield db.flights
+    client.drop_database(db.name)
+    client.close()
+
+
+@pytest.mark.parametrize("sample", EXPLAIN_SAMPLES)
+@pytest.mark.parametrize("paged", [False, True], ids=["first-page", "next-page"])
+def test_search_avoids_collection_scan(flights, sample, paged):
+    cursor = encode_cursor({"departureTime": datetime(2025, 1, 15, 6), "_id": ObjectId()}) if paged else None
+    assert_index_used(flights, build_search_query(**sample), cursor)